@@ -1,5 +1,5 @@
 # clinic/context_processors.py
-from .utils.subscription import verificar_assinatura
+from .utils.subscription import get_trial_info_request
 from .models import Assinatura, ClinicaConfig
 from django.utils import timezone
 
@@ -14,8 +14,9 @@ def trial_status(request):
             "trial_ativo": False,
         }
 
-    ativo, dias = verificar_assinatura(request.user)
-    assinatura = Assinatura.objects.filter(user=request.user).first()
+    info = get_trial_info_request(request)
+    ativo, dias = info["ativa"], info["dias_restantes"]
+    assinatura = info["assinatura"]
 
     alerta = None
     if ativo and dias <= 3:
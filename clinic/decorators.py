@@ -1,6 +1,6 @@
 from django.shortcuts import redirect
 from django.conf import settings
-from .utils.subscription import verificar_assinatura
+from .utils.subscription import verificar_assinatura_request
 
 def require_active_subscription(view_func):
     def wrapper(request, *args, **kwargs):
@@ -9,7 +9,7 @@ def require_active_subscription(view_func):
             return view_func(request, *args, **kwargs)
 
         # 🔒 Em produção, verifica assinatura normalmente
-        ativo, _ = verificar_assinatura(request.user)
+        ativo, _ = verificar_assinatura_request(request)
         if not ativo:
             return redirect('clinic:assinatura_expirada')
 
@@ -43,6 +43,14 @@ class ClinicaConfigForm(forms.ModelForm):
    
     
 class DentistaForm(forms.ModelForm):
+    # Só na edição: de quando em diante a nova comissão vale para as consultas
+    recalcular_a_partir_de = forms.DateField(
+        required=False,
+        label="Aplicar nova comissão a partir de",
+        help_text="Se a comissão mudar, recalcula as consultas desta data em diante. Em branco: todas.",
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+    )
+
     class Meta:
         model = Dentista
         fields = [
@@ -67,6 +75,11 @@ class DentistaForm(forms.ModelForm):
             }),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.instance.pk:
+            del self.fields["recalcular_a_partir_de"]
+
     def clean_email(self):
         email = self.cleaned_data.get("email")
         if email:
@@ -225,4 +238,16 @@ class ExpenseForm(forms.ModelForm):
             'valor': forms.NumberInput(attrs={'class':'form-control','step':'0.01'}),
             'data': forms.DateInput(attrs={'class':'form-control','type':'date'}),
             'pago': forms.CheckboxInput(attrs={'class':'form-check-input'}),
-        }
\ No newline at end of file
+        }
+
+class ImportarPacientesForm(forms.Form):
+    arquivo = forms.FileField(
+        label="Arquivo (CSV ou XLSX)",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+    )
+
+    def clean_arquivo(self):
+        arquivo = self.cleaned_data['arquivo']
+        if not arquivo.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError("Envie um arquivo .csv ou .xlsx.")
+        return arquivo
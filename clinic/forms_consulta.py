@@ -1,22 +1,75 @@
+from datetime import datetime, timedelta
+
 from django import forms
-from .models import Consulta, Paciente, Dentista, Procedimento
+from django.utils import timezone
+from django.urls import reverse_lazy
+from .models import Consulta, Paciente, Dentista, Procedimento, SerieConsulta
+from .services import consultas_futuras_serie, datas_serie
+from .utils.agenda import conflito_horario, conflitos_horarios, mensagem_conflito
 
 
-class ConsultaForm(forms.ModelForm):
+# Máximo de consultas geradas por série (≈ 4 anos de retornos mensais)
+LIMITE_OCORRENCIAS = 52
 
-    def __init__(self, *args, user=None, **kwargs):
-        super().__init__(*args, **kwargs)
+
+class AutocompleteSelect(forms.Select):
+    """
+    Select que renderiza apenas a opção selecionada; as demais são buscadas
+    sob demanda no endpoint de autocomplete (static/js/autocomplete.js).
+    """
+
+    def __init__(self, url, attrs=None):
+        attrs = {**(attrs or {}), 'data-autocomplete-url': url}
+        super().__init__(attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        todas = self.choices
+        opcoes = [('', '---------')]
+        selecionados = [v for v in value if v]
+        if selecionados:
+            try:
+                opcoes += [(obj.pk, str(obj)) for obj in todas.queryset.filter(pk__in=selecionados)]
+            except (ValueError, TypeError):
+                pass  # valor inválido no POST: o próprio form acusa o erro
+
+        self.choices = opcoes
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = todas
+
+
+def _preparar_campos(form, user):
+    """Filtra paciente/dentista/procedimento pelo owner, liga o autocomplete e aplica o estilo."""
+    relacionados = {'paciente': Paciente, 'dentista': Dentista, 'procedimento': Procedimento}
+
+    for campo, modelo in relacionados.items():
+        if campo not in form.fields:
+            continue
 
         # 🔥 Filtra tudo pelo owner
         if user:
-            self.fields['paciente'].queryset = Paciente.objects.filter(owner=user)
-            self.fields['dentista'].queryset = Dentista.objects.filter(owner=user)
-            self.fields['procedimento'].queryset = Procedimento.objects.filter(owner=user)
+            form.fields[campo].queryset = modelo.objects.filter(owner=user)
+
+        # 🔎 Opções carregadas sob demanda (autocomplete)
+        widget = AutocompleteSelect(
+            reverse_lazy('clinic:autocomplete', args=[campo]))
+        widget.choices = form.fields[campo].widget.choices
+        widget.is_required = form.fields[campo].widget.is_required
+        form.fields[campo].widget = widget
+
+    # Ajustes de estilo
+    for field in form.fields.values():
+        if not isinstance(field.widget, forms.CheckboxInput):
+            field.widget.attrs['class'] = 'form-control'
 
-        # Ajustes de estilo
-        for field in self.fields.values():
-            if not isinstance(field.widget, forms.CheckboxInput):
-                field.widget.attrs['class'] = 'form-control'
+
+class ConsultaForm(forms.ModelForm):
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        _preparar_campos(self, user)
 
     class Meta:
         model = Consulta
@@ -25,6 +78,7 @@ class ConsultaForm(forms.ModelForm):
             'dentista',
             'procedimento',
             'data',
+            'duracao',
             'concluida',
             'paga',
             'valor',
@@ -38,3 +92,125 @@ class ConsultaForm(forms.ModelForm):
             'concluida': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'paga': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
+        labels = {'duracao': 'Duração (min)'}
+
+    def clean(self):
+        cleaned_data = super().clean()
+        dentista, data = cleaned_data.get('dentista'), cleaned_data.get('data')
+        duracao = cleaned_data.get('duracao')
+        if dentista and data and duracao:
+            conflito = conflito_horario(
+                dentista.pk, data, data + timedelta(minutes=duracao), excluir_pk=self.instance.pk)
+            if conflito:
+                raise forms.ValidationError(mensagem_conflito(conflito))
+        return cleaned_data
+
+
+class SerieConsultaForm(forms.ModelForm):
+    """
+    Cria a série (regra completa) ou, na edição, altera só o que vale para as
+    próximas consultas: dentista, procedimento, valores, observações e horário.
+    """
+    # Só na edição
+    horario = forms.TimeField(
+        label="Horário",
+        widget=forms.TimeInput(attrs={'type': 'time'}),
+    )
+    a_partir_de = forms.DateField(
+        required=False,
+        label="Aplicar a partir de",
+        help_text="Em branco: todas as consultas futuras não concluídas da série.",
+        widget=forms.DateInput(attrs={'type': 'date'}),
+    )
+
+    CAMPOS_REGRA = ('paciente', 'inicio', 'intervalo', 'unidade', 'ocorrencias')
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        if self.instance.pk:
+            for campo in self.CAMPOS_REGRA:
+                del self.fields[campo]
+            self.initial.setdefault('horario', timezone.localtime(self.instance.inicio).time())
+        else:
+            del self.fields['horario']
+            del self.fields['a_partir_de']
+
+        # Em branco → valor base do procedimento (como na consulta avulsa)
+        self.fields['valor'].required = False
+        self.fields['valor'].help_text = "Em branco: valor do procedimento."
+
+        _preparar_campos(self, user)
+
+    class Meta:
+        model = SerieConsulta
+        fields = [
+            'paciente',
+            'dentista',
+            'procedimento',
+            'inicio',
+            'duracao',
+            'intervalo',
+            'unidade',
+            'ocorrencias',
+            'valor',
+            'desconto',
+            'observacoes',
+        ]
+        labels = {
+            'inicio': 'Primeira consulta',
+            'intervalo': 'Repetir a cada',
+            'ocorrencias': 'Nº de consultas',
+            'duracao': 'Duração (min)',
+        }
+        widgets = {
+            'inicio': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
+            'observacoes': forms.Textarea(attrs={'rows': 3}),
+        }
+
+    def clean_valor(self):
+        return self.cleaned_data.get('valor') or 0
+
+    def clean_ocorrencias(self):
+        ocorrencias = self.cleaned_data['ocorrencias']
+        if not 1 <= ocorrencias <= LIMITE_OCORRENCIAS:
+            raise forms.ValidationError(f"Informe entre 1 e {LIMITE_OCORRENCIAS} consultas.")
+        return ocorrencias
+
+    def clean_intervalo(self):
+        intervalo = self.cleaned_data['intervalo']
+        if intervalo < 1:
+            raise forms.ValidationError("O intervalo deve ser de pelo menos 1.")
+        return intervalo
+
+    def clean(self):
+        cleaned_data = super().clean()
+        dentista, duracao = cleaned_data.get('dentista'), cleaned_data.get('duracao')
+        if not dentista or not duracao or self.errors:
+            return cleaned_data
+
+        # Horários que a série vai ocupar → confere todos com uma única consulta
+        excluir = ()
+        if self.instance.pk:
+            _, futuras = consultas_futuras_serie(self.instance, cleaned_data.get('a_partir_de'))
+            ocorrencias = dict(futuras.values_list('pk', 'data'))
+            deslocamento = self.deslocamento()
+            inicios = [data + deslocamento for data in ocorrencias.values()]
+            excluir = ocorrencias.keys()
+        else:
+            regra = SerieConsulta(**{campo: cleaned_data[campo] for campo in self.CAMPOS_REGRA})
+            inicios = datas_serie(regra)
+
+        duracao = timedelta(minutes=duracao)
+        conflitos = conflitos_horarios(dentista.pk, [(i, i + duracao) for i in inicios], excluir)
+        if conflitos:
+            datas = ", ".join(timezone.localtime(inicio).strftime("%d/%m %H:%M") for inicio, _ in conflitos[:5])
+            raise forms.ValidationError(
+                f"⛔ {dentista.nome} já tem consulta em {len(conflitos)} dos horários da série: {datas}.")
+        return cleaned_data
+
+    def deslocamento(self):
+        """Diferença entre o novo horário e o atual da série (edição)."""
+        atual = timezone.localtime(self.instance.inicio)
+        novo = datetime.combine(atual.date(), self.cleaned_data['horario'])
+        return novo - atual.replace(tzinfo=None)
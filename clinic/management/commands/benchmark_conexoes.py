@@ -0,0 +1,116 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+# Modos comparados (variáveis de ambiente lidas em settings.py)
+MODOS = {
+    "sem_reuso": {"DB_POOL": "false", "DB_CONN_MAX_AGE": "0"},
+    "persistente": {"DB_POOL": "false", "DB_CONN_MAX_AGE": "600"},
+    "pool": {"DB_POOL": "true", "DB_CONN_MAX_AGE": "0"},
+}
+
+# Executado num processo novo por modo: faz as requisições pelo handler do Django
+# e, como o WSGIHandler/ASGIHandler, fecha as conexões vencidas a cada request.
+SCRIPT = """
+import json, sys, time
+import django
+django.setup()
+from django.contrib.auth.models import User
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test import Client
+
+url, requisicoes, usuario, host = sys.argv[1], int(sys.argv[2]), sys.argv[3], sys.argv[4]
+cliente = Client(HTTP_HOST=host)
+cliente.force_login(User.objects.get(username=usuario))
+
+def requisicao():
+    close_old_connections()
+    resposta = cliente.get(url)
+    close_old_connections()
+    if resposta.status_code != 200:
+        raise SystemExit(f"{url} respondeu {resposta.status_code}")
+
+for _ in range(5):  # aquecimento (imports, templates, cache)
+    requisicao()
+connection.close()
+
+abertas = []
+connection_created.connect(lambda **kw: abertas.append(1))
+tempos = []
+inicio = time.perf_counter()
+for _ in range(requisicoes):
+    t = time.perf_counter()
+    requisicao()
+    tempos.append((time.perf_counter() - t) * 1000)
+total = time.perf_counter() - inicio
+
+tempos.sort()
+print(json.dumps({
+    "rps": requisicoes / total,
+    "p50_ms": tempos[len(tempos) // 2],
+    "p95_ms": tempos[int(len(tempos) * 0.95) - 1],
+    "conexoes": len(abertas),
+    "vendor": connection.vendor,
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara requisições/segundo de uma página (padrão: dashboard) abrindo uma "
+        "conexão por request, com conexões persistentes e com o pool do psycopg. "
+        "Cada modo roda num processo novo com as variáveis DB_* correspondentes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("usuario", help="Username usado nas requisições.")
+        parser.add_argument("--url", default="/dashboard/")
+        parser.add_argument("--requisicoes", type=int, default=200)
+        parser.add_argument(
+            "--modos", default=",".join(MODOS),
+            help=f"Modos separados por vírgula ({', '.join(MODOS)}). O pool exige Postgres + psycopg 3.",
+        )
+
+    def _rodar(self, modo, options):
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "odontoia.settings"),
+            **MODOS[modo],
+        )
+        host = next((h for h in settings.ALLOWED_HOSTS if h and "*" not in h and not h.startswith(".")), "localhost")
+        proc = subprocess.run(
+            [sys.executable, "-c", SCRIPT, options["url"], str(options["requisicoes"]), options["usuario"], host],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise CommandError(f"Modo '{modo}' falhou:\n{proc.stderr[-2000:]}")
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        if not User.objects.filter(username=options["usuario"]).exists():
+            raise CommandError(f"Usuário '{options['usuario']}' não encontrado.")
+
+        modos = [m.strip() for m in options["modos"].split(",") if m.strip()]
+        invalidos = set(modos) - set(MODOS)
+        if invalidos:
+            raise CommandError(f"Modos inválidos: {', '.join(sorted(invalidos))}")
+        if "pool" in modos and settings.DATABASES["default"]["ENGINE"] != "django.db.backends.postgresql":
+            self.stdout.write("ℹ️ pool ignorado: só existe no Postgres.")
+            modos.remove("pool")
+
+        self.stdout.write(f"⏱️ {options['requisicoes']} requisições em {options['url']}")
+        base = None
+        for modo in modos:
+            r = self._rodar(modo, options)
+            base = base or r["rps"]
+            self.stdout.write(
+                f"  {modo:<12} {r['rps']:8.1f} req/s ({r['rps'] / base:4.2f}x) | "
+                f"p50 {r['p50_ms']:6.1f} ms | p95 {r['p95_ms']:6.1f} ms | "
+                f"conexões abertas: {r['conexoes']}"
+            )
@@ -0,0 +1,76 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, IntegrityError, transaction
+from django.utils import timezone
+
+from clinic.models import Consulta
+from clinic.utils.agenda import SQL_RESTRICAO_SOBREPOSICAO
+
+
+class Command(BaseCommand):
+    help = (
+        "Lista consultas sobrepostas do mesmo dentista (agenda antiga, anterior à "
+        "checagem de conflito). Com --criar-restricao cria no Postgres a "
+        "exclusion constraint consulta_sem_sobreposicao."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", help="Username do dono da clínica. Sem ele, verifica todos.")
+        parser.add_argument(
+            "--criar-restricao",
+            action="store_true",
+            help="Cria a constraint no Postgres se não houver sobreposições.",
+        )
+
+    def _sobreposicoes(self, owner):
+        consultas = Consulta.objects.filter(dentista__isnull=False, data_fim__isnull=False)
+        if owner:
+            consultas = consultas.filter(owner=owner)
+
+        # Uma passada na agenda ordenada: cruza com a consulta que termina mais tarde até aqui
+        anterior = None
+        for consulta in consultas.order_by("dentista_id", "data").values(
+            "id", "dentista_id", "dentista__nome", "data", "data_fim"
+        ).iterator():
+            if anterior and anterior["dentista_id"] == consulta["dentista_id"] \
+                    and consulta["data"] < anterior["data_fim"]:
+                yield anterior, consulta
+            if (not anterior or anterior["dentista_id"] != consulta["dentista_id"]
+                    or consulta["data_fim"] > anterior["data_fim"]):
+                anterior = consulta
+
+    def handle(self, *args, **options):
+        owner = None
+        if options["owner"]:
+            owner = User.objects.filter(username=options["owner"]).first()
+            if not owner:
+                raise CommandError(f"Usuário '{options['owner']}' não encontrado.")
+
+        total = 0
+        for a, b in self._sobreposicoes(owner):
+            total += 1
+            self.stdout.write(
+                f"  {a['dentista__nome']}: consulta #{a['id']} "
+                f"({timezone.localtime(a['data']):%d/%m/%Y %H:%M}) × #{b['id']} "
+                f"({timezone.localtime(b['data']):%d/%m/%Y %H:%M})"
+            )
+
+        if total:
+            self.stdout.write(self.style.WARNING(f"⚠️ {total} sobreposição(ões) encontrada(s)."))
+        else:
+            self.stdout.write(self.style.SUCCESS("✅ Nenhuma consulta sobreposta."))
+
+        if not options["criar_restricao"]:
+            return
+        if connection.vendor != "postgresql":
+            raise CommandError("A exclusion constraint só existe no Postgres.")
+        if total or owner:
+            raise CommandError("Resolva as sobreposições (de todas as clínicas) antes de criar a restrição.")
+
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+                cursor.execute(SQL_RESTRICAO_SOBREPOSICAO)
+        except IntegrityError as e:
+            raise CommandError(f"Não foi possível criar a restrição: {e}")
+        self.stdout.write(self.style.SUCCESS("✅ Restrição consulta_sem_sobreposicao criada."))
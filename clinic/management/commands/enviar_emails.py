@@ -0,0 +1,44 @@
+from clinic.management.worker import ComandoWorker
+from clinic.utils.emails import (
+    EMAIL_LOTE,
+    enviar_lote,
+    limpar_emails_antigos,
+    recuperar_emails_travados,
+)
+
+
+class Command(ComandoWorker):
+    help = (
+        "Worker dos e-mails transacionais: envia a caixa de saída (EmailSaida) "
+        "em lotes, por uma conexão SMTP, com novas tentativas em caso de falha."
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--lote", type=int, default=EMAIL_LOTE,
+                            help="Quantos e-mails enviar por conexão SMTP.")
+
+    def iniciar(self, options):
+        self.total = 0
+
+    def manutencao(self):
+        reenfileirados, desistidos = recuperar_emails_travados()
+        removidos = limpar_emails_antigos()
+        if reenfileirados or desistidos or removidos:
+            self.stdout.write(
+                f"🧹 Travados reenfileirados: {reenfileirados} | "
+                f"com erro: {desistidos} | antigos removidos: {removidos}"
+            )
+
+    def executar(self, options):
+        enviados, falhas = enviar_lote(options["lote"])
+        if not (enviados or falhas):
+            return False
+
+        self.total += enviados
+        self.stdout.write(f"📨 {enviados} e-mail(s) enviado(s), {falhas} falha(s)")
+        # Com falha (SMTP fora do ar?), espera o intervalo; o backoff espaça os reenvios
+        return not falhas
+
+    def finalizar(self, options):
+        self.stdout.write(self.style.SUCCESS(f"✅ {self.total} e-mail(s) enviado(s)."))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from clinic.models import ClinicaConfig
+from clinic.utils.logos import gerar_derivados_logo
+
+
+class Command(BaseCommand):
+    help = "Gera as miniaturas (PDF/menu) dos logos já enviados que ainda não têm hash."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--todas", action="store_true",
+                            help="Reprocessa também as clínicas que já têm hash.")
+
+    def handle(self, *args, **options):
+        configs = ClinicaConfig.objects.exclude(logo="").exclude(logo__isnull=True)
+        if not options["todas"]:
+            configs = configs.filter(logo_hash="")
+
+        geradas = falhas = 0
+        for config in configs.iterator():
+            try:
+                logo_hash = gerar_derivados_logo(config.logo)
+            except Exception as e:
+                falhas += 1
+                self.stderr.write(f"❌ Clínica #{config.pk}: {e}")
+                continue
+            ClinicaConfig.objects.filter(pk=config.pk).update(logo_hash=logo_hash)
+            geradas += 1
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Miniaturas geradas: {geradas} | falhas: {falhas}."))
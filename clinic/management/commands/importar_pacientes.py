@@ -0,0 +1,39 @@
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from clinic.utils.importacao import importar_pacientes
+
+
+class Command(BaseCommand):
+    help = "Importa pacientes de um arquivo CSV/XLSX (onboarding de clínicas com base própria)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("arquivo", help="Caminho do .csv ou .xlsx.")
+        parser.add_argument("--owner", required=True, help="Username do dono da clínica.")
+
+    def handle(self, *args, **options):
+        owner = User.objects.filter(username=options["owner"]).first()
+        if not owner:
+            raise CommandError(f"Usuário '{options['owner']}' não encontrado.")
+
+        caminho = options["arquivo"]
+        if not os.path.exists(caminho):
+            raise CommandError(f"Arquivo '{caminho}' não encontrado.")
+
+        inicio = time.perf_counter()
+        with open(caminho, "rb") as arquivo:
+            try:
+                resultado = importar_pacientes(arquivo, caminho, owner)
+            except ValueError as e:
+                raise CommandError(str(e))
+        duracao = time.perf_counter() - inicio
+
+        for linha, erro in resultado["erros"]:
+            self.stdout.write(f"  linha {linha}: {erro}")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Importados: {resultado['importados']} | duplicados: {len(resultado['duplicados'])} | "
+            f"erros: {len(resultado['erros'])} ({duracao:.1f}s)"
+        ))
@@ -0,0 +1,93 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Bibliotecas que só podem ser carregadas sob demanda (nunca no boot do worker)
+MODULOS_PESADOS = ("openai", "mercadopago", "pandas", "numpy", "reportlab", "openpyxl", "xlsxwriter")
+
+# Executado num processo novo: mede django.setup() + carga/resolução das URLs
+SCRIPT = """
+import json, sys, time
+inicio = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.urls import get_resolver, resolve
+get_resolver().url_patterns
+resolve("/")
+fim = time.perf_counter()
+print(json.dumps({
+    "setup_ms": (setup - inicio) * 1000,
+    "total_ms": (fim - inicio) * 1000,
+    "pesados": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o tempo de inicialização (django.setup() + URLs) num processo novo "
+        "e lista os imports mais caros. Falha se passar do limite ou se alguma "
+        "lib pesada for carregada no boot."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeticoes", type=int, default=3,
+                            help="Quantas vezes medir (vale o menor tempo).")
+        parser.add_argument("--top", type=int, default=15,
+                            help="Quantos imports mais caros listar.")
+        parser.add_argument("--limite-ms", type=float, default=None,
+                            help="Tempo total máximo aceito (ms).")
+
+    def _medir(self):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get(
+            "DJANGO_SETTINGS_MODULE", "odontoia.settings"))
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", SCRIPT % (MODULOS_PESADOS,)],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise CommandError(f"Falha ao inicializar o Django:\n{proc.stderr[-2000:]}")
+
+        resultado = json.loads(proc.stdout.strip().splitlines()[-1])
+
+        # "import time: self [us] | cumulative | imported package"
+        imports = []
+        for linha in proc.stderr.splitlines():
+            if not linha.startswith("import time:") or "imported package" in linha:
+                continue
+            _, cumulativo, nome = linha[len("import time:"):].split("|")
+            if not nome.startswith("  "):  # só os imports de primeiro nível
+                imports.append((int(cumulativo) / 1000, nome.strip()))
+        resultado["imports"] = sorted(imports, reverse=True)
+        return resultado
+
+    def handle(self, *args, **options):
+        medicoes = [self._medir() for _ in range(max(options["repeticoes"], 1))]
+        melhor = min(medicoes, key=lambda m: m["total_ms"])
+
+        self.stdout.write(
+            f"⏱️ django.setup(): {melhor['setup_ms']:.0f} ms | "
+            f"setup + URLs: {melhor['total_ms']:.0f} ms "
+            f"(melhor de {len(medicoes)})"
+        )
+        self.stdout.write("Imports mais caros (cumulativo):")
+        for ms, nome in melhor["imports"][:options["top"]]:
+            self.stdout.write(f"  {ms:8.1f} ms  {nome}")
+
+        if melhor["pesados"]:
+            raise CommandError(
+                "Libs pesadas carregadas no boot: " + ", ".join(melhor["pesados"])
+            )
+
+        limite = options["limite_ms"]
+        if limite is not None and melhor["total_ms"] > limite:
+            raise CommandError(
+                f"Inicialização levou {melhor['total_ms']:.0f} ms (limite: {limite:.0f} ms)."
+            )
+
+        self.stdout.write(self.style.SUCCESS("✅ Inicialização dentro do esperado."))
@@ -0,0 +1,42 @@
+from clinic.management.worker import ComandoWorker
+from clinic.utils.relatorios import (
+    executar_relatorio,
+    limpar_relatorios_antigos,
+    recuperar_jobs_travados,
+    reservar_proximo_job,
+)
+
+
+class Command(ComandoWorker):
+    help = (
+        "Worker das exportações em segundo plano: processa a fila RelatorioJob "
+        "(Excel/PDF) e salva os arquivos em MEDIA_ROOT/relatorios/."
+    )
+
+    def iniciar(self, options):
+        self.processados = 0
+
+    def manutencao(self):
+        reenfileirados, desistidos = recuperar_jobs_travados()
+        removidos = limpar_relatorios_antigos()
+        if reenfileirados or desistidos or removidos:
+            self.stdout.write(
+                f"🧹 Travados reenfileirados: {reenfileirados} | "
+                f"com erro: {desistidos} | antigos removidos: {removidos}"
+            )
+
+    def executar(self, options):
+        job = reservar_proximo_job()
+        if not job:
+            return False
+
+        job = executar_relatorio(job)
+        self.processados += 1
+        if job.status == "concluido":
+            self.stdout.write(f"📄 Relatório #{job.pk} ({job.tipo}) gerado: {job.arquivo.name}")
+        else:
+            self.stderr.write(f"❌ Relatório #{job.pk} ({job.tipo}) falhou: {job.erro}")
+        return True
+
+    def finalizar(self, options):
+        self.stdout.write(self.style.SUCCESS(f"✅ {self.processados} relatório(s) processado(s)."))
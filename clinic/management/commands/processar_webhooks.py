@@ -0,0 +1,55 @@
+from django.core.management.base import CommandError
+
+from clinic.management.worker import ComandoWorker
+from clinic.utils.gateway import ErroGateway, get_gateway
+from clinic.utils.pagamentos import (
+    WEBHOOK_LOTE,
+    limpar_eventos_antigos,
+    processar_eventos_webhook,
+    recuperar_eventos_travados,
+)
+
+
+class Command(ComandoWorker):
+    help = (
+        "Worker dos webhooks do Mercado Pago: processa a caixa de entrada "
+        "EventoWebhook (uma consulta ao MP por pagamento) e atualiza Pagamento/Assinatura."
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--lote", type=int, default=WEBHOOK_LOTE,
+                            help="Quantos eventos reservar por vez.")
+
+    def iniciar(self, options):
+        # Cliente do processo: as consultas reaproveitam a mesma conexão keep-alive
+        try:
+            self.gateway = get_gateway()
+        except ErroGateway as e:
+            raise CommandError(str(e))
+        self.processados = 0
+
+    def manutencao(self):
+        reenfileirados, desistidos = recuperar_eventos_travados()
+        removidos = limpar_eventos_antigos()
+        if reenfileirados or desistidos or removidos:
+            self.stdout.write(
+                f"🧹 Travados reenfileirados: {reenfileirados} | "
+                f"com erro: {desistidos} | antigos removidos: {removidos}"
+            )
+
+    def executar(self, options):
+        resumo = processar_eventos_webhook(options["lote"], self.gateway)
+        if not resumo["eventos"]:
+            return False
+
+        self.processados += resumo["eventos"]
+        self.stdout.write(
+            f"💳 {resumo['eventos']} evento(s) → {resumo['consultas']} consulta(s) ao MP, "
+            f"{resumo['alterados']} pagamento(s) atualizado(s), {resumo['erros']} erro(s)"
+        )
+        # Com erro (MP fora do ar?), espera o intervalo antes de tentar de novo
+        return not resumo["erros"]
+
+    def finalizar(self, options):
+        self.stdout.write(self.style.SUCCESS(f"✅ {self.processados} evento(s) processado(s)."))
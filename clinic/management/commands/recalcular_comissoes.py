@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from clinic.models import Dentista
+from clinic.services import recalcular_comissoes_dentista
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula comissao_valor das consultas com o percentual atual do dentista "
+        "(um UPDATE por dentista) e reconstrói o resumo diário afetado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dentista", type=int, help="ID do dentista. Sem ele, todos.")
+        parser.add_argument("--owner", help="Username do dono da clínica.")
+        parser.add_argument("--a-partir-de", help="Data de corte (AAAA-MM-DD). Sem ela, todas as consultas.")
+
+    def handle(self, *args, **options):
+        a_partir_de = None
+        if options["a_partir_de"]:
+            a_partir_de = parse_date(options["a_partir_de"])
+            if not a_partir_de:
+                raise CommandError("Data inválida; use AAAA-MM-DD.")
+
+        dentistas = Dentista.objects.all()
+        if options["dentista"]:
+            dentistas = dentistas.filter(pk=options["dentista"])
+        if options["owner"]:
+            dentistas = dentistas.filter(owner__username=options["owner"])
+        if not dentistas.exists():
+            raise CommandError("Nenhum dentista encontrado.")
+
+        total = 0
+        for dentista in dentistas:
+            atualizadas = recalcular_comissoes_dentista(dentista, a_partir_de=a_partir_de)
+            total += atualizadas
+            self.stdout.write(f"🦷 {dentista.nome} ({dentista.comissao_percentual}%): {atualizadas} consulta(s)")
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Comissões recalculadas: {total} consulta(s)."))
@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from clinic.services import reconciliar_receitas_consultas
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcilia as receitas (Income) com as consultas pagas em operações em lote: "
+        "remove sobras, corrige divergências e cria os lançamentos que faltam."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--owner",
+            help="Username do dono da clínica. Sem ele, reconcilia todos os tenants.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Só mostra quantos lançamentos seriam alterados.",
+        )
+
+    def handle(self, *args, **options):
+        owner = None
+        if options["owner"]:
+            owner = User.objects.filter(username=options["owner"]).first()
+            if not owner:
+                raise CommandError(f"Usuário '{options['owner']}' não encontrado.")
+
+        resultado = reconciliar_receitas_consultas(owner=owner, aplicar=not options["dry_run"])
+        resumo = (
+            f"removidas: {resultado['removidas']} | atualizadas: {resultado['atualizadas']} | "
+            f"criadas: {resultado['criadas']}"
+        )
+        if options["dry_run"]:
+            self.stdout.write(f"🔎 Divergências encontradas → {resumo}")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ Receitas reconciliadas → {resumo}"))
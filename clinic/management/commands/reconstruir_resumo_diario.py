@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from clinic.services import reconstruir_resumo_diario
+
+
+class Command(BaseCommand):
+    help = "Reconstrói o resumo diário de consultas (ResumoDiarioConsulta) a partir da tabela Consulta."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--owner",
+            help="Username do dono da clínica. Sem ele, reconstrói todos os tenants.",
+        )
+
+    def handle(self, *args, **options):
+        owner = None
+        if options["owner"]:
+            owner = User.objects.filter(username=options["owner"]).first()
+            if not owner:
+                raise CommandError(f"Usuário '{options['owner']}' não encontrado.")
+
+        linhas = reconstruir_resumo_diario(owner=owner)
+        self.stdout.write(self.style.SUCCESS(f"✅ Resumo diário reconstruído: {linhas} linha(s)."))
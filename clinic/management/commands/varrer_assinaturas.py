@@ -0,0 +1,22 @@
+from clinic.management.worker import ComandoWorker
+from clinic.utils.subscription import avisar_assinaturas_expirando, expirar_assinaturas
+
+
+class Command(ComandoWorker):
+    help = (
+        "Varredura das assinaturas: desliga as vencidas (Assinatura.ativa) e põe "
+        "os avisos de \"expira em breve\" na caixa de saída (manage.py enviar_emails)."
+    )
+
+    intervalo_padrao = 900
+    intervalo_manutencao = None
+
+    def executar(self, options):
+        expiradas = expirar_assinaturas()
+        avisos = avisar_assinaturas_expirando()
+        if expiradas or avisos:
+            self.stdout.write(f"📅 Assinaturas expiradas: {expiradas} | avisos enfileirados: {avisos}")
+        return False
+
+    def finalizar(self, options):
+        self.stdout.write(self.style.SUCCESS("✅ Varredura concluída."))
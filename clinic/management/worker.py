@@ -0,0 +1,81 @@
+# clinic/management/worker.py
+# Base dos comandos de worker (relatórios, webhooks, e-mails, assinaturas):
+# um loop que não morre. Erro numa iteração (banco reiniciando, pool esgotado,
+# SMTP/gateway fora do ar) é registrado, descarta as conexões quebradas e
+# espera com backoff antes de tentar de novo.
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+# Espera máxima (s) entre tentativas quando as iterações seguem falhando
+BACKOFF_MAXIMO = 300
+
+
+class ComandoWorker(BaseCommand):
+    """
+    Subclasses implementam `executar(options)` (uma iteração; retorna True se
+    ainda há trabalho imediato) e, se quiserem, `iniciar`, `manutencao` e
+    `finalizar`.
+    """
+
+    intervalo_padrao = 2.0
+    # De quanto em quanto tempo (s) roda a `manutencao`; None desliga
+    intervalo_manutencao = 3600
+
+    def add_arguments(self, parser):
+        parser.add_argument("--uma-vez", action="store_true",
+                            help="Processa o que estiver pendente e sai.")
+        parser.add_argument("--intervalo", type=float, default=self.intervalo_padrao,
+                            help="Segundos entre iterações quando não há trabalho.")
+
+    def iniciar(self, options):
+        pass
+
+    def manutencao(self):
+        pass
+
+    def executar(self, options):
+        raise NotImplementedError
+
+    def finalizar(self, options):
+        pass
+
+    def _iteracao(self, options):
+        if self.intervalo_manutencao is not None and (
+            self._ultima_manutencao is None
+            or time.monotonic() - self._ultima_manutencao > self.intervalo_manutencao
+        ):
+            self.manutencao()
+            self._ultima_manutencao = time.monotonic()
+        return self.executar(options)
+
+    def handle(self, *args, **options):
+        self.iniciar(options)
+        self._ultima_manutencao = None
+        falhas_seguidas = 0
+
+        while True:
+            try:
+                tem_mais = self._iteracao(options)
+            except Exception as e:
+                if options["uma_vez"]:
+                    raise
+                falhas_seguidas += 1
+                espera = min(options["intervalo"] * 2 ** falhas_seguidas, BACKOFF_MAXIMO)
+                self.stderr.write(f"❌ Erro no worker: {e!r} (nova tentativa em {espera:.0f}s)")
+                close_old_connections()
+                time.sleep(espera)
+                continue
+
+            falhas_seguidas = 0
+            if tem_mais:
+                continue
+            if options["uma_vez"]:
+                break
+
+            # Processo de longa duração: descarta conexões velhas/quebradas
+            close_old_connections()
+            time.sleep(options["intervalo"])
+
+        self.finalizar(options)
@@ -1,45 +1,51 @@
 # clinic/middleware.py
-import os
 from django.shortcuts import redirect
 from django.urls import reverse
-from django.conf import settings
-from .utils.subscription import verificar_assinatura
+from .utils.subscription import verificar_assinatura_request
 
 
 class TrialMiddleware:
+    # Prefixos que nunca consultam a assinatura
+    PREFIXOS_IGNORADOS = ("/static/", "/media/")
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self._rotas_livres = None
 
-    def __call__(self, request):
-        """
-        Middleware que bloqueia usuários com assinatura expirada.
-        ✅ Mesmo em DEBUG=True, impede alterações (POST).
-        """
-
-        debug_env = os.getenv("DEBUG", "False").strip().lower() == "true"
-        debug_setting = getattr(settings, "DEBUG", False)
-        print(f"🧩 TrialMiddleware → DEBUG(env)={debug_env}, DEBUG(settings)={debug_setting}, path={request.path}")
-
-        if request.user.is_authenticated:
-            ativo, dias = verificar_assinatura(request.user)
-
-            # Rotas sempre liberadas
-            rotas_livres = [
+    @property
+    def rotas_livres(self):
+        """Rotas sempre liberadas (reverse() calculado uma única vez por processo)."""
+        if self._rotas_livres is None:
+            self._rotas_livres = (
                 reverse("clinic:assinatura_expirada"),
                 reverse("clinic:logout"),
                 reverse("clinic:registrar_teste"),
                 reverse("clinic:login"),
+                # renovação: quem está com o plano vencido precisa chegar ao checkout
+                "/pagamento/",
+                "/checkout/",
                 "/api/chat/",
                 "/api/chat/diag/",
                 "/static/",
                 "/media/",
-            ]
+            )
+        return self._rotas_livres
+
+    def __call__(self, request):
+        """
+        Middleware que bloqueia usuários com assinatura expirada.
+        ✅ Mesmo em DEBUG=True, impede alterações (POST).
+        """
+        if request.path.startswith(self.PREFIXOS_IGNORADOS):
+            return self.get_response(request)
+
+        if request.user.is_authenticated:
+            ativo, dias = verificar_assinatura_request(request)
 
             # ⚠️ Se a assinatura expirou:
             if not ativo:
                 # Bloqueia qualquer tentativa de gravação (POST, PUT, DELETE)
                 if request.method in ("POST", "PUT", "DELETE"):
-                    print("🚫 Tentativa de modificação bloqueada: assinatura expirada")
                     return redirect("clinic:assinatura_expirada")
 
                 # Bloqueia navegação em rotas críticas (cadastro, edição, etc.)
@@ -47,12 +53,10 @@ class TrialMiddleware:
                     "/novo", "/editar", "/excluir", "/create", "/update"
                 ]
                 if any(r in request.path for r in rotas_restritas):
-                    print("🚫 Acesso restrito bloqueado (assinatura expirada)")
                     return redirect("clinic:assinatura_expirada")
 
                 # Permite apenas visualização de listagens e páginas livres
-                if not any(request.path.startswith(r) for r in rotas_livres):
-                    print("⚠️ Redirecionando para aviso de assinatura expirada")
+                if not any(request.path.startswith(r) for r in self.rotas_livres):
                     return redirect("clinic:assinatura_expirada")
 
         return self.get_response(request)
@@ -0,0 +1,77 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def popular_resumo_diario(apps, schema_editor):
+    Consulta = apps.get_model('clinic', 'Consulta')
+    ResumoDiarioConsulta = apps.get_model('clinic', 'ResumoDiarioConsulta')
+
+    pagas = Q(paga=True)
+    grupos = (
+        Consulta.objects.annotate(dia=TruncDate('data'))
+        .values('owner_id', 'dentista_id', 'dia')
+        .annotate(
+            qtd=Count('id'),
+            qtd_concluidas=Count('id', filter=Q(concluida=True)),
+            valor_bruto=Sum('valor_final'),
+            comissao=Sum('comissao_valor'),
+            qtd_pagas=Count('id', filter=pagas),
+            qtd_pagas_concluidas=Count('id', filter=pagas & Q(concluida=True)),
+            valor_pago=Sum('valor_final', filter=pagas),
+            comissao_paga=Sum('comissao_valor', filter=pagas),
+        )
+        .order_by()
+    )
+
+    campos = ('qtd', 'qtd_concluidas', 'valor_bruto', 'comissao',
+              'qtd_pagas', 'qtd_pagas_concluidas', 'valor_pago', 'comissao_paga')
+    ResumoDiarioConsulta.objects.bulk_create(
+        [
+            ResumoDiarioConsulta(
+                owner_id=g['owner_id'],
+                dentista_id=g['dentista_id'],
+                dia=g['dia'],
+                **{campo: g[campo] or 0 for campo in campos}
+            )
+            for g in grupos.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinic', '0022_clinicaconfig'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoDiarioConsulta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('qtd', models.PositiveIntegerField(default=0)),
+                ('qtd_concluidas', models.PositiveIntegerField(default=0)),
+                ('valor_bruto', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('comissao', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('qtd_pagas', models.PositiveIntegerField(default=0)),
+                ('qtd_pagas_concluidas', models.PositiveIntegerField(default=0)),
+                ('valor_pago', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('comissao_paga', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('dentista', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='clinic.dentista')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos_diarios', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'dia'], name='resumo_owner_dia_idx')],
+            },
+        ),
+        migrations.RunPython(popular_resumo_diario, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinic', '0024_indices_owner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consulta',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
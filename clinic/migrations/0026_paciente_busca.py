@@ -0,0 +1,64 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:17
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+# Cópia congelada de clinic.utils.busca: a migração não pode mudar se o
+# normalizador do app mudar depois.
+def normalizar_busca(texto):
+    if not texto:
+        return ''
+    sem_acento = unicodedata.normalize('NFKD', str(texto))
+    sem_acento = ''.join(c for c in sem_acento if not unicodedata.combining(c))
+    return ' '.join(sem_acento.lower().split())
+
+
+def montar_busca_paciente(nome, cidade, cpf):
+    digitos_cpf = re.sub(r'\D', '', cpf or '')
+    partes = [normalizar_busca(nome), normalizar_busca(cidade), digitos_cpf]
+    return ' ' + ' '.join(p for p in partes if p)
+
+
+def popular_busca(apps, schema_editor):
+    Paciente = apps.get_model('clinic', 'Paciente')
+    pacientes = list(Paciente.objects.only('id', 'nome', 'cidade', 'cpf'))
+    for p in pacientes:
+        p.busca = montar_busca_paciente(p.nome, p.cidade, p.cpf)
+    Paciente.objects.bulk_update(pacientes, ['busca'], batch_size=1000)
+
+
+def criar_indice_trigram(apps, schema_editor):
+    # GIN + pg_trgm acelera LIKE '%termo%' e a similaridade; só existe no Postgres.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS paciente_busca_trgm_idx '
+        'ON clinic_paciente USING gin (busca gin_trgm_ops)'
+    )
+
+
+def remover_indice_trigram(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS paciente_busca_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinic', '0025_consulta_atualizado_em'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paciente',
+            name='busca',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(popular_busca, migrations.RunPython.noop),
+        migrations.RunPython(criar_indice_trigram, remover_indice_trigram),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinic', '0027_relatoriojob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clinicaconfig',
+            name='logo_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:29
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remover_receitas_duplicadas(apps, schema_editor):
+    # Mantém o lançamento mais antigo de cada consulta antes de criar a unicidade
+    Income = apps.get_model('clinic', 'Income')
+    duplicadas = (
+        Income.objects.filter(consulta__isnull=False)
+        .values('consulta_id')
+        .annotate(total=Count('id'), primeira=Min('id'))
+        .filter(total__gt=1)
+    )
+    for d in duplicadas:
+        Income.objects.filter(consulta_id=d['consulta_id']).exclude(pk=d['primeira']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinic', '0028_clinicaconfig_logo_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remover_receitas_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='income',
+            constraint=models.UniqueConstraint(fields=('consulta',), name='income_consulta_unica'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinic', '0029_income_consulta_unica'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerieConsulta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inicio', models.DateTimeField(help_text='Data/hora da primeira consulta')),
+                ('intervalo', models.PositiveSmallIntegerField(default=4)),
+                ('unidade', models.CharField(choices=[('semanas', 'Semanas'), ('meses', 'Meses')], default='semanas', max_length=10)),
+                ('ocorrencias', models.PositiveSmallIntegerField(default=12)),
+                ('valor', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('desconto', models.DecimalField(decimal_places=2, default=0.0, help_text='Desconto em %', max_digits=5)),
+                ('observacoes', models.TextField(blank=True, null=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('dentista', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='clinic.dentista')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_consultas', to=settings.AUTH_USER_MODEL)),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='clinic.paciente')),
+                ('procedimento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='clinic.procedimento')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='consulta',
+            name='serie',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='consultas', to='clinic.serieconsulta'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:37
+
+from datetime import timedelta
+
+import django.core.validators
+from django.conf import settings
+from django.db import IntegrityError, migrations, models, transaction
+from django.db.models import F
+
+
+def preencher_data_fim(apps, schema_editor):
+    Consulta = apps.get_model('clinic', 'Consulta')
+    Consulta.objects.update(data_fim=F('data') + timedelta(minutes=30))
+
+
+def criar_exclusao_sobreposicao(apps, schema_editor):
+    # Impede no próprio banco duas consultas do mesmo dentista no mesmo horário
+    # (GiST sobre tstzrange). Só existe no Postgres; no SQLite vale a checagem
+    # indexada de utils/agenda.py.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute(
+                'ALTER TABLE clinic_consulta ADD CONSTRAINT consulta_sem_sobreposicao '
+                "EXCLUDE USING gist (dentista_id WITH =, tstzrange(data, data_fim, '[)') WITH &&) "
+                'WHERE (dentista_id IS NOT NULL AND data_fim IS NOT NULL)'
+            )
+    except IntegrityError:
+        # Agenda antiga já tem consultas sobrepostas: segue só com a checagem da aplicação
+        print(
+            "\n⚠️ consulta_sem_sobreposicao não criada: existem consultas sobrepostas "
+            "do mesmo dentista. Liste-as com `python manage.py conflitos_agenda` e, depois "
+            "de ajustá-las, crie a restrição com `python manage.py conflitos_agenda --criar-restricao`."
+        )
+
+
+def remover_exclusao_sobreposicao(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('ALTER TABLE clinic_consulta DROP CONSTRAINT IF EXISTS consulta_sem_sobreposicao')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinic', '0030_serieconsulta'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consulta',
+            name='data_fim',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='consulta',
+            name='duracao',
+            field=models.PositiveSmallIntegerField(default=30, help_text='Duração em minutos', validators=[django.core.validators.MinValueValidator(5), django.core.validators.MaxValueValidator(480)]),
+        ),
+        migrations.AddField(
+            model_name='serieconsulta',
+            name='duracao',
+            field=models.PositiveSmallIntegerField(default=30, help_text='Duração em minutos', validators=[django.core.validators.MinValueValidator(5), django.core.validators.MaxValueValidator(480)]),
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(fields=['dentista', 'data', 'data_fim'], name='consulta_dentista_periodo_idx'),
+        ),
+        migrations.RunPython(preencher_data_fim, migrations.RunPython.noop),
+        migrations.RunPython(criar_exclusao_sobreposicao, remover_exclusao_sobreposicao),
+    ]
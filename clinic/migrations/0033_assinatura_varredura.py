@@ -0,0 +1,36 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:48
+
+from datetime import datetime, time
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def expirar_vencidas(apps, schema_editor):
+    # Até aqui `ativa` nunca era desligada: alinha o flag com o fim_teste
+    # (mesma regra de utils/subscription.expirar_assinaturas)
+    Assinatura = apps.get_model('clinic', 'Assinatura')
+    inicio_hoje = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    Assinatura.objects.filter(ativa=True, fim_teste__lt=inicio_hoje).update(ativa=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinic', '0032_eventowebhook'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assinatura',
+            name='aviso_expiracao_para',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='assinatura',
+            index=models.Index(fields=['ativa', 'fim_teste'], name='assinatura_ativa_fim_idx'),
+        ),
+        migrations.RunPython(expirar_vencidas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:04
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def remover_resumos_duplicados(apps, schema_editor):
+    # Mantém a linha gravada por último de cada (owner, dentista, dia); para
+    # totais exatos, rode `manage.py reconstruir_resumo_diario` depois.
+    ResumoDiarioConsulta = apps.get_model('clinic', 'ResumoDiarioConsulta')
+    duplicados = (
+        ResumoDiarioConsulta.objects.values('owner_id', 'dentista_id', 'dia')
+        .annotate(total=Count('id'), ultima=Max('id'))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for d in duplicados:
+        ResumoDiarioConsulta.objects.filter(
+            owner_id=d['owner_id'], dentista_id=d['dentista_id'], dia=d['dia']
+        ).exclude(pk=d['ultima']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinic', '0034_emailsaida'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remover_resumos_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='resumodiarioconsulta',
+            constraint=models.UniqueConstraint(condition=models.Q(('dentista__isnull', False)), fields=('owner', 'dentista', 'dia'), name='resumo_owner_dentista_dia_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='resumodiarioconsulta',
+            constraint=models.UniqueConstraint(condition=models.Q(('dentista__isnull', True)), fields=('owner', 'dia'), name='resumo_owner_dia_sem_dentista_unico'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinic', '0035_resumo_diario_unico'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='consulta',
+            name='consulta_pendente_idx',
+        ),
+        migrations.AddIndex(
+            model_name='consulta',
+            index=models.Index(condition=models.Q(('concluida', False)), fields=['owner', '-data', '-id'], name='consulta_pendente_idx'),
+        ),
+    ]
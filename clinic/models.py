@@ -1,8 +1,12 @@
 from django.contrib.auth.models import User
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import timedelta
 from decimal import Decimal
+from .utils.busca import montar_busca_paciente
+from .utils.logos import url_logo
 
 
 def default_fim_teste():
@@ -22,7 +26,16 @@ class Assinatura(models.Model):
     tipo = models.CharField(max_length=20, choices=PLANOS, default="trial")
     inicio_teste = models.DateTimeField(default=timezone.now)
     fim_teste = models.DateTimeField(default=default_fim_teste)
+    # Mantido pelo `manage.py varrer_assinaturas`: vira False quando o plano vence
     ativa = models.BooleanField(default=True)
+    # fim_teste ao qual o último aviso "expira em breve" se referia (renovou → avisa de novo)
+    aviso_expiracao_para = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # varredura: ativas com fim_teste vencido / perto de vencer
+            models.Index(fields=['ativa', 'fim_teste'], name='assinatura_ativa_fim_idx'),
+        ]
 
     def dias_restantes(self):
         """Calcula quantos dias faltam até o fim do teste ou plano."""
@@ -72,6 +85,22 @@ class Paciente(models.Model):
 
     data_cadastro = models.DateTimeField(default=timezone.now)
 
+    # 🔎 Nome/cidade/CPF normalizados (sem acento, minúsculo) para a busca.
+    # No Postgres tem índice GIN pg_trgm (migração 0026).
+    busca = models.CharField(max_length=255, blank=True, default="", editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'data_cadastro'], name='paciente_owner_cadastro_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.busca = montar_busca_paciente(self.nome, self.cidade, self.cpf)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"nome", "cidade", "cpf"} & set(update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"busca"}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.nome
 
@@ -116,12 +145,22 @@ class Procedimento(models.Model):
         return f"{self.nome} - R$ {self.valor_base}"
 
 
+# Duração das consultas (min). A máxima também limita a janela da checagem de conflito.
+DURACAO_PADRAO_MINUTOS = 30
+DURACAO_MAXIMA_MINUTOS = 480
+VALIDADORES_DURACAO = [MinValueValidator(5), MaxValueValidator(DURACAO_MAXIMA_MINUTOS)]
+
+
 class Consulta(models.Model):
     paciente = models.ForeignKey('Paciente', on_delete=models.CASCADE)
     dentista = models.ForeignKey(
         'Dentista', on_delete=models.SET_NULL, null=True, blank=True)
     procedimento = models.ForeignKey('Procedimento', on_delete=models.CASCADE)
     data = models.DateTimeField()
+    duracao = models.PositiveSmallIntegerField(
+        default=DURACAO_PADRAO_MINUTOS, validators=VALIDADORES_DURACAO, help_text="Duração em minutos")
+    # data + duracao (preenchido no save) → checagem de conflito por dentista
+    data_fim = models.DateTimeField(null=True, blank=True, editable=False)
     concluida = models.BooleanField(default=False)
     paga = models.BooleanField(default=False)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -141,29 +180,167 @@ class Consulta(models.Model):
     
     observacoes = models.TextField(blank=True, null=True)
 
+    # 🔁 Ocorrência de uma série recorrente (ex.: manutenção ortodôntica)
+    serie = models.ForeignKey(
+        'SerieConsulta', on_delete=models.SET_NULL, null=True, blank=True, related_name='consultas')
+
+    # Usado como versão (ETag/Last-Modified) do feed do calendário
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Listagens, agenda e filtros por período
+            models.Index(fields=['owner', 'data'], name='consulta_owner_data_idx'),
+            # Dashboard / financeiro (somente pagas)
+            models.Index(fields=['owner', 'paga', 'data'], name='consulta_owner_paga_data_idx'),
+            models.Index(fields=['owner', 'concluida'], name='consulta_owner_concluida_idx'),
+            # Conflito de horário / horários livres do dentista (utils/agenda.py).
+            # No Postgres há também a exclusion constraint consulta_sem_sobreposicao.
+            models.Index(fields=['dentista', 'data', 'data_fim'], name='consulta_dentista_periodo_idx'),
+            # Filtro "pendentes" da listagem de consultas (ordem do cursor: -data, -pk)
+            models.Index(
+                fields=['owner', '-data', '-id'],
+                name='consulta_pendente_idx',
+                condition=models.Q(concluida=False),
+            ),
+        ]
+
     def save(self, *args, **kwargs):
         # Define valor base se estiver vazio
         if (not self.valor or self.valor == 0) and self.procedimento:
             self.valor = self.procedimento.valor_base
 
+        # Fim da consulta
+        data = parse_datetime(self.data) if isinstance(self.data, str) else self.data
+        if data:
+            self.data_fim = data + timedelta(minutes=self.duracao or DURACAO_PADRAO_MINUTOS)
+
         # Aplica desconto
         if self.valor:
             desconto_decimal = Decimal(self.desconto or 0) / 100
             self.valor_final = self.valor * (Decimal(1) - desconto_decimal)
 
-        # Calcula comissão
-        if self.dentista and self.valor_final:
-            percentual = Decimal(self.dentista.comissao_percentual or 0) / 100
-            self.comissao_valor = self.valor_final * percentual
-        else:
-            self.comissao_valor = Decimal(0)
+        # Calcula comissão — só quando dentista ou valor mudaram (evita carregar
+        # o dentista a cada save). Mudança de percentual é aplicada em lote por
+        # services.recalcular_comissoes_dentista.
+        base_comissao = (self.dentista_id, self.valor_final)
+        if self._state.adding or base_comissao != getattr(self, "_base_comissao_original", None):
+            if self.dentista and self.valor_final:
+                percentual = Decimal(self.dentista.comissao_percentual or 0) / 100
+                self.comissao_valor = self.valor_final * percentual
+            else:
+                self.comissao_valor = Decimal(0)
 
         super().save(*args, **kwargs)
+        self._base_comissao_original = base_comissao
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guarda o dia/dentista originais para atualizar o resumo diário antigo
+        # (via __dict__: não força o carregamento de campos adiados com .only())
+        if {'owner_id', 'dentista_id', 'data'} <= instance.__dict__.keys():
+            instance._chave_resumo_original = instance.chave_resumo()
+        instance._base_comissao_original = (
+            instance.__dict__.get("dentista_id"), instance.__dict__.get("valor_final"))
+        return instance
+
+    def chave_resumo(self):
+        """Retorna (owner_id, dentista_id, dia) usada no ResumoDiarioConsulta."""
+        data = self.data
+        if isinstance(data, str):
+            data = parse_datetime(data)
+        if data is None:
+            return None
+        dia = timezone.localtime(data).date() if timezone.is_aware(data) else data.date()
+        return (self.owner_id, self.dentista_id, dia)
 
     def __str__(self):
         return f"{self.paciente.nome} - {self.dentista.nome if self.dentista else 'Sem dentista'} ({self.data.strftime('%d/%m/%Y')})"
 
 
+class SerieConsulta(models.Model):
+    """
+    Regra de recorrência ("a cada 4 semanas, 12 vezes"). As consultas são
+    geradas de uma vez por services.gerar_consultas_serie e as alterações
+    da série aplicadas às futuras por services.atualizar_consultas_serie.
+    """
+    UNIDADE_CHOICES = [
+        ('semanas', 'Semanas'),
+        ('meses', 'Meses'),
+    ]
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='series_consultas')
+    paciente = models.ForeignKey('Paciente', on_delete=models.CASCADE)
+    dentista = models.ForeignKey(
+        'Dentista', on_delete=models.SET_NULL, null=True, blank=True)
+    procedimento = models.ForeignKey('Procedimento', on_delete=models.CASCADE)
+
+    inicio = models.DateTimeField(help_text="Data/hora da primeira consulta")
+    duracao = models.PositiveSmallIntegerField(
+        default=DURACAO_PADRAO_MINUTOS, validators=VALIDADORES_DURACAO, help_text="Duração em minutos")
+    intervalo = models.PositiveSmallIntegerField(default=4)
+    unidade = models.CharField(max_length=10, choices=UNIDADE_CHOICES, default='semanas')
+    ocorrencias = models.PositiveSmallIntegerField(default=12)
+
+    valor = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    desconto = models.DecimalField(
+        max_digits=5, decimal_places=2, default=0.00, help_text="Desconto em %")
+    observacoes = models.TextField(blank=True, null=True)
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.paciente.nome} - a cada {self.intervalo} {self.get_unidade_display().lower()} ({self.ocorrencias}x)"
+
+
+class ResumoDiarioConsulta(models.Model):
+    """
+    Totais diários de consultas por (owner, dentista, dia).
+    Mantido pelos signals de Consulta e reconstruível com
+    `python manage.py reconstruir_resumo_diario`.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='resumos_diarios')
+    dentista = models.ForeignKey(
+        'Dentista', on_delete=models.SET_NULL, null=True, blank=True)
+    dia = models.DateField()
+
+    qtd = models.PositiveIntegerField(default=0)
+    qtd_concluidas = models.PositiveIntegerField(default=0)
+    valor_bruto = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    comissao = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    # 💰 Somente consultas pagas
+    qtd_pagas = models.PositiveIntegerField(default=0)
+    qtd_pagas_concluidas = models.PositiveIntegerField(default=0)
+    valor_pago = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    comissao_paga = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'dia'], name='resumo_owner_dia_idx'),
+        ]
+        # Uma linha por (owner, dentista, dia). NULL não colide com NULL num
+        # UNIQUE, então as consultas sem dentista têm a sua própria restrição.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['owner', 'dentista', 'dia'],
+                condition=models.Q(dentista__isnull=False),
+                name='resumo_owner_dentista_dia_unico',
+            ),
+            models.UniqueConstraint(
+                fields=['owner', 'dia'],
+                condition=models.Q(dentista__isnull=True),
+                name='resumo_owner_dia_sem_dentista_unico',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.owner.username} - {self.dia:%d/%m/%Y} ({self.qtd} consultas)"
+
+
 class Pagamento(models.Model):
     """
     Registra transações de pagamento vinculadas a uma Assinatura.
@@ -214,6 +391,15 @@ class Income(models.Model):
 
     criado_em = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'data'], name='income_owner_data_idx'),
+        ]
+        constraints = [
+            # no máximo um lançamento por consulta (upsert em services.sincronizar_receita_consulta)
+            models.UniqueConstraint(fields=['consulta'], name='income_consulta_unica'),
+        ]
+
     def __str__(self):
         return f"{self.descricao} - R$ {self.valor:.2f}" 
 
@@ -229,6 +415,11 @@ class Expense(models.Model):
 
     criado_em = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'data'], name='expense_owner_data_idx'),
+        ]
+
     def __str__(self):
         return f"{self.categoria} - R$ {self.valor:.2f}"
     
@@ -242,6 +433,8 @@ class ClinicaConfig(models.Model):
     )
     nome_clinica = models.CharField(max_length=255, default="Minha Clínica")
     logo = models.ImageField(upload_to="logos_clinicas/", blank=True, null=True)
+    # sha256 do logo: nomeia as miniaturas geradas em signals.py (utils/logos.py)
+    logo_hash = models.CharField(max_length=64, blank=True, default="", editable=False)
     cor_primaria = models.CharField(max_length=20, blank=True, null=True, help_text="Ex: #0033ff")
     cor_secundaria = models.CharField(max_length=20, blank=True, null=True)
     rodape_pdf = models.CharField(max_length=255, blank=True, null=True)
@@ -252,14 +445,127 @@ class ClinicaConfig(models.Model):
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Logo original, para só regerar as miniaturas quando ele mudar
+        instance._logo_original = instance.logo.name or ""
+        return instance
+
+    @property
+    def logo_menu_url(self):
+        """Logo reduzido para navbar/sidebar (o original se a miniatura ainda não existir)."""
+        return url_logo(self, "menu")
+
+    @property
+    def logo_pdf_url(self):
+        return url_logo(self, "pdf")
+
     def __str__(self):
         return f"Configuração da clínica de {self.owner.username}"
 
 
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-@receiver(post_save, sender=Assinatura)
-def criar_config_clinica(sender, instance, created, **kwargs):
-    """Cria uma configuração de clínica padrão ao ativar o plano Premium."""
-    if instance.tipo == 'premium' and instance.ativa:
-        ClinicaConfig.objects.get_or_create(owner=instance.user)
+
+# Exportações (Excel/PDF) geradas em segundo plano por `manage.py processar_relatorios`
+class RelatorioJob(models.Model):
+    TIPO_CHOICES = [
+        ('excel', 'Excel'),
+        ('pdf', 'PDF'),
+    ]
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('concluido', 'Concluído'),
+        ('erro', 'Erro'),
+    ]
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='relatorios')
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    parametros = models.JSONField(default=dict, blank=True)  # mes/ano ou data_inicio/data_fim
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    arquivo = models.FileField(upload_to='relatorios/', blank=True)
+    nome_arquivo = models.CharField(max_length=255, blank=True)
+    erro = models.TextField(blank=True)
+    tentativas = models.PositiveSmallIntegerField(default=0)
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # fila do worker: pendentes mais antigos primeiro
+            models.Index(fields=['status', 'criado_em'], name='relatorio_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.pk} ({self.status})"
+
+class EventoWebhook(models.Model):
+    """
+    Caixa de entrada das notificações do gateway: o webhook só grava o evento
+    e responde 200; o `manage.py processar_webhooks` aplica depois.
+    """
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('processado', 'Processado'),
+        ('ignorado', 'Ignorado'),
+        ('erro', 'Erro'),
+    ]
+
+    gateway = models.CharField(max_length=50, default='mercadopago')
+    tipo = models.CharField(max_length=50, blank=True)  # "payment", "merchant_order"...
+    recurso_id = models.CharField(max_length=64, blank=True, db_index=True)  # id do pagamento no MP
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    erro = models.TextField(blank=True)
+    tentativas = models.PositiveSmallIntegerField(default=0)
+
+    recebido_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    processado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # fila do worker: pendentes mais antigos primeiro
+            models.Index(fields=['status', 'recebido_em'], name='webhook_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.gateway} {self.tipo} {self.recurso_id} ({self.status})"
+
+class EmailSaida(models.Model):
+    """
+    Caixa de saída dos e-mails transacionais: a view só grava a mensagem;
+    o `manage.py enviar_emails` envia em lote por uma conexão SMTP.
+    """
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('enviando', 'Enviando'),
+        ('enviado', 'Enviado'),
+        ('erro', 'Erro'),
+    ]
+
+    assunto = models.CharField(max_length=255)
+    corpo = models.TextField()
+    html = models.TextField(blank=True)
+    remetente = models.CharField(max_length=255, blank=True)  # vazio → DEFAULT_FROM_EMAIL
+    destinatarios = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    erro = models.TextField(blank=True)
+    tentativas = models.PositiveSmallIntegerField(default=0)
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+    proxima_tentativa = models.DateTimeField(default=timezone.now)  # backoff entre as falhas
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    enviado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # fila do worker: pendentes cuja vez já chegou
+            models.Index(fields=['status', 'proxima_tentativa'], name='email_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.assunto} → {', '.join(self.destinatarios)} ({self.status})"
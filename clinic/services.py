@@ -1,5 +1,11 @@
-from django.db.models import Sum
-from .models import Income, Expense 
+import calendar
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Sum, Count, Q, F, OuterRef, Subquery, Value, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce, Concat, TruncDate, TruncMonth
+from .models import Income, Expense, Consulta, ResumoDiarioConsulta
+from .utils.contexto_dinamico import invalidar_contexto_dinamico
 from django.utils import timezone
 
 
@@ -63,4 +69,497 @@ def get_graficos_financeiros(owner, ano):
         "valores_categorias": valores_categorias,
         "labels_receitas_origem": labels_receitas_origem,
         "valores_receitas_origem": valores_receitas_origem,
-    }
\ No newline at end of file
+    }
+
+# Resumo diário de consultas (rollup por owner / dentista / dia)
+def _agregados_resumo():
+    pagas = Q(paga=True)
+    return {
+        'qtd': Count('id'),
+        'qtd_concluidas': Count('id', filter=Q(concluida=True)),
+        'valor_bruto': Sum('valor_final'),
+        'comissao': Sum('comissao_valor'),
+        'qtd_pagas': Count('id', filter=pagas),
+        'qtd_pagas_concluidas': Count('id', filter=pagas & Q(concluida=True)),
+        'valor_pago': Sum('valor_final', filter=pagas),
+        'comissao_paga': Sum('comissao_valor', filter=pagas),
+    }
+
+
+def _linha_resumo(totais):
+    """Normaliza os agregados (None → 0) para gravar no ResumoDiarioConsulta."""
+    return {campo: totais[campo] or 0 for campo in _agregados_resumo()}
+
+
+def atualizar_resumo_diario(owner_id, dentista_id, dia):
+    """
+    Recalcula uma única linha do resumo a partir das consultas daquele dia.
+    Chamado pelos signals de Consulta (save/delete). A linha é travada
+    (select_for_update) antes do agregado e a gravação é um upsert na chave
+    única: dois saves concorrentes no mesmo dia não duplicam a linha.
+    """
+    inicio = timezone.make_aware(datetime.combine(dia, time.min))
+    fim = inicio + timedelta(days=1)
+    chave = {'owner_id': owner_id, 'dentista_id': dentista_id, 'dia': dia}
+
+    with transaction.atomic():
+        list(ResumoDiarioConsulta.objects.select_for_update().filter(**chave))
+
+        totais = Consulta.objects.filter(
+            owner_id=owner_id,
+            dentista_id=dentista_id,
+            data__gte=inicio,
+            data__lt=fim,
+        ).aggregate(**_agregados_resumo())
+
+        if totais['qtd']:
+            ResumoDiarioConsulta.objects.update_or_create(**chave, defaults=_linha_resumo(totais))
+        else:
+            ResumoDiarioConsulta.objects.filter(**chave).delete()
+
+
+def reconstruir_resumo_diario(owner=None, dentista=None, a_partir_de=None, batch_size=1000):
+    """
+    Reconstrói o resumo diário com uma única consulta agrupada.
+    Sem `owner`, reconstrói todos os tenants; `dentista` e `a_partir_de` (date)
+    restringem a reconstrução. Retorna o nº de linhas criadas.
+    """
+    consultas = Consulta.objects.all()
+    resumos = ResumoDiarioConsulta.objects.all()
+    if owner is not None:
+        consultas = consultas.filter(owner=owner)
+        resumos = resumos.filter(owner=owner)
+    if dentista is not None:
+        consultas = consultas.filter(dentista=dentista)
+        resumos = resumos.filter(dentista=dentista)
+    if a_partir_de is not None:
+        consultas = consultas.filter(data__gte=timezone.make_aware(datetime.combine(a_partir_de, time.min)))
+        resumos = resumos.filter(dia__gte=a_partir_de)
+
+    grupos = (
+        consultas.annotate(dia=TruncDate('data'))
+        .values('owner_id', 'dentista_id', 'dia')
+        .annotate(**_agregados_resumo())
+        .order_by()
+    )
+
+    with transaction.atomic():
+        resumos.delete()
+        linhas = [
+            ResumoDiarioConsulta(
+                owner_id=g['owner_id'],
+                dentista_id=g['dentista_id'],
+                dia=g['dia'],
+                **_linha_resumo(g)
+            )
+            for g in grupos.iterator()
+        ]
+        ResumoDiarioConsulta.objects.bulk_create(linhas, batch_size=batch_size)
+
+    return len(linhas)
+
+
+# Comissões: recálculo em lote quando o percentual do dentista muda
+def recalcular_comissoes_dentista(dentista, a_partir_de=None):
+    """
+    Recalcula comissao_valor das consultas do dentista com um único
+    UPDATE ... SET comissao_valor = valor_final * pct/100, opcionalmente só
+    das consultas a partir de `a_partir_de` (date). Como update() não dispara
+    signals, o resumo diário do dentista no período é reconstruído em seguida.
+    Retorna o nº de consultas atualizadas.
+    """
+    # fator já dividido por 100 aqui: no SQLite, inteiro / 100 seria divisão inteira
+    fator = Decimal(dentista.comissao_percentual or 0) / Decimal(100)
+    consultas = Consulta.objects.filter(dentista=dentista)
+    if a_partir_de is not None:
+        consultas = consultas.filter(data__gte=timezone.make_aware(datetime.combine(a_partir_de, time.min)))
+
+    comissao = ExpressionWrapper(
+        Coalesce(F('valor_final'), Value(Decimal(0))) * Value(fator),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+    with transaction.atomic():
+        atualizadas = consultas.update(comissao_valor=comissao, atualizado_em=timezone.now())
+        reconstruir_resumo_diario(owner=dentista.owner_id, dentista=dentista, a_partir_de=a_partir_de)
+
+    invalidar_contexto_dinamico(dentista.owner_id)
+    return atualizadas
+
+
+# Séries de consultas recorrentes (SerieConsulta)
+def _somar_meses(data, meses):
+    """Mesmo dia `meses` depois (31/01 + 1 mês → 28/02 ou 29/02)."""
+    mes = data.month - 1 + meses
+    ano, mes = data.year + mes // 12, mes % 12 + 1
+    dia = min(data.day, calendar.monthrange(ano, mes)[1])
+    return data.replace(year=ano, month=mes, day=dia)
+
+
+def datas_serie(serie):
+    """
+    Datas/horas das ocorrências da série. O passo é aplicado no horário local,
+    então a consulta das 14h continua às 14h depois da mudança de fuso/horário de verão.
+    """
+    inicio = timezone.localtime(serie.inicio) if timezone.is_aware(serie.inicio) else serie.inicio
+    inicio = inicio.replace(tzinfo=None)
+
+    datas = []
+    for n in range(serie.ocorrencias):
+        if serie.unidade == 'meses':
+            data = _somar_meses(inicio, serie.intervalo * n)
+        else:
+            data = inicio + timedelta(weeks=serie.intervalo * n)
+        datas.append(timezone.make_aware(data))
+    return datas
+
+
+def valores_consulta(valor, desconto, comissao_percentual):
+    """(valor_final, comissao_valor) pela mesma regra de Consulta.save()."""
+    valor_final = Decimal(valor or 0) * (Decimal(1) - Decimal(desconto or 0) / 100)
+    comissao = valor_final * Decimal(comissao_percentual or 0) / 100
+    return valor_final, comissao
+
+
+def _valores_serie(serie):
+    valor = serie.valor or serie.procedimento.valor_base
+    percentual = serie.dentista.comissao_percentual if serie.dentista_id else 0
+    return (valor, *valores_consulta(valor, serie.desconto, percentual))
+
+
+def gerar_consultas_serie(serie):
+    """
+    Expande a série em consultas com um único bulk_create, com valor final e
+    comissão já calculados aqui (sem save() nem busca de FK por consulta).
+    Como bulk_create não dispara signals, o resumo diário é reconstruído a
+    partir da 1ª ocorrência. Retorna as consultas criadas.
+    """
+    valor, valor_final, comissao = _valores_serie(serie)
+    consultas = [
+        Consulta(
+            owner_id=serie.owner_id,
+            paciente_id=serie.paciente_id,
+            dentista_id=serie.dentista_id,
+            procedimento_id=serie.procedimento_id,
+            serie=serie,
+            data=data,
+            duracao=serie.duracao,
+            data_fim=data + timedelta(minutes=serie.duracao),
+            valor=valor,
+            desconto=serie.desconto,
+            valor_final=valor_final,
+            comissao_valor=comissao,
+            observacoes=serie.observacoes,
+        )
+        for data in datas_serie(serie)
+    ]
+    if not consultas:
+        return []
+
+    with transaction.atomic():
+        Consulta.objects.bulk_create(consultas)
+        reconstruir_resumo_diario(
+            owner=serie.owner_id,
+            dentista=serie.dentista_id,
+            a_partir_de=timezone.localtime(consultas[0].data).date(),
+        )
+
+    invalidar_contexto_dinamico(serie.owner_id)
+    return consultas
+
+
+def consultas_futuras_serie(serie, a_partir_de=None):
+    """(início, queryset) das ocorrências ainda por vir e não concluídas da série."""
+    inicio = timezone.now()
+    if a_partir_de is not None:
+        inicio = max(inicio, timezone.make_aware(datetime.combine(a_partir_de, time.min)))
+    return inicio, serie.consultas.filter(data__gte=inicio, concluida=False)
+
+
+def atualizar_consultas_serie(serie, a_partir_de=None, deslocamento=None):
+    """
+    Aplica os dados atuais da série (dentista, procedimento, valores, duração,
+    observações) às ocorrências futuras e não concluídas com um único UPDATE.
+    `deslocamento` (timedelta) muda o horário de todas elas (data = data + Δ).
+    Em seguida reconstrói o resumo diário e, se alguma já estava paga,
+    reconcilia as receitas. Retorna o nº de consultas atualizadas.
+    """
+    inicio, futuras = consultas_futuras_serie(serie, a_partir_de)
+    deslocamento = deslocamento or timedelta(0)
+
+    valor, valor_final, comissao = _valores_serie(serie)
+    campos = {
+        'dentista_id': serie.dentista_id,
+        'procedimento_id': serie.procedimento_id,
+        'valor': valor,
+        'desconto': serie.desconto,
+        'valor_final': valor_final,
+        'comissao_valor': comissao,
+        'observacoes': serie.observacoes,
+        'duracao': serie.duracao,
+        # no UPDATE o F('data') é o valor antigo
+        'data_fim': F('data') + (deslocamento + timedelta(minutes=serie.duracao)),
+        'atualizado_em': timezone.now(),
+    }
+    if deslocamento:
+        campos['data'] = F('data') + deslocamento
+
+    with transaction.atomic():
+        tem_pagas = futuras.filter(paga=True).exists()
+        atualizadas = futuras.update(**campos)
+        # dentista pode ter mudado → reconstrói o resumo de todos os dentistas do período
+        desde = inicio + min(deslocamento, timedelta(0))
+        reconstruir_resumo_diario(owner=serie.owner_id, a_partir_de=timezone.localtime(desde).date())
+        if tem_pagas:
+            reconciliar_receitas_consultas(owner=serie.owner_id)
+
+    invalidar_contexto_dinamico(serie.owner_id)
+    return atualizadas
+
+
+# Receitas (Income) das consultas pagas — uma linha por consulta (consulta_id único)
+def _descricao_receita(nome_paciente):
+    return f"Consulta - {nome_paciente}"
+
+
+def sincronizar_receita_consulta(consulta):
+    """
+    Mantém o lançamento financeiro da consulta: paga → upsert do Income
+    (chave consulta_id) com valor/data/dono atuais; não paga → remove.
+    Chamado pelos signals de Consulta (save).
+    """
+    with transaction.atomic():
+        if not consulta.paga:
+            Income.objects.filter(consulta_id=consulta.pk, origem='consulta').delete()
+            return None
+
+        chave = consulta.chave_resumo()
+        receita, _ = Income.objects.update_or_create(
+            consulta_id=consulta.pk,
+            defaults={
+                'owner_id': consulta.owner_id,
+                'origem': 'consulta',
+                'descricao': _descricao_receita(consulta.paciente.nome),
+                'valor': consulta.valor_final or 0,
+                'data': chave[2] if chave else timezone.localdate(),
+                'pago': True,
+            },
+        )
+        return receita
+
+
+def remover_receita_consulta(consulta_id):
+    """Consulta excluída → o lançamento dela sai junto (chamado no pre_delete)."""
+    Income.objects.filter(consulta_id=consulta_id, origem='consulta').delete()
+
+
+def reconciliar_receitas_consultas(owner=None, aplicar=True, batch_size=1000):
+    """
+    Corrige a divergência entre consultas pagas e receitas em poucas operações
+    em lote (sem percorrer consulta por consulta):
+      - remove receitas de consultas não pagas ou já excluídas;
+      - atualiza com UPDATE ... SET = (subquery) as que divergem em valor/data/dono/descrição;
+      - cria (bulk_create) as que faltam.
+    Com aplicar=False só conta. Retorna {'removidas', 'atualizadas', 'criadas'}.
+    """
+    receitas = Income.objects.filter(origem='consulta')
+    consultas = Consulta.objects.all()
+    if owner is not None:
+        receitas = receitas.filter(Q(owner=owner) | Q(consulta__owner=owner))
+        consultas = consultas.filter(owner=owner)
+
+    sobrando = receitas.filter(Q(consulta__isnull=True) | Q(consulta__paga=False))
+
+    divergentes = (
+        receitas.filter(consulta__paga=True)
+        .annotate(
+            dia_consulta=TruncDate('consulta__data'),
+            descricao_consulta=Concat(Value('Consulta - '), 'consulta__paciente__nome'),
+        )
+        .filter(
+            ~Q(valor=F('consulta__valor_final'))
+            | ~Q(data=F('dia_consulta'))
+            | ~Q(owner_id=F('consulta__owner_id'))
+            | ~Q(descricao=F('descricao_consulta'))
+            | Q(pago=False)
+        )
+    )
+
+    faltando = consultas.filter(paga=True, income__isnull=True)
+
+    if not aplicar:
+        return {
+            'removidas': sobrando.count(),
+            'atualizadas': divergentes.count(),
+            'criadas': faltando.count(),
+        }
+
+    origem = Consulta.objects.filter(pk=OuterRef('consulta_id'))
+    with transaction.atomic():
+        removidas, _ = Income.objects.filter(pk__in=sobrando.values('pk')).delete()
+
+        atualizadas = Income.objects.filter(pk__in=divergentes.values('pk')).update(
+            owner_id=Subquery(origem.values('owner_id')[:1]),
+            valor=Subquery(origem.values('valor_final')[:1]),
+            data=Subquery(origem.annotate(dia=TruncDate('data')).values('dia')[:1]),
+            descricao=Subquery(origem.annotate(
+                descricao=Concat(Value('Consulta - '), 'paciente__nome')
+            ).values('descricao')[:1]),
+            pago=True,
+        )
+
+        novas = [
+            Income(
+                owner_id=c['owner_id'],
+                origem='consulta',
+                consulta_id=c['pk'],
+                descricao=_descricao_receita(c['paciente__nome']),
+                valor=c['valor_final'] or 0,
+                data=c['dia'],
+                pago=True,
+            )
+            for c in faltando.annotate(dia=TruncDate('data'))
+            .values('pk', 'owner_id', 'paciente__nome', 'valor_final', 'dia')
+            .iterator()
+        ]
+        Income.objects.bulk_create(novas, batch_size=batch_size)
+
+    return {'removidas': removidas, 'atualizadas': atualizadas, 'criadas': len(novas)}
+
+
+# Métricas do dashboard (consultas)
+def _meses_anteriores(hoje, quantidade=6):
+    """Retorna o 1º dia dos últimos `quantidade` meses (do mais antigo ao atual)."""
+    ano, mes = hoje.year, hoje.month
+    meses = []
+    for _ in range(quantidade):
+        meses.append(date(ano, mes, 1))
+        mes -= 1
+        if mes == 0:
+            mes, ano = 12, ano - 1
+    return list(reversed(meses))
+
+
+def get_dashboard_metrics(owner, periodo=30):
+    """
+    Calcula todos os indicadores do dashboard em poucas consultas agrupadas
+    sobre o ResumoDiarioConsulta (custo independe do histórico de consultas).
+    Usado por `dashboard` (HTML) e `dashboard_data` (AJAX).
+    """
+    hoje = timezone.localdate()
+    data_inicial = hoje - timedelta(days=periodo)
+    mes_atual = Q(dia__year=hoje.year, dia__month=hoje.month)
+
+    agregados = {
+        'qtd': Sum('qtd_pagas'),
+        'faturamento_total': Sum('valor_pago'),
+        'comissoes_total': Sum('comissao_paga'),
+        'concluidas': Sum('qtd_pagas_concluidas'),
+        'mensal_bruto': Sum('valor_pago', filter=mes_atual),
+        'mensal_comissoes': Sum('comissao_paga', filter=mes_atual),
+    }
+
+    resumos = ResumoDiarioConsulta.objects.filter(owner=owner)
+
+    # === Consultas pagas no período (ou todas as pagas, se não houver) ===
+    resumos_pagos = resumos.filter(
+        dia__gte=data_inicial,
+        dia__lte=hoje + timedelta(days=90)
+    )
+    totais = resumos_pagos.aggregate(**agregados)
+
+    if not totais['qtd']:
+        resumos_pagos = resumos
+        totais = resumos_pagos.aggregate(**agregados)
+
+    # === Contagens gerais do usuário (independem do período) ===
+    gerais = resumos.aggregate(
+        total=Sum('qtd'),
+        total_concluidas=Sum('qtd_concluidas'),
+    )
+
+    qtd_pagas = totais['qtd'] or 0
+    faturamento_total = totais['faturamento_total'] or 0
+    comissoes_total = totais['comissoes_total'] or 0
+    mensal_bruto = totais['mensal_bruto'] or 0
+    mensal_comissoes = totais['mensal_comissoes'] or 0
+    total_consultas = gerais['total'] or 0
+
+    # === Por dentista (o ranking inclui consultas sem dentista) ===
+    resumos_pagos = resumos_pagos.filter(qtd_pagas__gt=0)
+    por_dentista = list(
+        resumos_pagos.values('dentista__nome')
+        .annotate(
+            total_consultas=Sum('qtd_pagas'),
+            receita=Sum('valor_pago'),
+            comissao=Sum('comissao_paga')
+        )
+        .order_by('-receita')
+    )
+    ranking_dentistas = por_dentista[:5]
+    consultas_por_dentista = [d for d in por_dentista if d['dentista__nome'] is not None]
+
+    # === Últimos 6 meses (agrupados por TruncMonth) ===
+    meses_ref = _meses_anteriores(hoje)
+    buckets = {
+        b['mes']: b
+        for b in resumos_pagos.filter(dia__gte=meses_ref[0])
+        .annotate(mes=TruncMonth('dia'))
+        .values('mes')
+        .annotate(qtd=Sum('qtd_pagas'), receita=Sum('valor_pago'))
+    }
+
+    meses = []
+    dados_consultas = []
+    dados_receita = []
+    for mes_ref in meses_ref:
+        bucket = buckets.get(mes_ref, {})
+        meses.append(calendar.month_abbr[mes_ref.month])
+        dados_consultas.append(bucket.get('qtd', 0))
+        dados_receita.append(float(bucket.get('receita') or 0))
+
+    return {
+        'total_consultas': total_consultas,
+        'consultas_concluidas': totais['concluidas'] or 0,
+        'consultas_pendentes': total_consultas - (gerais['total_concluidas'] or 0),
+
+        'faturamento_total': faturamento_total,
+        'faturamento_medio': faturamento_total / qtd_pagas if qtd_pagas else 0,
+        'comissoes_total': comissoes_total,
+        'faturamento_liquido': faturamento_total - comissoes_total,
+        'faturamento_mensal': mensal_bruto - mensal_comissoes,
+
+        'consultas_por_dentista': consultas_por_dentista,
+        'ranking_dentistas': ranking_dentistas,
+
+        'meses': meses,
+        'dados_consultas': dados_consultas,
+        'dados_receita': dados_receita,
+    }
+
+
+def get_resumo_por_dentista(owner, data_inicial, data_final):
+    """Receita, comissões e nº de consultas por dentista no intervalo (resumo diário)."""
+    resumos = ResumoDiarioConsulta.objects.filter(
+        owner=owner,
+        dia__gte=data_inicial,
+        dia__lte=data_final,
+    )
+
+    por_dentista = (
+        resumos.exclude(dentista__isnull=True)
+        .values("dentista__nome")
+        .annotate(
+            total_consultas=Sum("qtd"),
+            receita=Sum("valor_bruto"),
+            comissoes=Sum("comissao"),
+        )
+        .order_by("-receita")
+    )
+
+    totais = resumos.aggregate(
+        total_receita=Sum("valor_bruto"),
+        total_comissoes=Sum("comissao"),
+    )
+
+    return list(por_dentista), totais
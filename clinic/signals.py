@@ -1,7 +1,16 @@
-from django.db.models.signals import post_save
+import logging
+
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import ClinicaConfig, Assinatura
+from .models import ClinicaConfig, Assinatura, Consulta, Paciente
+from .services import atualizar_resumo_diario, sincronizar_receita_consulta, remover_receita_consulta
+from .utils.subscription import invalidar_cache_assinatura
+from .utils.contexto_dinamico import invalidar_contexto_dinamico
+from .utils.logos import gerar_derivados_logo
+
+logger = logging.getLogger(__name__)
+
 
 @receiver(post_save, sender=Assinatura)
 def criar_config_clinica(sender, instance, created, **kwargs):
@@ -9,4 +18,74 @@ def criar_config_clinica(sender, instance, created, **kwargs):
     Quando o usuário vira premium → cria a configuração da clínica.
     """
     if instance.tipo == "premium" and instance.ativa:
-        ClinicaConfig.objects.get_or_create(user=instance.user)
+        ClinicaConfig.objects.get_or_create(owner=instance.user)
+
+
+@receiver(post_save, sender=Assinatura)
+@receiver(post_delete, sender=Assinatura)
+def invalidar_assinatura_em_cache(sender, instance, **kwargs):
+    """Descarta o snapshot da assinatura usado pelo TrialMiddleware."""
+    invalidar_cache_assinatura(instance.user_id)
+
+
+@receiver(post_save, sender=Consulta)
+def atualizar_resumo_consulta_salva(sender, instance, **kwargs):
+    """
+    Mantém o ResumoDiarioConsulta em dia: recalcula a linha atual
+    e, se a consulta mudou de dia/dentista, também a linha antiga.
+    """
+    chaves = {instance.chave_resumo(), getattr(instance, "_chave_resumo_original", None)}
+    for chave in chaves - {None}:
+        atualizar_resumo_diario(*chave)
+    instance._chave_resumo_original = instance.chave_resumo()
+
+
+@receiver(post_delete, sender=Consulta)
+def atualizar_resumo_consulta_excluida(sender, instance, **kwargs):
+    chaves = {instance.chave_resumo(), getattr(instance, "_chave_resumo_original", None)}
+    for chave in chaves - {None}:
+        atualizar_resumo_diario(*chave)
+
+
+
+@receiver(post_save, sender=Consulta)
+def sincronizar_receita_consulta_salva(sender, instance, **kwargs):
+    """Consulta paga ↔ Income (cria/atualiza/remove o lançamento)."""
+    sincronizar_receita_consulta(instance)
+
+
+@receiver(pre_delete, sender=Consulta)
+def remover_receita_consulta_excluida(sender, instance, **kwargs):
+    # pre_delete: no post_delete o FK do Income já foi anulado (SET_NULL)
+    remover_receita_consulta(instance.pk)
+
+@receiver(post_save, sender=Consulta)
+@receiver(post_delete, sender=Consulta)
+@receiver(post_save, sender=Paciente)
+@receiver(post_delete, sender=Paciente)
+def invalidar_contexto_chat(sender, instance, **kwargs):
+    """Descarta o contexto dinâmico do chat da clínica alterada."""
+    invalidar_contexto_dinamico(instance.owner_id)
+
+
+@receiver(post_save, sender=ClinicaConfig)
+def gerar_miniaturas_logo(sender, instance, **kwargs):
+    """
+    Gera as miniaturas do logo (PDF/menu) uma única vez, quando ele muda,
+    e grava o hash que as identifica.
+    """
+    nome = instance.logo.name or ""
+    if nome == getattr(instance, "_logo_original", "") and bool(instance.logo_hash) == bool(nome):
+        return
+
+    logo_hash = ""
+    if nome:
+        try:
+            logo_hash = gerar_derivados_logo(instance.logo)
+        except Exception:
+            # logo inválido/ilegível → segue usando o original
+            logger.exception("Falha ao gerar miniaturas do logo (ClinicaConfig %s)", instance.pk)
+
+    ClinicaConfig.objects.filter(pk=instance.pk).update(logo_hash=logo_hash)
+    instance.logo_hash = logo_hash
+    instance._logo_original = nome
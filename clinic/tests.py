@@ -1,3 +1,1049 @@
-from django.test import TestCase
+import base64
+import hashlib
+import hmac
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from PIL import Image
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import Count, F, Sum
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .forms_consulta import ConsultaForm
+from .management.worker import ComandoWorker
+from .models import (
+    Assinatura, ClinicaConfig, Consulta, Dentista, EmailSaida, EventoWebhook, Expense, Income, Pagamento, Paciente, Procedimento,
+    RelatorioJob, ResumoDiarioConsulta, SerieConsulta,
+)
+from .services import (
+    gerar_consultas_serie, get_dashboard_metrics, get_resumo_por_dentista, reconciliar_receitas_consultas,
+)
+from .utils.agenda import conflito_horario, conflitos_horarios, horarios_livres
+from .utils.busca import montar_busca_paciente
+from .utils.contexto_dinamico import _montar_contexto
+from .utils.emails import EMAIL_MAX_TENTATIVAS, enviar_lote
+from .utils.gateway import ErroGateway, GatewayFake, definir_gateway
+from .utils.importacao import importar_pacientes
+from .utils.logos import VARIANTES_LOGO, caminho_logo, url_logo
+from .utils.paginacao import POR_PAGINA, _codificar_cursor, paginar_keyset
+from .utils.pagamentos import processar_eventos_webhook
+from .views_pagamentos import PLANOS
+from .utils.relatorios import executar_relatorio
+from .utils.subscription import avisar_assinaturas_expirando, expirar_assinaturas, get_trial_info
+
+
+class IndicesOwnerTests(TestCase):
+    """
+    Garante (via EXPLAIN) que as consultas que as views principais executam
+    usam os índices compostos por owner: a view é chamada, o SQL dela é
+    capturado e explicado. No Postgres o seq scan é desligado só durante o
+    EXPLAIN, para que o planner escolha o índice mesmo com a tabela pequena.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="indices", password="x")
+        Assinatura.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def _explicar(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor != "postgresql":
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                return "\n".join(str(linha) for linha in cursor.fetchall())
+            cursor.execute("SET enable_seqscan = off")
+            try:
+                cursor.execute(f"EXPLAIN {sql}")
+                return "\n".join(linha[0] for linha in cursor.fetchall())
+            finally:
+                cursor.execute("RESET enable_seqscan")
+
+    def assertViewUsaIndice(self, url, tabela, *indices, params=None):
+        """Cada SELECT da view em `tabela` usa um dos índices (o planner pode variar por banco)."""
+        with CaptureQueriesContext(connection) as capturadas:
+            self.assertEqual(self.client.get(url, params).status_code, 200)
+        selects = [
+            q["sql"] for q in capturadas.captured_queries
+            if q["sql"].startswith("SELECT") and f'FROM "{tabela}"' in q["sql"]
+        ]
+        self.assertTrue(selects, f"{url} não consultou {tabela}")
+        for sql in selects:
+            plano = self._explicar(sql)
+            self.assertTrue(
+                any(indice in plano for indice in indices),
+                f"Plano não usa {' / '.join(indices)}:\n{sql}\n{plano}",
+            )
+
+    def test_consultas_list(self):
+        self.assertViewUsaIndice("/consultas/", "clinic_consulta", "consulta_owner_data_idx")
+        self.assertViewUsaIndice(
+            "/consultas/", "clinic_consulta", "consulta_owner_data_idx", params={"data": "2025-03-10"})
+
+    def test_consultas_list_pendentes(self):
+        self.assertViewUsaIndice(
+            "/consultas/", "clinic_consulta", "consulta_pendente_idx", params={"status": "pendente"})
+
+    def test_consultas_concluidas(self):
+        # SQLite pode preferir (owner, data) por causa do ORDER BY -data
+        self.assertViewUsaIndice(
+            "/consultas/", "clinic_consulta", "consulta_owner_concluida_idx", "consulta_owner_data_idx",
+            params={"status": "concluida"})
+
+    def test_pacientes_list(self):
+        self.assertViewUsaIndice("/pacientes/", "clinic_paciente", "paciente_owner_cadastro_idx")
+
+    def test_receitas_e_despesas(self):
+        self.assertViewUsaIndice("/financeiro/receitas/", "clinic_income", "income_owner_data_idx")
+        self.assertViewUsaIndice("/financeiro/despesas/", "clinic_expense", "expense_owner_data_idx")
+
+    def test_exportacao_por_periodo(self):
+        periodo = {"mes": "3", "ano": "2025"}
+        self.assertViewUsaIndice(
+            "/financeiro/exportar/excel/", "clinic_income", "income_owner_data_idx", params=periodo)
+        self.assertViewUsaIndice(
+            "/financeiro/exportar/excel/", "clinic_expense", "expense_owner_data_idx", params=periodo)
+
+
+class InicializacaoTests(SimpleTestCase):
+    """Boot do worker (django.setup() + URLs) não pode carregar libs pesadas."""
+
+    def test_sem_libs_pesadas_no_boot(self):
+        call_command("perfil_inicializacao", repeticoes=1, top=0, stdout=StringIO())
+
+
+@override_settings(DEBUG=False)
+class ImportacaoPacientesTests(TestCase):
+    """Importação em lote: CPF inválido/repetido vira erro/duplicado por linha."""
+
+    def test_importar_csv(self):
+        owner = User.objects.create_user(username="importacao", password="x")
+        Paciente.objects.create(
+            owner=owner, nome="Já Cadastrado", cpf="11144477735", data_nascimento=date(1980, 1, 1)
+        )
+        csv = (
+            "Nome;CPF;Data de Nascimento;Cidade\n"
+            "Ana;529.982.247-25;01/02/1990;Curitiba\n"
+            "Ana de novo;52998224725;01/02/1990;Curitiba\n"
+            "Bruno;111.444.777-35;03/04/1985;Londrina\n"
+            "Carla;12345678900;05/06/1970;Maringá\n"
+            "Davi;39053344705;data ruim;Curitiba\n"
+        ).encode("utf-8")
+
+        resultado = importar_pacientes(BytesIO(csv), "pacientes.csv", owner)
+
+        self.assertEqual(resultado["importados"], 1)
+        self.assertEqual(resultado["duplicados"], [(3, "52998224725"), (4, "11144477735")])
+        self.assertEqual([linha for linha, _ in resultado["erros"]], [5, 6])
+        ana = Paciente.objects.get(cpf="52998224725")
+        self.assertEqual((ana.owner, ana.busca), (owner, montar_busca_paciente("Ana", "Curitiba", "52998224725")))
+
+
+class SerieConsultaTests(TestCase):
+    """Série mensal expandida num bulk_create, com valores e resumo diário corretos."""
+
+    def test_gerar_consultas_serie(self):
+        owner = User.objects.create_user(username="serie", password="x")
+        paciente = Paciente.objects.create(
+            owner=owner, nome="Paciente", cpf="52998224725", data_nascimento=date(1990, 1, 1))
+        dentista = Dentista.objects.create(owner=owner, nome="Dra. Ana", comissao_percentual=30)
+        procedimento = Procedimento.objects.create(owner=owner, nome="Manutenção", valor_base=200)
+        serie = SerieConsulta.objects.create(
+            owner=owner, paciente=paciente, dentista=dentista, procedimento=procedimento,
+            inicio=timezone.make_aware(datetime(2026, 1, 31, 14, 0)),
+            intervalo=1, unidade="meses", ocorrencias=3, desconto=10,
+        )
+
+        gerar_consultas_serie(serie)
+
+        consultas = list(serie.consultas.order_by("data"))
+        self.assertEqual(
+            [timezone.localtime(c.data).date() for c in consultas],
+            [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31)],
+        )
+        self.assertEqual((consultas[0].valor_final, consultas[0].comissao_valor), (180, 54))
+        self.assertEqual(ResumoDiarioConsulta.objects.filter(owner=owner).aggregate(s=Sum("qtd"))["s"], 3)
+
+
+class ResumoDiarioUnicoTests(TestCase):
+    """Uma linha por (owner, dentista, dia), inclusive para consultas sem dentista."""
+
+    def test_upsert_e_restricao(self):
+        owner = User.objects.create_user(username="resumo", password="x")
+        paciente = Paciente.objects.create(
+            owner=owner, nome="Paciente", cpf="52998224725", data_nascimento=date(1990, 1, 1))
+        procedimento = Procedimento.objects.create(owner=owner, nome="Limpeza", valor_base=100)
+        dia = timezone.make_aware(datetime(2027, 3, 10, 9, 0))
+        consultas = [
+            Consulta.objects.create(
+                owner=owner, paciente=paciente, procedimento=procedimento, data=dia + timedelta(hours=h))
+            for h in (0, 2)
+        ]
+
+        resumo = ResumoDiarioConsulta.objects.get(owner=owner)
+        self.assertEqual((resumo.dentista_id, resumo.qtd), (None, 2))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ResumoDiarioConsulta.objects.create(owner=owner, dia=resumo.dia)
+
+        for consulta in consultas:
+            consulta.delete()
+        self.assertFalse(ResumoDiarioConsulta.objects.exists())
+
+
+class ReceitasConsultaTests(TestCase):
+    """Consulta paga ↔ Income: signals no dia a dia e reconciliação em lote para o que escapou deles."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="receitas", password="x")
+        cls.paciente = Paciente.objects.create(
+            owner=cls.owner, nome="Carla", cpf="52998224725", data_nascimento=date(1990, 1, 1))
+        cls.procedimento = Procedimento.objects.create(owner=cls.owner, nome="Limpeza", valor_base=100)
+        cls.dia = timezone.make_aware(datetime(2027, 3, 10, 10, 0))
+
+    def consulta(self, **campos):
+        return Consulta.objects.create(
+            owner=self.owner, paciente=self.paciente, procedimento=self.procedimento, data=self.dia, **campos)
+
+    def test_sincronizacao_pelos_signals(self):
+        consulta = self.consulta(paga=True)
+        receita = Income.objects.get(consulta=consulta)
+        self.assertEqual((receita.origem, receita.valor, receita.data), ("consulta", 100, self.dia.date()))
+        self.assertEqual(receita.descricao, "Consulta - Carla")
+
+        consulta.desconto = 10
+        consulta.save()
+        self.assertEqual(Income.objects.get(consulta=consulta).valor, 90)
+
+        consulta.paga = False
+        consulta.save()
+        self.assertFalse(Income.objects.exists())
+
+        consulta.paga = True
+        consulta.save()
+        consulta.delete()
+        self.assertFalse(Income.objects.exists())
+
+    def test_reconciliacao(self):
+        faltando, divergente, sobrando, em_dia = (self.consulta(paga=True) for _ in range(4))
+        # update() não dispara signals: cria uma divergência de cada tipo
+        Income.objects.filter(consulta=faltando).delete()
+        Consulta.objects.filter(pk=divergente.pk).update(valor_final=80)
+        Consulta.objects.filter(pk=sobrando.pk).update(paga=False)
+
+        esperado = {"removidas": 1, "atualizadas": 1, "criadas": 1}
+        self.assertEqual(reconciliar_receitas_consultas(aplicar=False), esperado)
+        self.assertTrue(Income.objects.filter(consulta=sobrando).exists())  # só contou
+
+        self.assertEqual(reconciliar_receitas_consultas(owner=self.owner), esperado)
+        self.assertEqual(
+            reconciliar_receitas_consultas(aplicar=False), {"removidas": 0, "atualizadas": 0, "criadas": 0})
+        self.assertEqual(
+            dict(Income.objects.values_list("consulta_id", "valor")),
+            {faltando.pk: 100, divergente.pk: 80, em_dia.pk: 100},
+        )
+
+
+class ComissaoDentistaTests(TestCase):
+    """Mudar o percentual no dentista_edit recalcula as comissões (desde a data de corte) e o resumo."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username="comissao", password="x")
+        Assinatura.objects.create(user=self.owner)
+        self.client.force_login(self.owner)
+        self.dentista = Dentista.objects.create(
+            owner=self.owner, nome="Dra. Ana", cro="CRO-1234", comissao_percentual=30)
+        paciente = Paciente.objects.create(
+            owner=self.owner, nome="Paciente", cpf="52998224725", data_nascimento=date(1990, 1, 1))
+        procedimento = Procedimento.objects.create(owner=self.owner, nome="Canal", valor_base=100)
+        for dia in (1, 10, 20):
+            Consulta.objects.create(
+                owner=self.owner, paciente=paciente, dentista=self.dentista, procedimento=procedimento,
+                data=timezone.make_aware(datetime(2027, 3, dia, 9, 0)), paga=dia == 10,
+            )
+
+    def editar(self, percentual, a_partir_de=""):
+        resposta = self.client.post(f"/dentistas/{self.dentista.pk}/editar/", {
+            "nome": "Dra. Ana", "cro": "CRO-1234", "comissao_percentual": percentual,
+            "recalcular_a_partir_de": a_partir_de,
+        })
+        self.assertEqual(resposta.status_code, 302)
+
+    def comissoes(self):
+        return {
+            timezone.localtime(data).day: valor
+            for data, valor in Consulta.objects.values_list("data", "comissao_valor")
+        }
+
+    def assertResumoConfere(self):
+        resumo = {
+            r.dia: (r.qtd, r.comissao, r.comissao_paga)
+            for r in ResumoDiarioConsulta.objects.filter(dentista=self.dentista)
+        }
+        recalculado = {}
+        for consulta in Consulta.objects.filter(dentista=self.dentista):
+            qtd, comissao, paga = recalculado.get(consulta.chave_resumo()[2], (0, 0, 0))
+            recalculado[consulta.chave_resumo()[2]] = (
+                qtd + 1, comissao + consulta.comissao_valor, paga + (consulta.comissao_valor if consulta.paga else 0))
+        self.assertEqual(resumo, recalculado)
+
+    def test_recalculo_a_partir_da_data(self):
+        self.editar(50, "2027-03-10")
+        self.assertEqual(self.comissoes(), {1: 30, 10: 50, 20: 50})
+        self.assertResumoConfere()
+
+    def test_recalculo_de_todas(self):
+        self.editar(20)
+        self.assertEqual(self.comissoes(), {1: 20, 10: 20, 20: 20})
+        self.assertResumoConfere()
+
+
+class ContextoDinamicoTests(TestCase):
+    """Números do chat: pacientes + totais do mês numa única consulta."""
+
+    def test_uma_consulta(self):
+        owner = User.objects.create_user(username="contexto", password="x")
+        outro = User.objects.create_user(username="outro", password="x")
+        for dono, cpf in ((owner, "52998224725"), (owner, "11144477735"), (outro, "39053344705")):
+            Paciente.objects.create(owner=dono, nome="P", cpf=cpf, data_nascimento=date(1990, 1, 1))
+        procedimento = Procedimento.objects.create(owner=owner, nome="Limpeza", valor_base=150)
+        Consulta.objects.create(
+            owner=owner, paciente=Paciente.objects.filter(owner=owner).first(),
+            procedimento=procedimento, data=timezone.now())
+
+        with self.assertNumQueries(1):
+            contexto = _montar_contexto(owner)
+        self.assertIn("Total de pacientes: 2\n", contexto)
+        self.assertIn("Consultas neste mês: 1\n", contexto)
+        self.assertIn("Faturamento bruto: R$150.00\n", contexto)
+
+        self.assertIn("Total de pacientes: 0\n", _montar_contexto(User.objects.create_user(username="vazio")))
+
+
+def _png(cor="red", tamanho=(800, 400)):
+    saida = BytesIO()
+    Image.new("RGB", tamanho, cor).save(saida, format="PNG")
+    return saida.getvalue()
+
+
+class LogoClinicaTests(TestCase):
+    """Miniaturas do logo geradas uma vez por hash; sem elas, o original é usado."""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def config(self, username, conteudo, nome="logo.png"):
+        owner = User.objects.create_user(username=username, password="x")
+        return ClinicaConfig.objects.create(owner=owner, logo=SimpleUploadedFile(nome, conteudo))
+
+    def test_derivados_uma_vez_por_hash(self):
+        config = self.config("clinica1", _png())
+        self.assertEqual(len(config.logo_hash), 64)
+        for variante in VARIANTES_LOGO:
+            caminho = caminho_logo(config, variante)
+            self.assertNotEqual(caminho, config.logo.path)
+            self.assertTrue(os.path.exists(caminho))
+        with Image.open(caminho_logo(config, "pdf")) as miniatura:
+            self.assertLessEqual(miniatura.size, VARIANTES_LOGO["pdf"])
+
+        # Mesmo logo em outra clínica: reaproveita os arquivos, não decodifica de novo
+        with mock.patch("PIL.Image.open") as abrir:
+            outra = self.config("clinica2", _png())
+        abrir.assert_not_called()
+        self.assertEqual(outra.logo_hash, config.logo_hash)
+
+        # Salvar sem trocar o logo não regera nada
+        with mock.patch("clinic.signals.gerar_derivados_logo") as gerar:
+            config = ClinicaConfig.objects.get(pk=config.pk)
+            config.nome_clinica = "Sorriso"
+            config.save()
+        gerar.assert_not_called()
+
+    def test_cai_no_original(self):
+        config = self.config("clinica3", _png("blue"))
+        os.remove(caminho_logo(config, "pdf"))
+        self.assertEqual(caminho_logo(config, "pdf"), config.logo.path)
+
+        config.logo_hash = ""  # logo antigo, ainda sem miniaturas
+        self.assertEqual(url_logo(config, "menu"), config.logo.url)
+        self.assertEqual(caminho_logo(config, "menu"), config.logo.path)
+
+        config.logo = None
+        self.assertIsNone(url_logo(config, "menu"))
+        self.assertIsNone(caminho_logo(config, "pdf"))
+
+    def test_logo_invalido(self):
+        with self.assertLogs("clinic.signals", "ERROR"):
+            config = self.config("clinica4", b"nao e imagem", nome="logo.png")
+        self.assertEqual(config.logo_hash, "")
+        self.assertEqual(url_logo(config, "menu"), config.logo.url)
+
+
+def _metricas_ao_vivo(owner, periodo=30):
+    """Agregação direta em Consulta, como o dashboard fazia antes do resumo diário."""
+    hoje = timezone.localdate()
+    pagas = Consulta.objects.filter(
+        owner=owner, paga=True,
+        data__date__gte=hoje - timedelta(days=periodo), data__date__lte=hoje + timedelta(days=90),
+    )
+    if not pagas.exists():
+        pagas = Consulta.objects.filter(owner=owner, paga=True)
+    por_dentista = list(
+        pagas.values("dentista__nome")
+        .annotate(total_consultas=Count("id"), receita=Sum("valor_final"), comissao=Sum("comissao_valor"))
+        .order_by("-receita")
+    )
+    mes = pagas.filter(data__year=hoje.year, data__month=hoje.month).aggregate(
+        bruto=Sum("valor_final"), comissoes=Sum("comissao_valor"))
+    totais = pagas.aggregate(faturamento=Sum("valor_final"), comissoes=Sum("comissao_valor"))
+    return {
+        "total_consultas": Consulta.objects.filter(owner=owner).count(),
+        "consultas_concluidas": pagas.filter(concluida=True).count(),
+        "consultas_pendentes": Consulta.objects.filter(owner=owner, concluida=False).count(),
+        "faturamento_total": totais["faturamento"] or 0,
+        "comissoes_total": totais["comissoes"] or 0,
+        "faturamento_mensal": (mes["bruto"] or 0) - (mes["comissoes"] or 0),
+        "ranking_dentistas": por_dentista[:5],
+        "consultas_por_dentista": [d for d in por_dentista if d["dentista__nome"] is not None],
+    }
+
+
+def _resumo_dentista_ao_vivo(owner, data_inicial, data_final):
+    consultas = Consulta.objects.filter(
+        owner=owner, data__date__gte=data_inicial, data__date__lte=data_final)
+    por_dentista = list(
+        consultas.exclude(dentista__isnull=True).values("dentista__nome")
+        .annotate(total_consultas=Count("id"), receita=Sum("valor_final"), comissoes=Sum("comissao_valor"))
+        .order_by("-receita")
+    )
+    return por_dentista, consultas.aggregate(
+        total_receita=Sum("valor_final"), total_comissoes=Sum("comissao_valor"))
+
+
+class MetricasResumoDiarioTests(TestCase):
+    """Métricas do dashboard/financeiro pelo resumo diário = agregação direta em Consulta."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username="metricas", password="x")
+        self.paciente = Paciente.objects.create(
+            owner=self.owner, nome="Paciente", cpf="52998224725", data_nascimento=date(1990, 1, 1))
+        self.procedimento = Procedimento.objects.create(owner=self.owner, nome="Canal", valor_base=100)
+        self.ana = Dentista.objects.create(owner=self.owner, nome="Dra. Ana", cro="CRO-1", comissao_percentual=30)
+        self.bruno = Dentista.objects.create(owner=self.owner, nome="Dr. Bruno", cro="CRO-2", comissao_percentual=50)
+
+    def consulta(self, dias_atras, valor, dentista=None, paga=True, concluida=False):
+        meio_dia = datetime.combine(timezone.localdate() - timedelta(days=dias_atras), datetime.min.time())
+        return Consulta.objects.create(
+            owner=self.owner, paciente=self.paciente, procedimento=self.procedimento, dentista=dentista,
+            data=timezone.make_aware(meio_dia) + timedelta(hours=12), valor=valor, paga=paga, concluida=concluida,
+        )
+
+    def assertConfere(self):
+        metricas = get_dashboard_metrics(self.owner)
+        self.assertEqual({chave: metricas[chave] for chave in _metricas_ao_vivo(self.owner)},
+                         _metricas_ao_vivo(self.owner))
+
+        hoje = timezone.localdate()
+        por_dentista, totais = get_resumo_por_dentista(self.owner, hoje - timedelta(days=30), hoje)
+        esperado_dentistas, esperado_totais = _resumo_dentista_ao_vivo(self.owner, hoje - timedelta(days=30), hoje)
+        self.assertEqual(por_dentista, esperado_dentistas)
+        self.assertEqual(totais, esperado_totais)
+
+    def test_criar_editar_excluir(self):
+        self.consulta(0, 300, self.ana, concluida=True)
+        self.consulta(3, 200, self.bruno)
+        self.consulta(5, 150, self.ana, paga=False)
+        self.consulta(10, 80)  # sem dentista
+        antiga = self.consulta(60, 500, self.bruno, concluida=True)  # fora do período
+        self.assertConfere()
+
+        editada = self.consulta(2, 120, self.bruno)
+        editada.valor = 400
+        editada.dentista = self.ana
+        editada.concluida = True
+        editada.save()
+        self.assertConfere()
+
+        editada.data -= timedelta(days=40)  # sai do período
+        editada.paga = False
+        editada.save()
+        self.assertConfere()
+
+        antiga.delete()
+        editada.delete()
+        self.assertConfere()
+
+    def test_sem_pagas_no_periodo_usa_todas(self):
+        self.consulta(60, 500, self.bruno)
+        self.consulta(1, 100, self.ana, paga=False)
+        self.assertConfere()
+
+
+class PaginacaoKeysetTests(TestCase):
+    """Cursor (valor, pk): empates na chave de ordenação, última página e cursor adulterado."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="paginas", password="x")
+        # 7 receitas, só 3 datas distintas: empates resolvidos pelo pk
+        Income.objects.bulk_create(
+            Income(owner=cls.owner, origem="manual", descricao=f"R{i}", valor=10, data=date(2025, 1, 1 + i % 3))
+            for i in range(7)
+        )
+
+    def paginar(self, cursor=None):
+        params = {"cursor": cursor} if cursor is not None else {}
+        request = RequestFactory().get("/financeiro/receitas/", params)
+        return paginar_keyset(request, Income.objects.filter(owner=self.owner), "-data", por_pagina=3)
+
+    def test_percorre_tudo_com_empates(self):
+        vistos, cursor, paginas = [], None, 0
+        while True:
+            pagina = self.paginar(cursor)
+            vistos += pagina["itens"]
+            paginas += 1
+            if not pagina["tem_proxima"]:
+                break
+            cursor = pagina["proximo_cursor"]
+
+        esperado = list(Income.objects.filter(owner=self.owner).order_by("-data", "-pk"))
+        self.assertEqual(vistos, esperado)
+        self.assertEqual(paginas, 3)
+        self.assertEqual(len(pagina["itens"]), 1)  # última página
+        self.assertIsNone(pagina["proximo_cursor"])
+        self.assertIsNone(pagina["url_proxima"])
+        self.assertFalse(pagina["primeira"])
+
+    def test_cursor_invalido_volta_ao_inicio(self):
+        primeira = self.paginar()["itens"]
+        for cursor in ("lixo", "!!!", _codificar_cursor("abc", 1), _codificar_cursor(None, 1),
+                       base64.urlsafe_b64encode(b'{"a": 1}').decode(), base64.urlsafe_b64encode(b"[1]").decode()):
+            with self.subTest(cursor=cursor):
+                pagina = self.paginar(cursor)
+                self.assertTrue(pagina["primeira"])
+                self.assertEqual(pagina["itens"], primeira)
+
+    def test_view_com_cursor_adulterado(self):
+        Assinatura.objects.create(user=self.owner)
+        self.client.force_login(self.owner)
+        resposta = self.client.get("/financeiro/receitas/", {"cursor": "%%%", "formato": "json"})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(resposta.json()["itens"]), 7)
+
+
+class AutocompleteTests(TestCase):
+    """Endpoint dos selects com busca: só dados do owner, formato {'resultados': [{id, label}]}."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="auto", password="x")
+        Assinatura.objects.create(user=cls.owner)
+        outro = User.objects.create_user(username="vizinho", password="x")
+        cls.maria = Paciente.objects.create(
+            owner=cls.owner, nome="Maria Souza", cpf="52998224725", data_nascimento=date(1990, 1, 1))
+        Paciente.objects.create(
+            owner=cls.owner, nome="João Lima", cpf="11144477735", data_nascimento=date(1990, 1, 1))
+        Paciente.objects.create(
+            owner=outro, nome="Maria Alheia", cpf="39053344705", data_nascimento=date(1990, 1, 1))
+        cls.ana = Dentista.objects.create(owner=cls.owner, nome="Dra. Ana", cro="CRO-1234")
+        Dentista.objects.create(owner=outro, nome="Dra. Ana Outra", cro="CRO-9999")
+        cls.canal = Procedimento.objects.create(owner=cls.owner, nome="Canal", valor_base=350)
+        Procedimento.objects.create(owner=outro, nome="Canal caro", valor_base=900)
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def buscar(self, tipo, **params):
+        resposta = self.client.get(f"/api/autocomplete/{tipo}/", params)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta.json()["resultados"]
+
+    def test_so_do_owner_e_formato(self):
+        self.assertEqual(self.buscar("paciente", q="maria"), [{"id": self.maria.pk, "label": "Maria Souza"}])
+        self.assertEqual(self.buscar("dentista", q="ana"), [{"id": self.ana.pk, "label": "Dra. Ana - CRO: CRO-1234"}])
+        self.assertEqual(self.buscar("procedimento", q="canal"),
+                         [{"id": self.canal.pk, "label": "Canal", "valor": 350.0}])
+        # sem termo: todos do owner, em ordem de nome, até o limite
+        self.assertEqual([p["label"] for p in self.buscar("paciente")], ["João Lima", "Maria Souza"])
+        self.assertEqual(len(self.buscar("paciente", limite=1)), 1)
+        self.assertEqual(len(self.buscar("paciente", limite="abc")), 2)
+
+    def test_tipo_invalido(self):
+        self.assertEqual(self.client.get("/api/autocomplete/usuario/").status_code, 404)
+
+    def test_widget_renderiza_so_a_opcao_escolhida(self):
+        form = ConsultaForm(user=self.owner, initial={"paciente": self.maria.pk})
+        html = str(form["paciente"])
+        self.assertIn('data-autocomplete-url="/api/autocomplete/paciente/"', html)
+        self.assertIn("Maria Souza", html)
+        self.assertNotIn("João Lima", html)
+        self.assertNotIn("Maria Alheia", html)
+        self.assertEqual(list(form.fields["paciente"].queryset), list(Paciente.objects.filter(owner=self.owner)))
+
+
+class OpenAIFalso:
+    """AsyncOpenAI de mentira: `chat.completions.create(stream=True)` devolve os pedaços dados."""
+
+    def __init__(self, pedacos=(), erro=None):
+        self.pedidos = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._criar))
+        self._pedacos, self._erro = pedacos, erro
+
+    async def _criar(self, **kwargs):
+        self.pedidos.append(kwargs)
+        if self._erro:
+            raise self._erro
+
+        async def stream():
+            for pedaco in self._pedacos:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=pedaco))])
+            yield SimpleNamespace(choices=[])  # chunk final de uso, sem choices
+        return stream()
+
+
+class ChatStreamTests(TestCase):
+    """SSE do chat: eventos `data: {...}` e histórico gravado na sessão ao fim do stream."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="chat", password="x")
+        Assinatura.objects.create(user=cls.user)
+
+    async def conversar(self, openai, mensagem="Como cadastro um paciente?"):
+        await self.async_client.aforce_login(self.user)
+        with mock.patch("clinic.views_chat._get_async_openai_client", return_value=(openai, None)):
+            resposta = await self.async_client.post(
+                "/api/chat/stream/", {"message": mensagem}, content_type="application/json")
+            self.assertEqual(resposta["Content-Type"], "text/event-stream")
+            corpo = b"".join([parte async for parte in resposta.streaming_content]).decode()
+        sessao = await self.async_client.asession()
+        return corpo, await sessao.aget("chat_history")
+
+    async def test_eventos_e_historico(self):
+        openai = OpenAIFalso(["Vá em ", "Pacientes", None, " > Novo."])
+        corpo, historico = await self.conversar(openai)
+
+        self.assertEqual(corpo, "".join(f"data: {json.dumps(e, ensure_ascii=False)}\n\n" for e in (
+            {"delta": "Vá em "}, {"delta": "Pacientes"}, {"delta": " > Novo."}, {"done": True},
+        )))
+        self.assertEqual(historico, [
+            {"role": "user", "content": "Como cadastro um paciente?"},
+            {"role": "assistant", "content": "Vá em Pacientes > Novo."},
+        ])
+        pedido = openai.pedidos[0]
+        self.assertTrue(pedido["stream"])
+        self.assertEqual(pedido["messages"][0]["role"], "system")
+        self.assertEqual(pedido["messages"][-1], {"role": "user", "content": "Como cadastro um paciente?"})
+
+        # a próxima pergunta leva o histórico salvo
+        _, historico = await self.conversar(OpenAIFalso(["Ok."]), "Obrigado")
+        self.assertEqual(len(historico), 4)
+
+    async def test_erro_nao_grava_historico(self):
+        with self.assertLogs("clinic.views_chat", "ERROR"):
+            corpo, historico = await self.conversar(OpenAIFalso(erro=RuntimeError("quota")))
+        self.assertEqual(corpo, 'data: {"error": "OpenAI falhou: quota"}\n\n')
+        self.assertIsNone(historico)
+
+
+class ConflitoAgendaTests(TestCase):
+    """Sobreposição de horários do mesmo dentista (intervalos semiabertos [início, fim))."""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user(username="agenda", password="x")
+        paciente = Paciente.objects.create(
+            owner=owner, nome="Paciente", cpf="52998224725", data_nascimento=date(1990, 1, 1))
+        cls.dentista = Dentista.objects.create(owner=owner, nome="Dr. Bruno")
+        procedimento = Procedimento.objects.create(owner=owner, nome="Avaliação", valor_base=100)
+        cls.nove = timezone.make_aware(datetime(2027, 3, 10, 9, 0))
+        cls.consulta = Consulta.objects.create(
+            owner=owner, paciente=paciente, dentista=cls.dentista, procedimento=procedimento,
+            data=cls.nove, duracao=60,
+        )
+
+    def test_conflito_horario(self):
+        hora = timedelta(hours=1)
+        meia = timedelta(minutes=30)
+        self.assertEqual(conflito_horario(self.dentista.pk, self.nove + meia, self.nove + 2 * hora), self.consulta)
+        self.assertIsNone(conflito_horario(self.dentista.pk, self.nove + hora, self.nove + 2 * hora))
+        self.assertIsNone(conflito_horario(self.dentista.pk, self.nove - hora, self.nove))
+        self.assertIsNone(conflito_horario(self.dentista.pk, self.nove, self.nove + hora, excluir_pk=self.consulta.pk))
+
+    def test_conflitos_horarios(self):
+        hora = timedelta(hours=1)
+        intervalos = [(self.nove + n * hora / 2, self.nove + n * hora / 2 + hora / 2) for n in range(-1, 3)]
+        self.assertEqual(conflitos_horarios(self.dentista.pk, intervalos), intervalos[1:3])
+
+    def test_horarios_livres(self):
+        # quarta-feira, expediente 08h–20h; a consulta ocupa 09h–10h
+        livres = horarios_livres(
+            self.dentista.pk, self.nove - timedelta(hours=2), self.nove + timedelta(hours=12), timedelta(minutes=60))
+        self.assertEqual(livres, [
+            (self.nove - timedelta(hours=1), self.nove),
+            (self.nove + timedelta(hours=1), self.nove + timedelta(hours=11)),
+        ])
+
+    def test_calendario_revalidacao_e_parametro_invalido(self):
+        Assinatura.objects.create(user=self.dentista.owner)
+        self.client.force_login(self.dentista.owner)
+        url = "/consultas/calendario/"
+        janela = {"start": "2027-03-08", "end": "2027-03-15", "dentista": self.dentista.pk}
+
+        resposta = self.client.get(url, janela)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([e["id"] for e in resposta.json()], [self.consulta.pk])
+        etag = resposta["ETag"]
+        self.assertEqual(self.client.get(url, janela, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.consulta.observacoes = "Remarcar"
+        self.consulta.save()
+        self.assertEqual(self.client.get(url, janela, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        self.assertEqual(self.client.get(url, dict(janela, dentista="abc")).status_code, 400)
+
+    def test_horarios_livres_parametros_invalidos(self):
+        Assinatura.objects.create(user=self.dentista.owner)
+        self.client.force_login(self.dentista.owner)
+        url = "/consultas/horarios-livres/"
+        self.assertEqual(self.client.get(url, {"dentista": "1 OR 1=1"}).status_code, 400)
+        resposta = self.client.get(url, {
+            "dentista": self.dentista.pk, "duracao": "inf", "start": self.nove.isoformat(),
+        })
+        self.assertEqual(resposta.status_code, 200)
+
+
+class WebhookMercadoPagoTests(TestCase):
+    """O webhook só enfileira; o worker consulta o MP uma vez por pagamento e aplica a transição uma vez."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username="webhook", password="x")
+        cls.assinatura = Assinatura.objects.create(user=user, ativa=False)
+        cls.pagamento = Pagamento.objects.create(assinatura=cls.assinatura, referencia="odontoia-ref", valor=49.9)
+
+    def setUp(self):
+        cache.clear()  # contador do limite por IP
+
+    def notificar(self, payment_id="123", **cabecalhos):
+        return self.client.post(
+            "/webhook/mercadopago/", {"type": "payment", "data": {"id": payment_id}},
+            content_type="application/json", headers=cabecalhos,
+        )
+
+    def test_notificacoes_repetidas(self):
+        gateway = GatewayFake({"123": {
+            "status": "approved", "external_reference": "odontoia-ref", "payment_method_id": "pix",
+        }})
+
+        for _ in range(3):
+            self.assertEqual(self.notificar().status_code, 200)
+        self.assertEqual(EventoWebhook.objects.filter(status="pendente").count(), 1)
+
+        resumo = processar_eventos_webhook(gateway=gateway)
+        self.assertEqual((resumo["consultas"], resumo["alterados"]), (1, 1))
+        self.pagamento.refresh_from_db()
+        self.assertEqual((self.pagamento.status, self.pagamento.metodo), ("pago", "pix"))
+        self.assinatura.refresh_from_db()
+        fim = self.assinatura.fim_teste
+        self.assertTrue(self.assinatura.ativa)
+
+        # Reenvio depois de processado: consulta de novo, mas não estende a assinatura
+        self.notificar()
+        resumo = processar_eventos_webhook(gateway=gateway)
+        self.assertEqual((resumo["consultas"], resumo["alterados"]), (1, 0))
+        self.assinatura.refresh_from_db()
+        self.assertEqual(self.assinatura.fim_teste, fim)
+        self.assertEqual(gateway.consultas, ["123", "123"])
+
+    def test_falha_na_consulta_volta_para_fila(self):
+        class GatewayForaDoAr(GatewayFake):
+            def consultar_pagamento(self, payment_id):
+                raise ErroGateway("timeout")
+
+        self.notificar()
+        self.assertEqual(processar_eventos_webhook(gateway=GatewayForaDoAr())["erros"], 1)
+        evento = EventoWebhook.objects.get()
+        self.assertEqual((evento.status, evento.tentativas), ("pendente", 1))
+
+    def test_pagamento_desconhecido_nao_e_reconsultado(self):
+        self.notificar("999")
+        gateway = GatewayFake()
+        processar_eventos_webhook(gateway=gateway)
+        self.assertEqual(EventoWebhook.objects.get().status, "ignorado")
+        self.assertEqual(processar_eventos_webhook(gateway=gateway)["consultas"], 0)
+
+    @override_settings(MERCADOPAGO_WEBHOOK_SECRET="segredo", WEBHOOK_LIMITE_POR_MINUTO=3)
+    def test_assinatura_e_limite(self):
+        manifesto = "id:123;request-id:req-1;ts:1704908010;"
+        v1 = hmac.new(b"segredo", manifesto.encode(), hashlib.sha256).hexdigest()
+
+        self.assertEqual(self.notificar().status_code, 401)
+        self.assertEqual(self.notificar(x_signature=f"ts=1704908010,v1={'0' * 64}", x_request_id="req-1").status_code, 401)
+        self.assertFalse(EventoWebhook.objects.exists())
+        self.assertEqual(self.notificar(x_signature=f"ts=1704908010,v1={v1}", x_request_id="req-1").status_code, 200)
+        self.assertEqual(EventoWebhook.objects.count(), 1)
+        self.assertEqual(self.notificar().status_code, 429)  # 4ª do mesmo IP no minuto
+
+    def test_sem_id_nao_grava(self):
+        resposta = self.client.post("/webhook/mercadopago/", {"type": "payment"}, content_type="application/json")
+        self.assertEqual(resposta.json(), {"ok": True, "ignored": True})
+        self.assertFalse(EventoWebhook.objects.exists())
+
+    def test_checkout_usa_gateway_do_processo(self):
+        gateway = GatewayFake()
+        self.addCleanup(definir_gateway, definir_gateway(gateway))
+        self.client.force_login(self.assinatura.user)
+
+        resposta = self.client.get("/pagamento/checkout/basico/")
+        self.assertRedirects(resposta, "https://gateway.fake/checkout/pref-1", fetch_redirect_response=False)
+        preferencia = gateway.preferencias[0]
+        self.assertEqual(preferencia["items"][0]["unit_price"], 49.9)
+        pagamento = Pagamento.objects.get(referencia=preferencia["external_reference"])
+        self.assertEqual((pagamento.status, pagamento.valor), ("pendente", PLANOS["basico"]))
+
+
+class VarreduraAssinaturasTests(TestCase):
+    """Vencimento e avisos calculados em lote; o request só lê Assinatura.ativa."""
+
+    def criar(self, username, dias):
+        user = User.objects.create_user(username=username, email=f"{username}@exemplo.com", password="x")
+        fim = timezone.make_aware(datetime.combine(date(2027, 5, 10) + timedelta(days=dias), datetime.min.time()))
+        return Assinatura.objects.create(user=user, fim_teste=fim + timedelta(hours=12))
+
+    def test_expira_e_avisa_uma_vez(self):
+        hoje = date(2027, 5, 10)
+        vencida, ultimo_dia, expirando, longe = (
+            self.criar("vencida", -1), self.criar("ultimo", 0), self.criar("expirando", 3), self.criar("longe", 4),
+        )
+
+        self.assertEqual(expirar_assinaturas(hoje), 1)
+        self.assertFalse(get_trial_info(vencida.user)["ativa"])
+        self.assertTrue(Assinatura.objects.get(pk=ultimo_dia.pk).ativa)
+
+        # Os avisos vão para a caixa de saída; o envio é do worker de e-mails
+        self.assertEqual(avisar_assinaturas_expirando(hoje), 2)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(enviar_lote(), (2, 0))
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ["expirando@exemplo.com", "ultimo@exemplo.com"])
+        self.assertEqual(avisar_assinaturas_expirando(hoje), 0)
+
+        # Renovou: o próximo vencimento gera um novo aviso
+        Assinatura.objects.filter(pk=expirando.pk).update(fim_teste=F("fim_teste") + timedelta(days=30))
+        self.assertEqual(avisar_assinaturas_expirando(hoje + timedelta(days=30)), 1)
+        self.assertIsNone(Assinatura.objects.get(pk=longe.pk).aviso_expiracao_para)
+
+    def test_data_vencida_bloqueia_sem_varredura(self):
+        user = User.objects.create_user(username="sem_varredura", password="x")
+        Assinatura.objects.create(user=user, ativa=True, fim_teste=timezone.now() - timedelta(days=2))
+        self.assertFalse(get_trial_info(user)["ativa"])
+
+
+class BackendSmtpFora(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError("SMTP fora do ar")
+
+
+class CaixaDeSaidaEmailTests(TestCase):
+    """Cadastro só grava o e-mail; o worker envia em lote e reagenda as falhas."""
+
+    def cadastrar(self):
+        return self.client.post("/registrar_teste/", {
+            "username": "novo", "email": "novo@exemplo.com", "password": "Senha-forte-123",
+        })
+
+    def test_cadastro_enfileira_e_worker_envia(self):
+        self.assertEqual(self.cadastrar().status_code, 302)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(EmailSaida.objects.get().status, "pendente")
+
+        self.assertEqual(enviar_lote(), (1, 0))
+        self.assertEqual([m.to for m in mail.outbox], [["novo@exemplo.com"]])
+        email = EmailSaida.objects.get()
+        self.assertEqual((email.status, email.corpo, email.html), ("enviado", "", ""))
+        self.assertEqual(enviar_lote(), (0, 0))
+
+    @override_settings(EMAIL_BACKEND="clinic.tests.BackendSmtpFora")
+    def test_desistencia_apaga_o_conteudo(self):
+        self.cadastrar()
+        EmailSaida.objects.update(tentativas=EMAIL_MAX_TENTATIVAS - 1)
+        self.assertEqual(enviar_lote(), (0, 1))
+        email = EmailSaida.objects.get()
+        self.assertEqual((email.status, email.corpo, email.html), ("erro", "", ""))
+
+    @override_settings(EMAIL_BACKEND="clinic.tests.BackendSmtpFora")
+    def test_falha_reagenda_com_backoff(self):
+        self.cadastrar()
+        self.assertEqual(enviar_lote(), (0, 1))
+        email = EmailSaida.objects.get()
+        self.assertEqual((email.status, email.tentativas), ("pendente", 1))
+        self.assertGreater(email.proxima_tentativa, timezone.now())
+        self.assertEqual(enviar_lote(), (0, 0))  # ainda dentro do backoff
+
+
+class RelatorioParametrosTests(TestCase):
+    """Mês/ano inválidos: 400 na hora e, se já estiverem num job, job com erro (o worker segue)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="relatorios", password="x")
+        Assinatura.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def test_mes_invalido(self):
+        resposta = self.client.post("/financeiro/relatorios/excel/solicitar/?mes=13")
+        self.assertEqual(resposta.status_code, 400)
+        self.assertFalse(RelatorioJob.objects.exists())
+        self.assertEqual(self.client.get("/financeiro/exportar/pdf/?mes=abc").status_code, 400)
+
+        job = RelatorioJob.objects.create(owner=self.user, tipo="excel", parametros={"mes": "13"})
+        self.assertEqual(executar_relatorio(job).status, "erro")
+
+
+class BuscaPacientesPaginadaTests(TestCase):
+    """A busca por relevância pagina como a listagem normal (cursor = deslocamento)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="busca", password="x")
+        Assinatura.objects.create(user=self.user)
+        self.client.force_login(self.user)
+        Paciente.objects.bulk_create(
+            Paciente(
+                nome=f"Maria Silva {i}", cpf=f"{i:011d}", data_nascimento=date(1990, 1, 1),
+                telefone="0", email="m@x.com", owner=self.user,
+                busca=montar_busca_paciente(f"Maria Silva {i}", "", f"{i:011d}"),
+            )
+            for i in range(POR_PAGINA + 1)
+        )
+
+    def test_segunda_pagina(self):
+        primeira = self.client.get("/pacientes/", {"search": "silva", "formato": "json"}).json()
+        self.assertEqual(len(primeira["itens"]), POR_PAGINA)
+        self.assertIsNotNone(primeira["proximo_cursor"])
+
+        segunda = self.client.get("/pacientes/", {
+            "search": "silva", "formato": "json", "cursor": primeira["proximo_cursor"],
+        }).json()
+        self.assertEqual(len(segunda["itens"]), 1)
+        self.assertIsNone(segunda["proximo_cursor"])
+        ids = {p["id"] for p in primeira["itens"] + segunda["itens"]}
+        self.assertEqual(len(ids), POR_PAGINA + 1)
+
+
+class ExcelFinanceiroTests(TestCase):
+    """A planilha do xlsxwriter tem as mesmas abas, linhas e valores da antiga (pandas.DataFrame.to_excel)."""
+
+    # cabeçalho novo → coluna do DataFrame antigo
+    COLUNAS = {
+        "Receitas": {"Descrição": "descricao", "Valor (R$)": "valor", "Data": "data", "Origem": "origem"},
+        "Despesas": {"Categoria": "categoria", "Descrição": "descricao", "Valor (R$)": "valor", "Data": "data"},
+    }
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="excel", password="x")
+        Assinatura.objects.create(user=self.user)
+        self.client.force_login(self.user)
+        outro = User.objects.create_user(username="outro_excel", password="x")
+        for dia in range(1, 8):
+            Income.objects.create(owner=self.user, origem="manual", descricao=f"Receita {dia}",
+                                  valor=Decimal("100.50") * dia, data=date(2025, 3, dia))
+        Income.objects.create(owner=self.user, origem="manual", descricao="Abril", valor=1, data=date(2025, 4, 1))
+        Income.objects.create(owner=outro, origem="manual", descricao="Alheia", valor=1, data=date(2025, 3, 2))
+        for dia in (3, 15):
+            Expense.objects.create(owner=self.user, categoria="Material", descricao=f"Despesa {dia}",
+                                   valor=Decimal("42.10"), data=date(2025, 3, dia))
+
+    def planilha_antiga(self):
+        """Exatamente o que financeiro_export_excel fazia antes (DataFrame → to_excel)."""
+        import pandas as pd
+
+        filtros = {"owner": self.user, "data__month": 3, "data__year": 2025}
+        saida = BytesIO()
+        with pd.ExcelWriter(saida, engine="xlsxwriter") as writer:
+            pd.DataFrame(Income.objects.filter(**filtros).order_by("data", "pk")
+                         .values("descricao", "valor", "data", "origem")
+                         ).to_excel(writer, index=False, sheet_name="Receitas")
+            pd.DataFrame(Expense.objects.filter(**filtros).order_by("data", "pk")
+                         .values("categoria", "descricao", "valor", "data")
+                         ).to_excel(writer, index=False, sheet_name="Despesas")
+        saida.seek(0)
+        return pd.read_excel(saida, sheet_name=None)
+
+    def ler(self, conteudo):
+        import pandas as pd
+
+        abas = pd.read_excel(BytesIO(conteudo), sheet_name=None)
+        return {nome: aba.rename(columns=self.COLUNAS[nome]) for nome, aba in abas.items()}
+
+    def assertIgualAntiga(self, nova):
+        import pandas as pd
+
+        antiga = self.planilha_antiga()
+        self.assertEqual(list(nova), list(antiga))
+        self.assertEqual([len(aba) for aba in nova.values()], [7, 2])
+        for nome in antiga:
+            with self.subTest(aba=nome):
+                self.assertEqual(list(nova[nome].columns), list(antiga[nome].columns))
+                pd.testing.assert_frame_equal(
+                    nova[nome], antiga[nome].astype({"valor": float}), check_dtype=False)
+
+    def test_exportacao_direta(self):
+        resposta = self.client.get("/financeiro/exportar/excel/", {"mes": "3", "ano": "2025"})
+        self.assertEqual(resposta.status_code, 200)
+        conteudo = b"".join(resposta.streaming_content) if resposta.streaming else resposta.content
+        self.assertIgualAntiga(self.ler(conteudo))
+
+    def test_job_do_worker(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media):
+            job = RelatorioJob.objects.create(owner=self.user, tipo="excel", parametros={"mes": "3", "ano": "2025"})
+            job = executar_relatorio(job)
+            self.assertEqual(job.status, "concluido", job.erro)
+            with job.arquivo.open("rb") as arquivo:
+                self.assertIgualAntiga(self.ler(arquivo.read()))
+
+
+class ComandoWorkerTests(SimpleTestCase):
+    """Erro numa iteração (ex.: Postgres reiniciando) não derruba o worker."""
+
+    def test_erro_na_iteracao_nao_derruba(self):
+        class Parar(Exception):
+            pass
+
+        class Worker(ComandoWorker):
+            intervalo_manutencao = None
+            chamadas = 0
+
+            def executar(self, options):
+                self.chamadas += 1
+                if self.chamadas == 1:
+                    raise OperationalError("server closed the connection unexpectedly")
+                return self.chamadas == 2  # 2ª: ainda há trabalho; 3ª: fila vazia
+
+        worker = Worker(stdout=StringIO(), stderr=StringIO())
+        with mock.patch("clinic.management.worker.time.sleep", side_effect=[None, Parar()]) as sleep:
+            with self.assertRaises(Parar):
+                call_command(worker, intervalo=2)
+        self.assertEqual(worker.chamadas, 3)
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [4, 2])  # backoff, depois o intervalo
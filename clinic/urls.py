@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, views_chat, views_pagamentos, views_financeiro, views_exportacao
 from django.views.generic import TemplateView
 from django.contrib.auth import views as auth_views
 
@@ -36,6 +36,7 @@ urlpatterns = [
     # Pacientes
     path('pacientes/', views.pacientes_list, name='pacientes_list'),
     path("pacientes/novo/", views.paciente_create, name="paciente_create"),
+    path("pacientes/importar/", views.pacientes_importar, name="pacientes_importar"),
     path("pacientes/<int:pk>/editar/",
          views.paciente_update, name="paciente_update"),
     path("pacientes/<int:pk>/excluir/",
@@ -44,6 +45,8 @@ urlpatterns = [
     # Consultas
     path("consultas/", views.consultas_list, name="consultas_list"),
     path("consultas/nova/", views.consulta_create, name="consulta_create"),
+    path("consultas/series/nova/", views.serie_create, name="serie_create"),
+    path("consultas/series/<int:pk>/editar/", views.serie_update, name="serie_update"),
     path("consultas/calendario/update/",
          views.consulta_update_ajax, name="consulta_update_ajax"),
     path("consultas/<int:pk>/excluir/",
@@ -67,12 +70,18 @@ urlpatterns = [
     # 📅 Novo calendário
     path("consultas/calendario/", views.consultas_calendar,
          name="consultas_calendar"),
+    path("consultas/horarios-livres/", views.consultas_horarios_livres,
+         name="consultas_horarios_livres"),
     path("consultas/calendario/nova/",
          views.consulta_create_ajax, name="consulta_create_ajax"),
 
+    # Autocomplete (selects com busca)
+    path('api/autocomplete/<str:tipo>/', views.autocomplete, name='autocomplete'),
+
     # Chatbot
-    path('api/chat/', views.chat_odontoia_api, name='chat_api'),
-    path('api/chat/diag/', views.chat_diag, name='chat_diag'),
+    path('api/chat/', views_chat.chat_odontoia_api, name='chat_api'),
+    path('api/chat/diag/', views_chat.chat_diag, name='chat_diag'),
+    path('api/chat/stream/', views_chat.chat_odontoia_stream, name='chat_stream'),
 
 
     # 🔹 Novo: recuperação de senha
@@ -99,43 +108,49 @@ urlpatterns = [
 
     # Pagamentos
     path('pagamento/checkout/<str:plano>/',
-         views.criar_pagamento, name='criar_pagamento'),
-    path('pagamento/sucesso/', views.pagamento_sucesso, name='pagamento_sucesso'),
-    path('pagamento/falha/', views.pagamento_falha, name='pagamento_falha'),
-    path('webhook/mercadopago/', views.mercadopago_webhook,
+         views_pagamentos.criar_pagamento, name='criar_pagamento'),
+    path('pagamento/sucesso/', views_pagamentos.pagamento_sucesso, name='pagamento_sucesso'),
+    path('pagamento/falha/', views_pagamentos.pagamento_falha, name='pagamento_falha'),
+    path('webhook/mercadopago/', views_pagamentos.mercadopago_webhook,
          name='mercadopago_webhook'),
 
     # Checkout
-    path('checkout/<str:plano>/', views.checkout_publico, name='checkout_publico'),
+    path('checkout/<str:plano>/', views_pagamentos.checkout_publico, name='checkout_publico'),
 
     # Financeiro
-    path('financeiro/', views.financeiro_home, name='financeiro_home'),
-    path('financeiro/resumo/', views.financeiro_resumo, name='financeiro_resumo'),
+    path('financeiro/', views_financeiro.financeiro_home, name='financeiro_home'),
+    path('financeiro/resumo/', views_financeiro.financeiro_resumo, name='financeiro_resumo'),
 
     # Finanças
-    path('financeiro/dashboard/', views.financeiro_dashboard,
+    path('financeiro/dashboard/', views_financeiro.financeiro_dashboard,
          name='financeiro_dashboard'),
-    path("financeiro/receitas/", views.receitas_list, name="receitas_list"),
-    path("financeiro/receitas/nova/", views.receita_create, name="receita_create"),
+    path("financeiro/receitas/", views_financeiro.receitas_list, name="receitas_list"),
+    path("financeiro/receitas/nova/", views_financeiro.receita_create, name="receita_create"),
     path("financeiro/receitas/<int:pk>/editar/",
-         views.receita_update, name="receita_update"),
+         views_financeiro.receita_update, name="receita_update"),
     path("financeiro/receitas/<int:pk>/deletar/",
-         views.receita_delete, name="receita_delete"),
+         views_financeiro.receita_delete, name="receita_delete"),
 
-    path("financeiro/despesas/", views.despesas_list, name="despesas_list"),
-    path("financeiro/despesas/nova/", views.despesa_create, name="despesa_create"),
+    path("financeiro/despesas/", views_financeiro.despesas_list, name="despesas_list"),
+    path("financeiro/despesas/nova/", views_financeiro.despesa_create, name="despesa_create"),
     path("financeiro/despesas/<int:pk>/editar/",
-         views.despesa_update, name="despesa_update"),
+         views_financeiro.despesa_update, name="despesa_update"),
     path("financeiro/despesas/<int:pk>/deletar/",
-         views.despesa_delete, name="despesa_delete"),
-    path('financeiro/exportar/pdf/', views.financeiro_export_pdf,
+         views_financeiro.despesa_delete, name="despesa_delete"),
+    path('financeiro/exportar/pdf/', views_exportacao.financeiro_export_pdf,
          name='financeiro_export_pdf'),
-    path('financeiro/exportar/excel/', views.financeiro_export_excel,
+    path('financeiro/exportar/excel/', views_exportacao.financeiro_export_excel,
          name='financeiro_export_excel'),
+    path('financeiro/relatorios/<str:tipo>/solicitar/', views_exportacao.relatorio_solicitar,
+         name='relatorio_solicitar'),
+    path('financeiro/relatorios/<int:pk>/status/', views_exportacao.relatorio_status,
+         name='relatorio_status'),
+    path('financeiro/relatorios/<int:pk>/download/', views_exportacao.relatorio_download,
+         name='relatorio_download'),
 
 
     # IA e Insights
-    path("ia-insights/", views.ia_insights, name="ia_insights"),
+    path("ia-insights/", views_financeiro.ia_insights, name="ia_insights"),
 
     # Configurações da Clínica
     path('configuracoes/clinica/', views.clinica_config_view, name='clinica_config'),
@@ -0,0 +1,137 @@
+# clinic/utils/agenda.py
+# Conflitos de horário na agenda do dentista. Cada consulta ocupa [data, data_fim);
+# como nenhuma dura mais que DURACAO_MAXIMA_MINUTOS, quem pode cruzar um horário
+# começou no máximo esse tanto antes dele — a busca vira um range curto no
+# índice (dentista, data, data_fim) em vez de varrer a agenda inteira.
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from ..models import DURACAO_MAXIMA_MINUTOS, Consulta
+
+DURACAO_MAXIMA = timedelta(minutes=DURACAO_MAXIMA_MINUTOS)
+
+# Expediente usado na busca de horários livres (o mesmo exibido no calendário), seg–sáb
+EXPEDIENTE = (time(8, 0), time(20, 0))
+DIAS_ATENDIMENTO = {0, 1, 2, 3, 4, 5}
+
+MENSAGEM_CONFLITO = "⛔ {dentista} já tem consulta das {inicio:%H:%M} às {fim:%H:%M} em {inicio:%d/%m}."
+
+# Mesma restrição da migração 0031 (para criá-la depois de resolver sobreposições antigas)
+SQL_RESTRICAO_SOBREPOSICAO = (
+    'ALTER TABLE clinic_consulta ADD CONSTRAINT consulta_sem_sobreposicao '
+    "EXCLUDE USING gist (dentista_id WITH =, tstzrange(data, data_fim, '[)') WITH &&) "
+    'WHERE (dentista_id IS NOT NULL AND data_fim IS NOT NULL)'
+)
+
+
+def consultas_no_periodo(dentista_id, inicio, fim, excluir=()):
+    """Consultas do dentista que cruzam [inicio, fim), em ordem de início."""
+    consultas = Consulta.objects.filter(
+        dentista_id=dentista_id,
+        data__gt=inicio - DURACAO_MAXIMA,
+        data__lt=fim,
+        data_fim__gt=inicio,
+    )
+    if excluir:
+        consultas = consultas.exclude(pk__in=list(excluir))
+    return consultas.order_by('data')
+
+
+def conflito_horario(dentista_id, inicio, fim, excluir_pk=None):
+    """
+    Primeira consulta do dentista que se sobrepõe a [inicio, fim), ou None.
+    Uma única consulta indexada — rápida o bastante para o arrastar do calendário.
+    """
+    if not dentista_id or not inicio or not fim:
+        return None
+    excluir = (excluir_pk,) if excluir_pk else ()
+    return (
+        consultas_no_periodo(dentista_id, inicio, fim, excluir)
+        .select_related('dentista')
+        .only('id', 'data', 'data_fim', 'dentista__nome')
+        .first()
+    )
+
+
+def conflitos_horarios(dentista_id, intervalos, excluir=()):
+    """
+    Quais dos intervalos [(inicio, fim), ...] caem sobre consultas do dentista.
+    Carrega a agenda do período uma vez e cruza as duas listas ordenadas
+    (usado para séries, em vez de uma consulta por ocorrência).
+    """
+    if not dentista_id or not intervalos:
+        return []
+    intervalos = sorted(intervalos)
+    ocupados = list(
+        consultas_no_periodo(
+            dentista_id, intervalos[0][0], max(fim for _, fim in intervalos), excluir
+        ).values_list('data', 'data_fim')
+    )
+
+    conflitos = []
+    i = 0
+    for inicio, fim in intervalos:
+        # descarta as consultas que terminam antes deste intervalo
+        while i < len(ocupados) and ocupados[i][1] <= inicio:
+            i += 1
+        j = i
+        while j < len(ocupados) and ocupados[j][0] < fim:
+            if ocupados[j][1] > inicio:
+                conflitos.append((inicio, fim))
+                break
+            j += 1
+    return conflitos
+
+
+def _expedientes(inicio, fim):
+    """Janelas de atendimento [abre, fecha) de cada dia, recortadas para [inicio, fim)."""
+    dia = timezone.localtime(inicio).date()
+    ultimo = timezone.localtime(fim).date()
+    while dia <= ultimo:
+        if dia.weekday() in DIAS_ATENDIMENTO:
+            abre = max(inicio, timezone.make_aware(datetime.combine(dia, EXPEDIENTE[0])))
+            fecha = min(fim, timezone.make_aware(datetime.combine(dia, EXPEDIENTE[1])))
+            if abre < fecha:
+                yield abre, fecha
+        dia += timedelta(days=1)
+
+
+def horarios_livres(dentista_id, inicio, fim, duracao):
+    """
+    Intervalos livres [(início, fim), ...] de pelo menos `duracao` (timedelta)
+    na agenda do dentista entre `inicio` e `fim`, dentro do expediente e a
+    partir de agora. Uma consulta ordenada por início + uma varredura linear
+    (agenda e expedientes avançam juntos, sem voltar).
+    """
+    inicio = max(inicio, timezone.now())
+    if inicio >= fim:
+        return []
+    ocupados = list(consultas_no_periodo(dentista_id, inicio, fim).values_list('data', 'data_fim'))
+
+    livres = []
+    i = 0
+    for abre, fecha in _expedientes(inicio, fim):
+        # consultas que já terminaram antes desta janela
+        while i < len(ocupados) and ocupados[i][1] <= abre:
+            i += 1
+
+        cursor = abre
+        j = i
+        while j < len(ocupados) and ocupados[j][0] < fecha:
+            comeca, termina = ocupados[j]
+            if comeca - cursor >= duracao:
+                livres.append((cursor, comeca))
+            cursor = max(cursor, termina)
+            j += 1
+        if fecha - cursor >= duracao:
+            livres.append((cursor, fecha))
+    return livres
+
+
+def mensagem_conflito(consulta):
+    return MENSAGEM_CONFLITO.format(
+        dentista=consulta.dentista.nome if consulta.dentista else "O dentista",
+        inicio=timezone.localtime(consulta.data),
+        fim=timezone.localtime(consulta.data_fim),
+    )
@@ -0,0 +1,65 @@
+# clinic/utils/busca.py
+import re
+import unicodedata
+
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, Value, When
+
+# Similaridade mínima (pg_trgm) para aceitar um resultado "aproximado"
+SIMILARIDADE_MINIMA = 0.3
+
+
+def normalizar_busca(texto):
+    """'  José  da SILVA ' → 'jose da silva' (sem acentos, minúsculo, espaços únicos)."""
+    if not texto:
+        return ""
+    sem_acento = unicodedata.normalize("NFKD", str(texto))
+    sem_acento = "".join(c for c in sem_acento if not unicodedata.combining(c))
+    return " ".join(sem_acento.lower().split())
+
+
+def montar_busca_paciente(nome, cidade, cpf):
+    """
+    Conteúdo da coluna Paciente.busca. Começa com espaço para que
+    `contains(' ' + termo)` signifique "alguma palavra começa com termo".
+    """
+    digitos_cpf = re.sub(r"\D", "", cpf or "")
+    partes = [normalizar_busca(nome), normalizar_busca(cidade), digitos_cpf]
+    return " " + " ".join(p for p in partes if p)
+
+
+def buscar_pacientes(queryset, termo):
+    """
+    Filtra e ordena pacientes por relevância:
+    nome começando com o termo > outra palavra começando com o termo > aproximado.
+    No Postgres usa o índice GIN (pg_trgm) em `busca`; no SQLite cai num LIKE simples.
+    """
+    termo_norm = normalizar_busca(termo)
+    if not termo_norm:
+        return queryset
+
+    digitos = re.sub(r"[\s.\-/]", "", termo_norm)
+    if digitos.isdigit():
+        # CPF (com ou sem máscara) → qualquer trecho dos dígitos
+        filtro = Q(busca__contains=digitos)
+    else:
+        filtro = Q(busca__contains=f" {termo_norm}")
+
+    relevancia = Case(
+        When(busca__startswith=f" {termo_norm}", then=Value(2)),
+        When(filtro, then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+    if connections[queryset.db].vendor == "postgresql":
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        queryset = queryset.annotate(
+            similaridade=TrigramWordSimilarity(termo_norm, "busca"))
+        filtro |= Q(busca__trigram_word_similar=termo_norm)
+        ordem = ("-relevancia", "-similaridade", "-data_cadastro", "-pk")
+    else:
+        ordem = ("-relevancia", "-data_cadastro", "-pk")
+
+    return queryset.filter(filtro).annotate(relevancia=relevancia).order_by(*ordem)
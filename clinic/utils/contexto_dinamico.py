@@ -1,19 +1,62 @@
 # clinic/utils/contexto_dinamico.py
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.utils import timezone
-from clinic.models import Paciente, Consulta
-from django.db.models import Sum
-from datetime import timedelta
+from clinic.models import Paciente, ResumoDiarioConsulta
+from django.db.models import Count, OuterRef, Subquery, Sum
+
+# Tempo (s) que o contexto do chat fica em cache por clínica. O cache é o
+# compartilhado (settings.CACHES): invalidar num processo vale para todos.
+CONTEXTO_CACHE_TTL = getattr(settings, "CONTEXTO_IA_CACHE_TTL", 120)
+
+
+def _cache_key(owner_id):
+    return f"clinic:contexto_ia:{owner_id}"
+
+
+def invalidar_contexto_dinamico(owner_id):
+    cache.delete(_cache_key(owner_id))
+
 
 def gerar_contexto_dinamico(user):
-    """Coleta dados financeiros e operacionais da clínica do usuário."""
-    hoje = timezone.now().date()
+    """
+    Coleta dados financeiros e operacionais da clínica do usuário.
+    Cacheado por owner; invalidado ao salvar/excluir Consulta ou Paciente (signals.py).
+    """
+    key = _cache_key(user.pk)
+    contexto = cache.get(key)
+    if contexto is None:
+        contexto = _montar_contexto(user)
+        cache.set(key, contexto, CONTEXTO_CACHE_TTL)
+    return contexto
+
+
+def _montar_contexto(user):
+    hoje = timezone.localdate()
     inicio_mes = hoje.replace(day=1)
 
-    total_pacientes = Paciente.objects.count()
-    consultas_mes = Consulta.objects.filter(data__date__gte=inicio_mes)
-    total_consultas = consultas_mes.count()
-    faturamento_mes = consultas_mes.aggregate(Sum('valor_final'))['valor_final__sum'] or 0
-    comissoes_mes = consultas_mes.aggregate(Sum('comissao_valor'))['comissao_valor__sum'] or 0
+    # Uma consulta só: a linha do usuário com a contagem de pacientes e os
+    # totais do mês no resumo diário como subconsultas
+    resumos = ResumoDiarioConsulta.objects.filter(
+        owner=OuterRef('pk'), dia__gte=inicio_mes).order_by().values('owner')
+
+    def total_mes(campo):
+        return Subquery(resumos.annotate(t=Sum(campo)).values('t'))
+
+    totais = User.objects.filter(pk=user.pk).values(
+        total_pacientes=Subquery(
+            Paciente.objects.filter(owner=OuterRef('pk')).order_by()
+            .values('owner').annotate(n=Count('id')).values('n')
+        ),
+        total_consultas=total_mes('qtd'),
+        faturamento=total_mes('valor_bruto'),
+        comissoes=total_mes('comissao'),
+    ).get()
+    total_pacientes = totais['total_pacientes'] or 0
+    total_consultas = totais['total_consultas'] or 0
+    faturamento_mes = totais['faturamento'] or 0
+    comissoes_mes = totais['comissoes'] or 0
     faturamento_liquido = faturamento_mes - comissoes_mes
 
     return (
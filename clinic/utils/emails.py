@@ -0,0 +1,155 @@
+# clinic/utils/emails.py
+# E-mails transacionais fora do request: as views gravam na caixa de saída
+# (EmailSaida) e o worker `manage.py enviar_emails` envia em lote, por uma
+# única conexão SMTP, com novas tentativas espaçadas (backoff exponencial).
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import EmailSaida
+
+EMAIL_LOTE = 50
+EMAIL_MAX_TENTATIVAS = 6
+EMAIL_BACKOFF_BASE = timedelta(minutes=1)  # 1, 2, 4, 8, 16 min…
+EMAIL_BACKOFF_MAXIMO = timedelta(hours=1)
+EMAIL_TIMEOUT = timedelta(minutes=getattr(settings, "EMAIL_FILA_TIMEOUT_MINUTOS", 10))
+EMAIL_RETENCAO = timedelta(days=getattr(settings, "EMAIL_FILA_RETENCAO_DIAS", 30))
+
+# Ao sair da fila (enviado/erro) o conteúdo é apagado: pode ter link de
+# redefinição de senha ainda válido. Ficam assunto/destinatários/erro.
+SEM_CONTEUDO = {"corpo": "", "html": ""}
+
+
+def enfileirar_email(assunto, corpo, destinatarios, html="", remetente=""):
+    """
+    Grava o e-mail na caixa de saída e volta na hora (não fala com o SMTP).
+    Sem nenhum destinatário preenchido não grava nada e retorna None.
+    """
+    destinatarios = [d for d in destinatarios if d]
+    if not destinatarios:
+        return None
+    return EmailSaida.objects.create(
+        assunto=assunto,
+        corpo=corpo,
+        html=html,
+        remetente=remetente,
+        destinatarios=destinatarios,
+    )
+
+
+def enfileirar_emails(mensagens):
+    """
+    Versão em lote de enfileirar_email: `mensagens` é uma lista de dicts com
+    os mesmos argumentos. Um bulk_create só; retorna quantos foram gravados.
+    """
+    registros = []
+    for mensagem in mensagens:
+        destinatarios = [d for d in mensagem["destinatarios"] if d]
+        if destinatarios:
+            registros.append(EmailSaida(**dict(mensagem, destinatarios=destinatarios)))
+    EmailSaida.objects.bulk_create(registros)
+    return len(registros)
+
+
+def _backoff(tentativas):
+    return min(EMAIL_BACKOFF_BASE * 2 ** max(tentativas - 1, 0), EMAIL_BACKOFF_MAXIMO)
+
+
+def reservar_emails(limite=EMAIL_LOTE):
+    """
+    Reserva até `limite` e-mails pendentes cuja próxima tentativa já chegou.
+    Cada reserva é um UPDATE condicional (pendente → enviando), como na fila
+    de relatórios: dois workers não enviam o mesmo e-mail.
+    """
+    agora = timezone.now()
+    candidatos = list(
+        EmailSaida.objects.filter(status="pendente", proxima_tentativa__lte=agora)
+        .order_by("proxima_tentativa")
+        .values_list("pk", flat=True)[:limite]
+    )
+    reservados = [
+        pk for pk in candidatos
+        if EmailSaida.objects.filter(pk=pk, status="pendente").update(
+            status="enviando",
+            iniciado_em=agora,
+            tentativas=F("tentativas") + 1,
+        )
+    ]
+    return list(EmailSaida.objects.filter(pk__in=reservados).order_by("proxima_tentativa"))
+
+
+def _mensagem(email, connection):
+    msg = EmailMultiAlternatives(
+        subject=email.assunto,
+        body=email.corpo,
+        from_email=email.remetente or None,  # None → DEFAULT_FROM_EMAIL
+        to=email.destinatarios,
+        connection=connection,
+    )
+    if email.html:
+        msg.attach_alternative(email.html, "text/html")
+    return msg
+
+
+def _falhou(email, erro):
+    """Volta para a fila com backoff, ou desiste depois de EMAIL_MAX_TENTATIVAS."""
+    if email.tentativas >= EMAIL_MAX_TENTATIVAS:
+        campos = {"status": "erro", **SEM_CONTEUDO}
+    else:
+        campos = {"status": "pendente", "proxima_tentativa": timezone.now() + _backoff(email.tentativas)}
+    EmailSaida.objects.filter(pk=email.pk).update(erro=repr(erro), **campos)
+
+
+def enviar_lote(limite=EMAIL_LOTE):
+    """
+    Envia um lote da caixa de saída abrindo o SMTP uma única vez.
+    Retorna (enviados, falhas).
+    """
+    emails = reservar_emails(limite)
+    if not emails:
+        return 0, 0
+
+    enviados, falhos = [], []
+    try:
+        with get_connection() as connection:
+            for email in emails:
+                try:
+                    _mensagem(email, connection).send()
+                except Exception as e:
+                    _falhou(email, e)
+                    falhos.append(email.pk)
+                else:
+                    enviados.append(email.pk)
+    except Exception as e:
+        # Não conseguiu abrir a conexão: o que não saiu volta para a fila
+        for email in emails:
+            if email.pk not in enviados and email.pk not in falhos:
+                _falhou(email, e)
+                falhos.append(email.pk)
+
+    EmailSaida.objects.filter(pk__in=enviados).update(
+        status="enviado", erro="", enviado_em=timezone.now(), **SEM_CONTEUDO
+    )
+    return len(enviados), len(falhos)
+
+
+def recuperar_emails_travados():
+    """E-mails 'enviando' há mais de EMAIL_TIMEOUT (worker morreu) voltam pra fila."""
+    limite = timezone.now() - EMAIL_TIMEOUT
+    travados = EmailSaida.objects.filter(status="enviando", iniciado_em__lt=limite)
+    desistidos = travados.filter(tentativas__gte=EMAIL_MAX_TENTATIVAS).update(
+        status="erro", erro="Tempo esgotado.", **SEM_CONTEUDO
+    )
+    reenfileirados = travados.update(status="pendente")
+    return reenfileirados, desistidos
+
+
+def limpar_emails_antigos():
+    """Apaga os enviados há mais de EMAIL_RETENCAO (os com erro ficam para análise)."""
+    removidos, _ = EmailSaida.objects.filter(
+        status="enviado", enviado_em__lt=timezone.now() - EMAIL_RETENCAO
+    ).delete()
+    return removidos
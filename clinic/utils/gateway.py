@@ -0,0 +1,131 @@
+# clinic/utils/gateway.py
+# Cliente do gateway de pagamento. Um único cliente por processo, criado no
+# primeiro uso, com uma sessão HTTP keep-alive (pool de conexões, timeouts e
+# retentativas): checkout e worker dos webhooks não pagam um handshake TLS
+# por chamada. Nos testes, `definir_gateway(GatewayFake())` troca o cliente.
+import itertools
+import threading
+
+from django.conf import settings
+
+# Status HTTP que valem uma nova tentativa (com backoff)
+STATUS_RETENTATIVA = (429, 500, 502, 503, 504)
+
+
+class ErroGateway(RuntimeError):
+    """Falha ao falar com o gateway (configuração, rede ou resposta de erro)."""
+
+
+class PagamentoNaoEncontrado(ErroGateway):
+    """O gateway não conhece o pagamento (404): não adianta tentar de novo."""
+
+
+class GatewayPagamento:
+    """Interface mínima usada pelo checkout e pelo worker dos webhooks."""
+
+    def criar_preferencia(self, dados):
+        """Cria o checkout; `dados` no formato de preferência do MP. Retorna o JSON da resposta."""
+        raise NotImplementedError
+
+    def consultar_pagamento(self, payment_id):
+        """Retorna o pagamento (JSON do MP: status, external_reference, payment_method_id...)."""
+        raise NotImplementedError
+
+
+class GatewayMercadoPago(GatewayPagamento):
+    """API REST do Mercado Pago via uma `requests.Session` compartilhada."""
+
+    def __init__(self, access_token, base_url, timeout=(3.05, 10), tentativas=2, conexoes=10):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util import Retry
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+        # POST também é repetido: a criação da preferência vai com X-Idempotency-Key
+        retry = Retry(
+            total=tentativas,
+            backoff_factor=0.3,
+            status_forcelist=STATUS_RETENTATIVA,
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=conexoes, max_retries=retry)
+        self.sessao = requests.Session()
+        self.sessao.mount("https://", adapter)
+        self.sessao.mount("http://", adapter)
+        self.sessao.headers["Authorization"] = f"Bearer {access_token}"
+
+    def _requisicao(self, metodo, caminho, **kwargs):
+        import requests
+
+        try:
+            resposta = self.sessao.request(metodo, self.base_url + caminho, timeout=self.timeout, **kwargs)
+            if resposta.status_code == 404:
+                raise PagamentoNaoEncontrado(f"Mercado Pago: {metodo} {caminho} → 404")
+            resposta.raise_for_status()
+            return resposta.json()
+        except (requests.RequestException, ValueError) as e:
+            raise ErroGateway(f"Mercado Pago: {metodo} {caminho} falhou ({e})") from e
+
+    def criar_preferencia(self, dados):
+        cabecalhos = {}
+        if dados.get("external_reference"):
+            cabecalhos["X-Idempotency-Key"] = dados["external_reference"]
+        return self._requisicao("POST", "/checkout/preferences", json=dados, headers=cabecalhos)
+
+    def consultar_pagamento(self, payment_id):
+        return self._requisicao("GET", f"/v1/payments/{payment_id}")
+
+
+class GatewayFake(GatewayPagamento):
+    """Gateway em memória para os testes: guarda as preferências e devolve os pagamentos cadastrados."""
+
+    def __init__(self, pagamentos=None):
+        self.pagamentos = dict(pagamentos or {})
+        self.preferencias = []
+        self.consultas = []
+        self._ids = itertools.count(1)
+
+    def criar_preferencia(self, dados):
+        self.preferencias.append(dados)
+        pref_id = f"pref-{next(self._ids)}"
+        return {"id": pref_id, "init_point": f"https://gateway.fake/checkout/{pref_id}"}
+
+    def consultar_pagamento(self, payment_id):
+        self.consultas.append(str(payment_id))
+        try:
+            return self.pagamentos[str(payment_id)]
+        except KeyError:
+            raise PagamentoNaoEncontrado(f"Pagamento {payment_id} não encontrado.")
+
+
+_gateway = None
+_lock = threading.Lock()
+
+
+def get_gateway():
+    """Cliente do processo (criado na primeira chamada)."""
+    global _gateway
+    if _gateway is None:
+        with _lock:
+            if _gateway is None:
+                access_token = getattr(settings, "MERCADOPAGO_ACCESS_TOKEN", None)
+                if not access_token:
+                    raise ErroGateway("MERCADOPAGO_ACCESS_TOKEN não configurado.")
+                _gateway = GatewayMercadoPago(
+                    access_token,
+                    settings.MERCADOPAGO_API_URL,
+                    timeout=(settings.MERCADOPAGO_TIMEOUT_CONEXAO, settings.MERCADOPAGO_TIMEOUT_LEITURA),
+                    tentativas=settings.MERCADOPAGO_TENTATIVAS,
+                )
+    return _gateway
+
+
+def definir_gateway(gateway):
+    """Troca o cliente do processo (testes) e devolve o anterior; None volta ao padrão."""
+    global _gateway
+    with _lock:
+        anterior, _gateway = _gateway, gateway
+    return anterior
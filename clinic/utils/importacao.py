@@ -0,0 +1,229 @@
+# clinic/utils/importacao.py
+# Importação em massa de pacientes (CSV/XLSX) para o onboarding de clínicas
+# que já têm uma base: lê o arquivo em streaming, valida os CPFs em lote e
+# grava com bulk_create em blocos.
+import csv
+import io
+import re
+from datetime import date, datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from ..models import Paciente
+from .busca import montar_busca_paciente, normalizar_busca
+from .contexto_dinamico import invalidar_contexto_dinamico
+
+LOTE_IMPORTACAO = 1000
+
+# Cabeçalho (normalizado) → campo do Paciente
+COLUNAS_PACIENTE = {
+    "nome": "nome",
+    "nome_completo": "nome",
+    "paciente": "nome",
+    "cpf": "cpf",
+    "data_nascimento": "data_nascimento",
+    "data_de_nascimento": "data_nascimento",
+    "nascimento": "data_nascimento",
+    "telefone": "telefone",
+    "celular": "telefone",
+    "fone": "telefone",
+    "email": "email",
+    "e_mail": "email",
+    "cep": "cep",
+    "logradouro": "logradouro",
+    "rua": "logradouro",
+    "endereco": "logradouro",
+    "numero": "numero",
+    "bairro": "bairro",
+    "cidade": "cidade",
+    "uf": "uf",
+    "estado": "uf",
+}
+
+# Limites das colunas (Paciente) para não estourar no bulk_create
+TAMANHOS = {
+    "nome": 100, "telefone": 20, "cep": 9, "logradouro": 150,
+    "numero": 10, "bairro": 100, "cidade": 100, "uf": 2,
+}
+
+FORMATOS_DATA = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%y")
+
+
+def _campo_do_cabecalho(titulo):
+    chave = re.sub(r"[^a-z0-9]+", "_", normalizar_busca(titulo)).strip("_")
+    return COLUNAS_PACIENTE.get(chave)
+
+
+def _linhas_csv(arquivo):
+    texto = io.TextIOWrapper(arquivo, encoding="utf-8-sig", errors="replace", newline="")
+    amostra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=";,\t")
+    except csv.Error:
+        dialeto = csv.excel
+    yield from csv.reader(texto, dialeto)
+
+
+def _linhas_xlsx(arquivo):
+    import openpyxl
+
+    # read_only: as linhas são lidas sob demanda, sem carregar a planilha inteira
+    workbook = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def ler_pacientes(arquivo, nome_arquivo):
+    """
+    Gera (nº da linha, {campo: valor}) a partir de um CSV (`,` ou `;`) ou XLSX.
+    A primeira linha é o cabeçalho; colunas desconhecidas são ignoradas.
+    """
+    if nome_arquivo.lower().endswith(".xlsx"):
+        linhas = _linhas_xlsx(arquivo)
+    else:
+        linhas = _linhas_csv(arquivo)
+
+    cabecalho = next(linhas, None) or []
+    campos = [_campo_do_cabecalho(str(c or "")) for c in cabecalho]
+    if "nome" not in campos or "cpf" not in campos:
+        raise ValueError("O arquivo precisa ter ao menos as colunas 'nome' e 'cpf'.")
+
+    for numero, valores in enumerate(linhas, start=2):
+        registro = {
+            campo: valor
+            for campo, valor in zip(campos, valores)
+            if campo and valor not in (None, "")
+        }
+        if registro:
+            yield numero, registro
+
+
+def _data(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = str(valor).strip()
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _texto(valor):
+    # Células numéricas do Excel (CPF, CEP, telefone) chegam como int/float
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _montar_paciente(registro, owner):
+    """Valida uma linha (exceto o dígito do CPF, feito em lote). Retorna (Paciente, erro)."""
+    dados = {campo: _texto(valor) for campo, valor in registro.items() if campo != "data_nascimento"}
+
+    if not dados.get("nome"):
+        return None, "Nome em branco."
+
+    cpf = re.sub(r"\D", "", dados.get("cpf", ""))
+    if isinstance(registro["cpf"], (int, float)):
+        cpf = cpf.zfill(11)  # número no Excel perde o zero à esquerda
+    if len(cpf) != 11:
+        return None, "CPF deve ter 11 dígitos."
+    dados["cpf"] = cpf
+
+    nascimento = _data(registro.get("data_nascimento", ""))
+    if not nascimento:
+        return None, "Data de nascimento ausente ou inválida (use DD/MM/AAAA)."
+
+    if dados.get("email"):
+        try:
+            validate_email(dados["email"])
+        except ValidationError:
+            return None, f"E-mail inválido: {dados['email']}."
+
+    for campo, tamanho in TAMANHOS.items():
+        if len(dados.get(campo, "")) > tamanho:
+            return None, f"Campo '{campo}' com mais de {tamanho} caracteres."
+
+    if dados.get("uf"):
+        dados["uf"] = dados["uf"].upper()
+
+    paciente = Paciente(
+        owner=owner,
+        data_nascimento=nascimento,
+        telefone=dados.pop("telefone", ""),
+        email=dados.pop("email", ""),
+        **dados,
+    )
+    # bulk_create não chama save() → a coluna de busca é montada aqui
+    paciente.busca = montar_busca_paciente(paciente.nome, paciente.cidade, paciente.cpf)
+    return paciente, None
+
+
+def _gravar_lote(lote, resultado):
+    """Valida os CPFs do lote de uma vez, remove os já cadastrados e insere o resto."""
+    from validate_docbr import CPF
+
+    # Em DEBUG aceita CPFs fictícios, como o PacienteForm
+    if not settings.DEBUG:
+        validos = CPF().validate_list([p.cpf for _, p in lote])
+        for (numero, _), valido in zip(lote, validos):
+            if not valido:
+                resultado["erros"].append((numero, "CPF inválido. Verifique os dígitos."))
+        lote = [item for item, valido in zip(lote, validos) if valido]
+
+    existentes = set(
+        Paciente.objects.filter(cpf__in=[p.cpf for _, p in lote]).values_list("cpf", flat=True)
+    )
+    novos = []
+    for numero, paciente in lote:
+        if paciente.cpf in existentes:
+            resultado["duplicados"].append((numero, paciente.cpf))
+        else:
+            novos.append(paciente)
+
+    with transaction.atomic():
+        Paciente.objects.bulk_create(novos, batch_size=LOTE_IMPORTACAO)
+    resultado["importados"] += len(novos)
+
+
+def importar_pacientes(arquivo, nome_arquivo, owner):
+    """
+    Importa os pacientes do arquivo para `owner`.
+    Retorna {'importados': n, 'duplicados': [(linha, cpf)], 'erros': [(linha, msg)]}.
+    CPFs repetidos (no arquivo ou já cadastrados) entram em 'duplicados' e não são gravados.
+    """
+    resultado = {"importados": 0, "duplicados": [], "erros": []}
+    vistos = set()
+    lote = []
+
+    for numero, registro in ler_pacientes(arquivo, nome_arquivo):
+        paciente, erro = _montar_paciente(registro, owner)
+        if erro:
+            resultado["erros"].append((numero, erro))
+            continue
+        if paciente.cpf in vistos:
+            resultado["duplicados"].append((numero, paciente.cpf))
+            continue
+        vistos.add(paciente.cpf)
+
+        lote.append((numero, paciente))
+        if len(lote) >= LOTE_IMPORTACAO:
+            _gravar_lote(lote, resultado)
+            lote = []
+
+    if lote:
+        _gravar_lote(lote, resultado)
+
+    resultado["erros"].sort()
+    if resultado["importados"]:
+        invalidar_contexto_dinamico(owner.pk)  # bulk_create não dispara os signals
+    return resultado
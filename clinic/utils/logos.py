@@ -0,0 +1,88 @@
+# clinic/utils/logos.py
+# Derivados (miniaturas) do logo da clínica: gerados uma vez com o Pillow quando
+# o ClinicaConfig é salvo e nomeados pelo hash do arquivo original, para que o
+# PDF e os templates não decodifiquem o upload (às vezes vários MB) a cada uso.
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+PASTA_DERIVADOS = "logos_clinicas/derivados"
+
+# Caixa máxima (px) de cada variante; a proporção do logo é mantida.
+# pdf: desenhado em 120x40 pt → 3x para impressão. menu: navbar/sidebar (até 180px) em 2x.
+VARIANTES_LOGO = {
+    "pdf": (360, 120),
+    "menu": (360, 360),
+}
+
+
+def hash_arquivo(arquivo):
+    """sha256 do arquivo (lido em blocos, sem carregar tudo em memória)."""
+    sha = hashlib.sha256()
+    arquivo.open("rb")
+    try:
+        arquivo.seek(0)
+        for bloco in arquivo.chunks():
+            sha.update(bloco)
+    finally:
+        arquivo.close()
+    return sha.hexdigest()
+
+
+def caminho_derivado(logo_hash, variante):
+    return f"{PASTA_DERIVADOS}/{logo_hash[:32]}_{variante}.png"
+
+
+def gerar_derivados_logo(arquivo):
+    """
+    Gera (se ainda não existirem) as variantes do logo e devolve o hash.
+    Logos iguais — reenviados ou de outra clínica — reaproveitam os mesmos arquivos.
+    """
+    from PIL import Image, ImageOps
+
+    logo_hash = hash_arquivo(arquivo)
+    faltando = {
+        variante: tamanho
+        for variante, tamanho in VARIANTES_LOGO.items()
+        if not default_storage.exists(caminho_derivado(logo_hash, variante))
+    }
+    if not faltando:
+        return logo_hash
+
+    arquivo.open("rb")
+    try:
+        with Image.open(arquivo) as original:
+            original = ImageOps.exif_transpose(original)
+            original = original.convert("RGBA")
+            for variante, tamanho in faltando.items():
+                miniatura = original.copy()
+                miniatura.thumbnail(tamanho, Image.LANCZOS)
+                saida = io.BytesIO()
+                miniatura.save(saida, format="PNG", optimize=True)
+                default_storage.save(caminho_derivado(logo_hash, variante), ContentFile(saida.getvalue()))
+    finally:
+        arquivo.close()
+
+    return logo_hash
+
+
+def url_logo(config, variante):
+    """URL da miniatura do logo; sem hash (logo antigo ainda não processado) usa o original."""
+    if not config.logo:
+        return None
+    if config.logo_hash:
+        return default_storage.url(caminho_derivado(config.logo_hash, variante))
+    return config.logo.url
+
+
+def caminho_logo(config, variante):
+    """Caminho em disco da miniatura (para o ReportLab); cai no original se ela não existir."""
+    if not config.logo:
+        return None
+    if config.logo_hash:
+        caminho = caminho_derivado(config.logo_hash, variante)
+        if default_storage.exists(caminho):
+            return default_storage.path(caminho)
+    return config.logo.path
@@ -0,0 +1,252 @@
+# clinic/utils/pagamentos.py
+# Notificações do Mercado Pago em duas etapas: o webhook só grava o evento
+# (EventoWebhook) e responde 200; o worker `manage.py processar_webhooks`
+# agrupa os eventos por pagamento, consulta o MP uma vez por pagamento e
+# aplica a transição em Pagamento/Assinatura uma única vez.
+import hashlib
+import hmac
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import EventoWebhook, Pagamento
+from .gateway import PagamentoNaoEncontrado, get_gateway
+from .subscription import invalidar_cache_assinatura
+
+WEBHOOK_LOTE = 50
+WEBHOOK_MAX_TENTATIVAS = 5
+WEBHOOK_TIMEOUT = timedelta(minutes=getattr(settings, "WEBHOOK_TIMEOUT_MINUTOS", 10))
+WEBHOOK_RETENCAO = timedelta(days=getattr(settings, "WEBHOOK_RETENCAO_DIAS", 30))
+
+DURACAO_PLANO = timedelta(days=30)
+
+# status no MP → (novo status do Pagamento, status de origem aceitos).
+# Nada volta para "pendente", e uma tentativa recusada depois da aprovada
+# não derruba o pagamento; só estorno/chargeback tiram um "pago".
+TRANSICOES_MP = {
+    "approved": ("pago", ("pendente", "falhou")),
+    "rejected": ("falhou", ("pendente",)),
+    "cancelled": ("falhou", ("pendente",)),
+    "refunded": ("falhou", ("pendente", "pago")),
+    "charged_back": ("falhou", ("pendente", "pago")),
+}
+
+# Tópicos que são de pagamento (notificação nova: "type"; IPN antiga: "topic")
+TIPOS_PAGAMENTO = ("", "payment")
+
+
+def metodo_pagamento(payment_method_id):
+    metodo = (payment_method_id or "desconhecido").lower()
+    if "pix" in metodo:
+        return "pix"
+    if any(k in metodo for k in ("visa", "master", "amex", "hiper", "elo")):
+        return "card"
+    if "boleto" in metodo:
+        return "boleto"
+    return "desconhecido"
+
+
+# ── Entrada (webhook) ──────────────────────────────────────────────────────
+def _recurso_id(payload, params):
+    dados = payload.get("data") if isinstance(payload.get("data"), dict) else {}
+    return str(
+        params.get("data.id") or dados.get("id") or payload.get("id") or params.get("id") or ""
+    )[:64]
+
+
+def assinatura_webhook_valida(cabecalhos, payload, params):
+    """
+    Confere o `x-signature` do Mercado Pago: HMAC-SHA256, com a chave secreta
+    do webhook, do manifesto "id:<data.id>;request-id:<x-request-id>;ts:<ts>;".
+    Sem MERCADOPAGO_WEBHOOK_SECRET configurada a checagem é desligada.
+    """
+    segredo = getattr(settings, "MERCADOPAGO_WEBHOOK_SECRET", "")
+    if not segredo:
+        return True
+
+    partes = dict(
+        item.strip().split("=", 1)
+        for item in cabecalhos.get("x-signature", "").split(",")
+        if "=" in item
+    )
+    ts, v1 = partes.get("ts"), partes.get("v1")
+    if not ts or not v1:
+        return False
+
+    recurso_id = _recurso_id(payload, params)
+    manifesto = ""
+    if recurso_id:
+        manifesto += f"id:{recurso_id.lower() if recurso_id.isalnum() else recurso_id};"
+    if cabecalhos.get("x-request-id"):
+        manifesto += f"request-id:{cabecalhos['x-request-id']};"
+    manifesto += f"ts:{ts};"
+
+    esperado = hmac.new(segredo.encode(), manifesto.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(esperado, v1)
+
+
+def webhook_excedeu_limite(ip):
+    """Limite simples por IP/minuto (cache compartilhado) antes de tocar no banco."""
+    chave = f"clinic:webhook:{ip}:{int(time.time() // 60)}"
+    cache.add(chave, 0, 120)
+    try:
+        return cache.incr(chave) > getattr(settings, "WEBHOOK_LIMITE_POR_MINUTO", 60)
+    except ValueError:  # expirou entre o add e o incr
+        return False
+
+
+def registrar_evento_webhook(payload, params):
+    """
+    Grava a notificação na caixa de entrada. Se o mesmo pagamento já tem um
+    evento pendente, não cria outro: o worker vai consultar o estado atual
+    no MP de qualquer jeito. Notificação sem id não é gravada.
+    Retorna (evento ou None, criado).
+    """
+    recurso_id = _recurso_id(payload, params)
+    if not recurso_id:
+        return None, False
+    tipo = str(payload.get("type") or payload.get("topic") or params.get("type") or params.get("topic") or "")[:50]
+
+    pendente = EventoWebhook.objects.filter(
+        recurso_id=recurso_id, tipo=tipo, status="pendente"
+    ).first()
+    if pendente:
+        return pendente, False
+
+    return EventoWebhook.objects.create(tipo=tipo, recurso_id=recurso_id, payload=payload), True
+
+
+def aplicar_pagamento(info):
+    """
+    Aplica o estado do pagamento (resposta do MP) ao Pagamento da external_reference.
+    A transição é um UPDATE condicional no status de origem: notificações
+    repetidas (ou dois workers ao mesmo tempo) não ativam a assinatura duas vezes.
+    Retorna o novo status, ou None se nada mudou.
+    """
+    transicao = TRANSICOES_MP.get(info.get("status"))
+    referencia = info.get("external_reference")
+    if not transicao or not referencia:
+        return None
+
+    novo_status, origens = transicao
+    campos = {
+        "status": novo_status,
+        "metodo": metodo_pagamento(info.get("payment_method_id")),
+        "raw_payload": info,
+    }
+    if novo_status == "pago":
+        campos["data_pagamento"] = timezone.now()
+
+    with transaction.atomic():
+        alterados = Pagamento.objects.filter(referencia=referencia, status__in=origens).update(**campos)
+        if not alterados:
+            return None
+
+        pagamento = Pagamento.objects.select_related("assinatura").get(referencia=referencia)
+        assinatura = pagamento.assinatura
+        if novo_status == "pago":
+            assinatura.ativa = True
+            assinatura.fim_teste = timezone.now() + DURACAO_PLANO
+            assinatura.save()
+
+    # Garante que o próximo request veja o novo status da assinatura
+    invalidar_cache_assinatura(assinatura.user_id)
+    return novo_status
+
+
+# ── Fila (tabela EventoWebhook, mesmo esquema do RelatorioJob) ─────────────
+def reservar_eventos(limite=WEBHOOK_LOTE):
+    """
+    Reserva até `limite` eventos pendentes (mais antigos primeiro). Cada reserva
+    é um UPDATE condicional (pendente → processando): um evento disputado por
+    dois workers fica com um só.
+    """
+    candidatos = list(
+        EventoWebhook.objects.filter(status="pendente")
+        .order_by("recebido_em")
+        .values_list("pk", flat=True)[:limite]
+    )
+    reservados = [
+        pk for pk in candidatos
+        if EventoWebhook.objects.filter(pk=pk, status="pendente").update(
+            status="processando",
+            iniciado_em=timezone.now(),
+            tentativas=F("tentativas") + 1,
+        )
+    ]
+    return list(EventoWebhook.objects.filter(pk__in=reservados).order_by("recebido_em"))
+
+
+def processar_eventos_webhook(limite=WEBHOOK_LOTE, gateway=None):
+    """
+    Processa um lote da caixa de entrada. Eventos do mesmo pagamento viram uma
+    única consulta ao gateway (o do processo, se não for informado). Em caso de
+    falha o evento volta para a fila até WEBHOOK_MAX_TENTATIVAS.
+    Retorna {'eventos', 'consultas', 'alterados', 'erros'}.
+    """
+    gateway = gateway or get_gateway()
+    eventos = reservar_eventos(limite)
+    resumo = {"eventos": len(eventos), "consultas": 0, "alterados": 0, "erros": 0}
+
+    por_pagamento = defaultdict(list)
+    ignorados = []
+    for evento in eventos:
+        if evento.tipo in TIPOS_PAGAMENTO:
+            por_pagamento[evento.recurso_id].append(evento)
+        else:
+            ignorados.append(evento.pk)
+
+    agora = timezone.now()
+    if ignorados:
+        EventoWebhook.objects.filter(pk__in=ignorados).update(status="ignorado", processado_em=agora)
+
+    for payment_id, grupo in por_pagamento.items():
+        pks = [evento.pk for evento in grupo]
+        try:
+            resumo["consultas"] += 1
+            if aplicar_pagamento(gateway.consultar_pagamento(payment_id)):
+                resumo["alterados"] += 1
+        except PagamentoNaoEncontrado as e:
+            # id que o MP não conhece: encerra já, sem gastar novas consultas
+            EventoWebhook.objects.filter(pk__in=pks).update(
+                status="ignorado", erro=repr(e), processado_em=timezone.now()
+            )
+        except Exception as e:
+            resumo["erros"] += 1
+            falhos = EventoWebhook.objects.filter(pk__in=pks)
+            falhos.filter(tentativas__gte=WEBHOOK_MAX_TENTATIVAS).update(
+                status="erro", erro=repr(e), processado_em=timezone.now()
+            )
+            falhos.filter(status="processando").update(status="pendente", erro=repr(e))
+        else:
+            EventoWebhook.objects.filter(pk__in=pks).update(
+                status="processado", erro="", processado_em=timezone.now()
+            )
+
+    return resumo
+
+
+def recuperar_eventos_travados():
+    """Eventos 'processando' há mais de WEBHOOK_TIMEOUT (worker morreu) voltam pra fila."""
+    limite = timezone.now() - WEBHOOK_TIMEOUT
+    travados = EventoWebhook.objects.filter(status="processando", iniciado_em__lt=limite)
+    desistidos = travados.filter(tentativas__gte=WEBHOOK_MAX_TENTATIVAS).update(
+        status="erro", erro="Tempo esgotado.", processado_em=timezone.now()
+    )
+    reenfileirados = travados.update(status="pendente")
+    return reenfileirados, desistidos
+
+
+def limpar_eventos_antigos():
+    """Apaga eventos já resolvidos há mais de WEBHOOK_RETENCAO (os com erro ficam para análise)."""
+    removidos, _ = EventoWebhook.objects.filter(
+        status__in=("processado", "ignorado"),
+        processado_em__lt=timezone.now() - WEBHOOK_RETENCAO,
+    ).delete()
+    return removidos
@@ -0,0 +1,115 @@
+# clinic/utils/paginacao.py
+import base64
+import json
+
+from django.db.models import Q
+from django.http import JsonResponse
+
+POR_PAGINA = 50
+
+
+def _codificar_cursor(valor, pk):
+    bruto = json.dumps([valor.isoformat() if hasattr(valor, "isoformat") else valor, pk])
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip("=")
+
+
+def _decodificar_cursor(cursor, campo):
+    """Retorna (valor, pk) do cursor, ou None se ele for inválido."""
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        valor, pk = json.loads(bruto)
+        valor = campo.to_python(valor)
+        if valor is None:  # "valor__lt=None" não é um filtro válido
+            return None
+        return valor, int(pk)
+    except Exception:
+        return None
+
+
+def _url_com_cursor(request, cursor):
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    params.pop("formato", None)
+    if cursor:
+        params["cursor"] = cursor
+    return f"?{params.urlencode()}" if params else "?"
+
+
+def paginar_keyset(request, queryset, ordem, por_pagina=POR_PAGINA):
+    """
+    Paginação por cursor (keyset/seek) sobre `ordem` (ex.: '-data'), com o pk
+    como desempate. O custo de cada página independe de quantas já passaram,
+    ao contrário de OFFSET. Os filtros do GET são preservados nos links.
+    """
+    descendente = ordem.startswith("-")
+    nome_campo = ordem.lstrip("-")
+    campo = queryset.model._meta.get_field(nome_campo)
+
+    queryset = queryset.order_by(ordem, "-pk" if descendente else "pk")
+
+    cursor = request.GET.get("cursor")
+    posicao = _decodificar_cursor(cursor, campo) if cursor else None
+    if posicao:
+        valor, pk = posicao
+        op = "lt" if descendente else "gt"
+        queryset = queryset.filter(
+            Q(**{f"{nome_campo}__{op}": valor})
+            | Q(**{nome_campo: valor, f"pk__{op}": pk})
+        )
+
+    itens = list(queryset[:por_pagina + 1])
+    tem_proxima = len(itens) > por_pagina
+    itens = itens[:por_pagina]
+
+    proximo_cursor = None
+    if tem_proxima:
+        ultimo = itens[-1]
+        proximo_cursor = _codificar_cursor(getattr(ultimo, campo.attname), ultimo.pk)
+
+    return {
+        "itens": itens,
+        "tem_proxima": tem_proxima,
+        "proximo_cursor": proximo_cursor,
+        "primeira": posicao is None,
+        "url_proxima": _url_com_cursor(request, proximo_cursor) if tem_proxima else None,
+        "url_primeira": _url_com_cursor(request, None),
+    }
+
+
+def paginar_offset(request, queryset, por_pagina=POR_PAGINA):
+    """
+    Paginação por OFFSET com o mesmo formato de paginar_keyset (o cursor é o
+    deslocamento). Para ordens que não cabem num cursor, como a relevância da
+    busca; o conjunto já vem filtrado, então o OFFSET fica pequeno.
+    """
+    try:
+        inicio = max(int(request.GET.get("cursor") or 0), 0)
+    except ValueError:
+        inicio = 0
+
+    itens = list(queryset[inicio:inicio + por_pagina + 1])
+    tem_proxima = len(itens) > por_pagina
+    itens = itens[:por_pagina]
+
+    proximo_cursor = str(inicio + por_pagina) if tem_proxima else None
+    return {
+        "itens": itens,
+        "tem_proxima": tem_proxima,
+        "proximo_cursor": proximo_cursor,
+        "primeira": inicio == 0,
+        "url_proxima": _url_com_cursor(request, proximo_cursor) if tem_proxima else None,
+        "url_primeira": _url_com_cursor(request, None),
+    }
+
+
+def quer_json(request):
+    """Modo JSON (scroll infinito): ?formato=json."""
+    return request.GET.get("formato") == "json"
+
+
+def resposta_json_keyset(pagina, serializar):
+    """Resposta do scroll infinito: itens serializados + cursor da próxima página."""
+    return JsonResponse({
+        "itens": [serializar(item) for item in pagina["itens"]],
+        "proximo_cursor": pagina["proximo_cursor"],
+    })
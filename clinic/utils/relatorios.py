@@ -0,0 +1,335 @@
+# clinic/utils/relatorios.py
+# Geração dos relatórios financeiros (Excel/PDF), usada tanto pelas views de
+# exportação quanto pelo worker de `manage.py processar_relatorios`.
+import calendar
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.files import File
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from ..models import ClinicaConfig, Expense, Income, RelatorioJob
+from .logos import caminho_logo
+
+EXPORT_CHUNK = 2000
+PARAMETROS_PERIODO = ("data_inicio", "data_fim", "mes", "ano")
+
+# Fila de jobs
+RELATORIO_MAX_TENTATIVAS = 3
+RELATORIO_TIMEOUT = timedelta(minutes=getattr(settings, "RELATORIO_TIMEOUT_MINUTOS", 10))
+RELATORIO_RETENCAO = timedelta(days=getattr(settings, "RELATORIO_RETENCAO_DIAS", 7))
+
+
+def _data_param(valor):
+    try:
+        return parse_date(valor or "")
+    except ValueError:
+        return None
+
+
+def _inteiro_param(params, nome, padrao, minimo, maximo):
+    valor = params.get(nome)
+    if valor in (None, ""):
+        return padrao
+    try:
+        numero = int(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"Parâmetro '{nome}' inválido: {valor!r}.")
+    if not minimo <= numero <= maximo:
+        raise ValueError(f"Parâmetro '{nome}' fora do intervalo ({minimo}–{maximo}).")
+    return numero
+
+
+def periodo_exportacao(params):
+    """
+    Período exportado: `data_inicio`/`data_fim` (qualquer intervalo, inclusive
+    vários meses) ou, sem eles, o mês `mes`/`ano` (padrão: mês atual).
+    `params` é o request.GET ou o dict salvo no RelatorioJob.
+    Retorna (filtros do campo `data`, sufixo do arquivo, rótulo do título).
+    Lança ValueError se `mes`/`ano` forem inválidos.
+    """
+    data_inicio = _data_param(params.get("data_inicio"))
+    data_fim = _data_param(params.get("data_fim"))
+
+    if data_inicio or data_fim:
+        filtros = {}
+        if data_inicio:
+            filtros["data__gte"] = data_inicio
+        if data_fim:
+            filtros["data__lte"] = data_fim
+        inicio_txt = data_inicio.strftime("%d/%m/%Y") if data_inicio else "início"
+        fim_txt = data_fim.strftime("%d/%m/%Y") if data_fim else "hoje"
+        sufixo = "_".join(d.isoformat() for d in (data_inicio, data_fim) if d)
+        return filtros, sufixo, f"{inicio_txt} a {fim_txt}"
+
+    hoje = datetime.now()
+    mes = _inteiro_param(params, "mes", hoje.month, 1, 12)
+    ano = _inteiro_param(params, "ano", hoje.year, 2000, 2100)
+    ultimo_dia = calendar.monthrange(ano, mes)[1]
+    filtros = {"data__range": (date(ano, mes, 1), date(ano, mes, ultimo_dia))}
+    return filtros, f"{mes}_{ano}", f"{mes:02d}/{ano}"
+
+
+# ── Excel ───────────────────────────────────────────────────────────────────
+def _escrever_aba(workbook, nome, colunas, linhas):
+    """Escreve uma aba linha a linha (modo constant_memory: só avança, nunca volta)."""
+    aba = workbook.add_worksheet(nome)
+    negrito = workbook.add_format({"bold": True})
+    formatos = {
+        "data": workbook.add_format({"num_format": "dd/mm/yyyy"}),
+        "valor": workbook.add_format({"num_format": "#,##0.00"}),
+    }
+
+    for col, (titulo, tipo, largura) in enumerate(colunas):
+        aba.set_column(col, col, largura, formatos.get(tipo))
+        aba.write_string(0, col, titulo, negrito)
+
+    for lin, valores in enumerate(linhas, start=1):
+        for col, ((_, tipo, _), valor) in enumerate(zip(colunas, valores)):
+            if valor is None:
+                continue
+            if tipo == "data":
+                aba.write_datetime(lin, col, valor, formatos["data"])
+            elif tipo == "valor":
+                aba.write_number(lin, col, float(valor), formatos["valor"])
+            else:
+                aba.write_string(lin, col, str(valor))
+
+
+def gerar_excel_financeiro(owner, filtros, arquivo):
+    """
+    Gera a planilha (abas Receitas e Despesas) direto no arquivo informado.
+    As querysets são percorridas com .iterator() e o xlsxwriter roda em
+    constant_memory, então a memória não cresce com o tamanho do período.
+    """
+    import xlsxwriter
+
+    receitas = (
+        Income.objects.filter(owner=owner, **filtros)
+        .order_by("data", "pk")
+        .values_list("descricao", "valor", "data", "origem")
+        .iterator(chunk_size=EXPORT_CHUNK)
+    )
+    despesas = (
+        Expense.objects.filter(owner=owner, **filtros)
+        .order_by("data", "pk")
+        .values_list("categoria", "descricao", "valor", "data")
+        .iterator(chunk_size=EXPORT_CHUNK)
+    )
+
+    workbook = xlsxwriter.Workbook(arquivo, {"constant_memory": True})
+    _escrever_aba(workbook, "Receitas", [
+        ("Descrição", "texto", 40),
+        ("Valor (R$)", "valor", 14),
+        ("Data", "data", 12),
+        ("Origem", "texto", 14),
+    ], receitas)
+    _escrever_aba(workbook, "Despesas", [
+        ("Categoria", "texto", 20),
+        ("Descrição", "texto", 40),
+        ("Valor (R$)", "valor", 14),
+        ("Data", "data", 12),
+    ], despesas)
+    workbook.close()
+
+
+# ── PDF ─────────────────────────────────────────────────────────────────────
+def gerar_pdf_financeiro(owner, filtros, periodo, arquivo):
+    """Gera o relatório em PDF (ReportLab) no arquivo informado."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
+
+    receitas = Income.objects.filter(owner=owner, **filtros).order_by("data", "pk")
+    despesas = Expense.objects.filter(owner=owner, **filtros).order_by("data", "pk")
+
+    # ======== CONFIGURAÇÃO DO LOGO ===============
+    config = ClinicaConfig.objects.filter(owner=owner).first()
+
+    # caso tenha logo da clínica (miniatura pré-gerada, ver utils/logos.py)
+    if config and config.logo:
+        logo_path = caminho_logo(config, "pdf")
+    else:
+        # logo padrão
+        logo_path = finders.find("img/logo_odontoIA.png")
+
+    # ======== CRIA PDF ===============
+    pdf = SimpleDocTemplate(arquivo, pagesize=A4)
+
+    elementos = []
+    styles = getSampleStyleSheet()
+
+    # ---- LOGO ----
+    if logo_path and os.path.exists(logo_path):
+        try:
+            img = Image(logo_path, width=120, height=40, kind="proportional")
+            elementos.append(img)
+            elementos.append(Spacer(1, 12))
+        except:
+            pass  # se der erro, apenas não mostra logo
+
+    # ---- TÍTULO ----
+    titulo = f"Relatório Financeiro - {periodo}"
+    elementos.append(Paragraph(titulo, styles["Title"]))
+    elementos.append(Spacer(1, 20))
+
+    # -------------------------------------
+    # TABELA DE RECEITAS
+    # -------------------------------------
+    elementos.append(Paragraph("<b>Receitas</b>", styles["Heading2"]))
+    elementos.append(Spacer(1, 6))
+
+    dados_receitas = [["Data", "Descrição", "Origem", "Valor (R$)"]]
+
+    for r in receitas:
+        dados_receitas.append([
+            r.data.strftime("%d/%m/%Y"),
+            r.descricao,
+            r.origem or "-",
+            f"{r.valor:.2f}"
+        ])
+
+    tabela_receitas = Table(dados_receitas, colWidths=[80, 200, 100, 80])
+    tabela_receitas.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#4A90E2")),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("ALIGN", (3, 1), (3, -1), "RIGHT"),
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold")
+    ]))
+
+    elementos.append(tabela_receitas)
+    elementos.append(Spacer(1, 20))
+
+    # -------------------------------------
+    # TABELA DE DESPESAS
+    # -------------------------------------
+    elementos.append(Paragraph("<b>Despesas</b>", styles["Heading2"]))
+    elementos.append(Spacer(1, 6))
+
+    dados_despesas = [["Data", "Categoria", "Descrição", "Valor (R$)"]]
+
+    for d in despesas:
+        dados_despesas.append([
+            d.data.strftime("%d/%m/%Y"),
+            getattr(d.categoria, "nome", "-"),
+            d.descricao,
+            f"{d.valor:.2f}"
+        ])
+
+    tabela_despesas = Table(dados_despesas, colWidths=[80, 120, 180, 80])
+    tabela_despesas.setStyle(TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#D0021B")),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("ALIGN", (3, 1), (3, -1), "RIGHT"),
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold")
+    ]))
+
+    elementos.append(tabela_despesas)
+    elementos.append(Spacer(1, 30))
+
+    # -------------------------------------
+    # RODAPÉ CUSTOMIZADO OU PADRÃO
+    # -------------------------------------
+    rodape = None
+    if config and config.rodape_pdf:
+        rodape = config.rodape_pdf
+    else:
+        rodape = "Relatório gerado automaticamente pelo sistema OdontoIA"
+
+    elementos.append(Paragraph(f"<para align='center'><font size=9>{rodape}</font></para>"))
+
+    # -------------------------------------
+    # FINALIZA
+    # -------------------------------------
+    pdf.build(elementos)
+
+
+# ── Fila de jobs (tabela RelatorioJob, sem broker externo) ─────────────────
+def enfileirar_relatorio(owner, tipo, params):
+    """Enfileira o relatório; lança ValueError (sem criar o job) se o período for inválido."""
+    parametros = {k: params.get(k) for k in PARAMETROS_PERIODO if params.get(k)}
+    periodo_exportacao(parametros)
+    return RelatorioJob.objects.create(owner=owner, tipo=tipo, parametros=parametros)
+
+
+def reservar_proximo_job():
+    """
+    Pega o job pendente mais antigo. A reserva é um UPDATE condicional
+    (status='pendente' → 'processando'): se dois workers disputarem o mesmo
+    job, só um deles consegue a linha.
+    """
+    candidatos = (
+        RelatorioJob.objects.filter(status="pendente")
+        .order_by("criado_em")
+        .values_list("pk", flat=True)[:10]
+    )
+    for pk in candidatos:
+        reservado = RelatorioJob.objects.filter(pk=pk, status="pendente").update(
+            status="processando",
+            iniciado_em=timezone.now(),
+            tentativas=F("tentativas") + 1,
+        )
+        if reservado:
+            return RelatorioJob.objects.get(pk=pk)
+    return None
+
+
+def executar_relatorio(job):
+    """Gera o arquivo do job e o salva no storage (MEDIA_ROOT/relatorios/)."""
+    extensao = "xlsx" if job.tipo == "excel" else "pdf"
+
+    try:
+        # Dentro do try: parâmetros ruins viram job com erro, não derrubam o worker
+        filtros, sufixo, periodo = periodo_exportacao(job.parametros)
+        with tempfile.TemporaryFile() as tmp:
+            if job.tipo == "excel":
+                gerar_excel_financeiro(job.owner, filtros, tmp)
+            else:
+                gerar_pdf_financeiro(job.owner, filtros, periodo, tmp)
+            tmp.seek(0)
+            job.arquivo.save(f"{job.owner_id}_{job.pk}_{sufixo}.{extensao}", File(tmp), save=False)
+    except Exception as e:
+        job.status = "erro"
+        job.erro = repr(e)
+    else:
+        job.status = "concluido"
+        job.nome_arquivo = f"financeiro_{sufixo}.{extensao}"
+        job.erro = ""
+
+    job.concluido_em = timezone.now()
+    job.save(update_fields=["status", "arquivo", "nome_arquivo", "erro", "concluido_em"])
+    return job
+
+
+def recuperar_jobs_travados():
+    """Jobs 'processando' há mais de RELATORIO_TIMEOUT (worker morreu) voltam pra fila."""
+    limite = timezone.now() - RELATORIO_TIMEOUT
+    travados = RelatorioJob.objects.filter(status="processando", iniciado_em__lt=limite)
+    desistidos = travados.filter(tentativas__gte=RELATORIO_MAX_TENTATIVAS).update(
+        status="erro", erro="Tempo esgotado.", concluido_em=timezone.now()
+    )
+    reenfileirados = travados.update(status="pendente")
+    return reenfileirados, desistidos
+
+
+def limpar_relatorios_antigos():
+    """Remove jobs (e arquivos) concluídos há mais de RELATORIO_RETENCAO."""
+    antigos = RelatorioJob.objects.filter(
+        status__in=("concluido", "erro"),
+        concluido_em__lt=timezone.now() - RELATORIO_RETENCAO,
+    )
+    total = 0
+    for job in antigos.iterator():
+        if job.arquivo:
+            job.arquivo.delete(save=False)
+        job.delete()
+        total += 1
+    return total
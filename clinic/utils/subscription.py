@@ -1,32 +1,76 @@
 # clinic/utils/subscription.py
+# O vencimento é calculado fora do request: `manage.py varrer_assinaturas`
+# desliga `ativa` das vencidas e põe os avisos de "expira em breve" na caixa
+# de saída. O request lê o flag (via snapshot em cache) e só confere a data
+# como rede de segurança, caso a varredura pare.
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
 from django.utils import timezone
-from datetime import timedelta
+
 from ..models import Assinatura
+from .emails import enfileirar_emails
+
+# Tempo (s) que a assinatura fica no cache (compartilhado entre os processos)
+ASSINATURA_CACHE_TTL = getattr(settings, "ASSINATURA_CACHE_TTL", 60)
+
+# Avisa quando faltam até N dias (o mesmo limite do banner do base.html)
+DIAS_AVISO_EXPIRACAO = 3
+
+
+def _cache_key(user_id):
+    return f"clinic:assinatura:{user_id}"
+
+
+def get_assinatura_cache(user):
+    """
+    Retorna a Assinatura do usuário (ou None) usando o cache compartilhado.
+    O cache é invalidado ao salvar/excluir a Assinatura (ver signals.py), pelo
+    worker dos webhooks e pela varredura; o TTL só limita o que escapar disso.
+    """
+    key = _cache_key(user.pk)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = {"assinatura": Assinatura.objects.filter(user=user).first()}
+        cache.set(key, snapshot, ASSINATURA_CACHE_TTL)
+    return snapshot["assinatura"]
+
+
+def invalidar_cache_assinatura(user_id):
+    cache.delete(_cache_key(user_id))
+
+
+def invalidar_cache_assinaturas(user_ids):
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+
 
 def get_trial_info(user):
     """
     Retorna informações sobre o teste (trial) do usuário.
+    Ativa/expirada vem do flag `ativa`; os dias restantes são calculados a partir do snapshot em cache.
     """
-    try:
-        assinatura = Assinatura.objects.get(user=user)
-    except Assinatura.DoesNotExist:
+    assinatura = get_assinatura_cache(user)
+    if assinatura is None:
         return {
             "existe": False,
             "ativa": False,
             "expirada": True,
             "dias_restantes": 0,
             "fim_teste": None,
+            "assinatura": None,
         }
 
-    hoje = timezone.now().date()
-    fim_teste = assinatura.fim_teste.date() if assinatura.fim_teste else None
-
-    if fim_teste and hoje > fim_teste:
-        expirada = True
-        dias_restantes = 0
-    else:
-        expirada = False
-        dias_restantes = (fim_teste - hoje).days if fim_teste else 0
+    # `ativa` é mantido pela varredura; a data vencida também bloqueia, para o
+    # caso de a varredura ter parado (ninguém fica com acesso grátis)
+    dias_restantes = 0
+    if assinatura.fim_teste:
+        dias_restantes = (timezone.localtime(assinatura.fim_teste).date() - timezone.localdate()).days
+    expirada = not assinatura.ativa or dias_restantes < 0
+    dias_restantes = 0 if expirada else dias_restantes
 
     return {
         "existe": True,
@@ -34,9 +78,22 @@ def get_trial_info(user):
         "expirada": expirada,
         "dias_restantes": dias_restantes,
         "fim_teste": assinatura.fim_teste,
+        "assinatura": assinatura,
     }
 
 
+def get_trial_info_request(request):
+    """
+    Igual a get_trial_info, mas memoizado no request: middleware, decorator
+    e context processor compartilham o mesmo resultado.
+    """
+    info = getattr(request, "_trial_info", None)
+    if info is None:
+        info = get_trial_info(request.user)
+        request._trial_info = info
+    return info
+
+
 def verificar_assinatura(user):
     """
     Retorna (ativa: bool, dias_restantes: int)
@@ -46,3 +103,79 @@ def verificar_assinatura(user):
     if not info:
         return (False, 0)
     return (info["ativa"], info["dias_restantes"])
+
+
+def verificar_assinatura_request(request):
+    """Versão de verificar_assinatura que reaproveita o snapshot do request."""
+    info = get_trial_info_request(request)
+    return (info["ativa"], info["dias_restantes"])
+
+
+# ── Varredura (manage.py varrer_assinaturas) ───────────────────────────────
+def _inicio_do_dia(dia):
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def expirar_assinaturas(hoje=None):
+    """
+    Desliga as assinaturas cujo fim_teste ficou antes de hoje (o último dia
+    ainda vale inteiro). Um UPDATE só; o cache dos usuários afetados é descartado.
+    Retorna quantas expiraram.
+    """
+    inicio_hoje = _inicio_do_dia(hoje or timezone.localdate())
+    vencidas = Assinatura.objects.filter(ativa=True, fim_teste__lt=inicio_hoje)
+    user_ids = list(vencidas.values_list("user_id", flat=True))
+    if not user_ids:
+        return 0
+
+    # Repete o filtro no UPDATE: quem renovou entre o SELECT e aqui não expira
+    expiradas = vencidas.filter(user_id__in=user_ids).update(ativa=False)
+    invalidar_cache_assinaturas(user_ids)
+    return expiradas
+
+
+def _email_aviso(assinatura, dias):
+    nome = assinatura.user.first_name or assinatura.user.username
+    plano = assinatura.get_tipo_display()
+    validade = timezone.localtime(assinatura.fim_teste).strftime("%d/%m/%Y")
+    contexto = {"nome": nome, "plano": plano, "validade": validade, "dias": dias}
+
+    return {
+        "assunto": "⏳ Seu plano OdontoIA está perto de expirar",
+        "corpo": f"Olá {nome}, seu {plano} expira em {dias} dia(s), em {validade}. "
+                 "Renove em https://app.odontoia.codertec.com.br para não perder o acesso.",
+        "destinatarios": [assinatura.user.email],
+        "html": render_to_string("clinic/emails/assinatura_expirando.html", contexto),
+    }
+
+
+def avisar_assinaturas_expirando(hoje=None, dias=DIAS_AVISO_EXPIRACAO):
+    """
+    Põe na caixa de saída (o `manage.py enviar_emails` envia em lote) o aviso
+    "expira em até N dias", uma vez por vencimento. Fila e marcação
+    (aviso_expiracao_para = fim_teste, um UPDATE só) na mesma transação;
+    se renovar, o aviso volta a valer. Retorna quantos avisos foram enfileirados.
+    """
+    hoje = hoje or timezone.localdate()
+    inicio_hoje = _inicio_do_dia(hoje)
+    candidatas = list(
+        Assinatura.objects.filter(
+            ativa=True,
+            fim_teste__gte=inicio_hoje,
+            fim_teste__lt=inicio_hoje + timedelta(days=dias + 1),
+        )
+        .exclude(aviso_expiracao_para=F("fim_teste"))
+        .exclude(user__email="")
+        .select_related("user")
+    )
+    if not candidatas:
+        return 0
+
+    avisos = [
+        _email_aviso(assinatura, (timezone.localtime(assinatura.fim_teste).date() - hoje).days)
+        for assinatura in candidatas
+    ]
+    with transaction.atomic():
+        enfileirados = enfileirar_emails(avisos)
+        Assinatura.objects.filter(pk__in=[a.pk for a in candidatas]).update(aviso_expiracao_para=F("fim_teste"))
+    return enfileirados
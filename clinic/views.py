@@ -1,175 +1,44 @@
-import os
-from django.contrib.staticfiles import finders
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-import io
 from datetime import datetime, timedelta
-from reportlab.lib.units import cm
-from reportlab.lib.pagesizes import A4
-import pandas as pd
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from .utils.contexto_dinamico import gerar_contexto_dinamico
-import re
-from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest
+from django.http import JsonResponse
 from django.utils import timezone
 from django.utils.dateparse import parse_date
-from django.db.models import Q, Sum, Count
+from django.db import transaction
+from django.db.models import Q, Count
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from .models import Paciente, Consulta, Dentista, Procedimento, Assinatura, Pagamento, Income, Expense, ClinicaConfig
-from .forms import PacienteForm, ProcedimentoForm, IncomeForm, ExpenseForm, ClinicaConfigForm
-from .forms_consulta import ConsultaForm
+from .models import (
+    Paciente, Consulta, Dentista, Procedimento, Assinatura, Pagamento, ClinicaConfig, SerieConsulta,
+    DURACAO_PADRAO_MINUTOS, DURACAO_MAXIMA_MINUTOS,
+)
+from .forms import PacienteForm, ProcedimentoForm, ClinicaConfigForm, ImportarPacientesForm
+from .forms_consulta import ConsultaForm, SerieConsultaForm
+from .services import (
+    get_dashboard_metrics,
+    recalcular_comissoes_dentista,
+    gerar_consultas_serie,
+    atualizar_consultas_serie,
+)
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST, require_GET
+from django.views.decorators.http import require_GET, condition
+from django.utils.cache import patch_cache_control
 from django.utils.dateparse import parse_datetime
-from django.db.models import Count, Sum, Avg
-import calendar
+from django.db.models import Max
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth import authenticate, login, logout
-from django.contrib import messages
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from .decorators import require_active_subscription
-from django.conf import settings
-from django.core.mail import send_mail
-from django.core.mail import EmailMultiAlternatives
+from .utils.paginacao import paginar_keyset, paginar_offset, quer_json, resposta_json_keyset
+from .utils.busca import buscar_pacientes
+from .utils.agenda import conflito_horario, horarios_livres, mensagem_conflito
+from .utils.importacao import importar_pacientes
+from .utils.emails import enfileirar_email
 from django.template.loader import render_to_string
-from openai import OpenAI
-import json
-import uuid
-import mercadopago
-from decimal import Decimal
-from django.urls import reverse
-import openpyxl
-from openpyxl.utils import get_column_letter
-
-
-# inicializa o client globalmente mas de forma segura
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-
-def _odontoia_system_prompt(user):
-    from .utils.contexto_dinamico import gerar_contexto_dinamico
-
-    nome = user.first_name or user.username
-    contexto_dinamico = gerar_contexto_dinamico(user)
-
-    return f"""
-Você é o **Assistente Oficial do OdontoIA**, um sistema de gestão odontológica voltado a dentistas, clínicas e secretárias.
-
-Regras fundamentais:
-- Sempre responda em **português (pt-BR)**, de forma profissional, breve e empática.
-- **Nunca forneça informações clínicas** sobre pacientes, diagnósticos ou tratamentos odontológicos.
-- O foco é **ensinar o usuário a usar o sistema OdontoIA**.
-- O público-alvo são **usuários do sistema (dentistas, secretárias, administradores)**, não pacientes.
-- Se o usuário perguntar “como faço X”, explique o caminho pelo sistema (menus e páginas) de forma prática.
-- Use os nomes exatos dos menus do OdontoIA: **Dashboard**, **Pacientes**, **Consultas**, **Procedimentos**, **Agenda**, **Financeiro**, **/admin** (apenas administradores).
+import hashlib
 
-Contexto real do sistema:
-- O cadastro de **dentistas** é feito **somente por usuários administradores**, no painel **/admin**, usando o campo **CRO**.
-- O cadastro de **pacientes** e **procedimentos** é feito diretamente no app.
-- O módulo de **consultas** permite marcar, editar e concluir atendimentos.
-- O módulo de **financeiro** mostra comissões, faturamento e lucro líquido.
-- O sistema possui **teste gratuito de 7 dias**, após o qual a conta precisa de assinatura ativa.
-- Se o usuário perguntar sobre **planos ou preços**, explique que há planos **Básico**, **Profissional** e **Premium**.
-- Se o trial estiver próximo de expirar, lembre da página de planos (https://odontoia.codertec.com.br).
-
-Comportamento:
-- Seja proativo e claro (ex: “Vá até ‘Pacientes’ > ‘Novo Paciente’”).
-- Se a ação for restrita (como cadastrar dentista), avise que só **administradores** podem fazer.
-- Se não souber, oriente a procurar o suporte da Codertec.
-
-📊 **Dados em tempo real do sistema:**
-{contexto_dinamico}
-
-Contexto atual:
-- Usuário logado: {nome}
-- Data e hora: {timezone.now().strftime('%d/%m/%Y %H:%M')}
-    """.strip()
-
-
-def _get_openai_client():
-    try:
-        from openai import OpenAI
-    except Exception as e:
-        return None, f"SDK OpenAI não disponível: {e}"
-
-    # tenta .env → settings
-    api_key = os.getenv("OPENAI_API_KEY") or getattr(
-        settings, "OPENAI_API_KEY", None)
-    if not api_key:
-        return None, "OPENAI_API_KEY não configurada (adicione no .env ou nas variáveis do serviço)."
-
-    try:
-        client = OpenAI(api_key=api_key)  # sem proxies/kwargs estranhos
-        return client, None
-    except Exception as e:
-        return None, f"Falha ao criar cliente OpenAI: {e}"
-
-# ── Endpoint de diagnóstico (opcional, ajuda no debug) ─────────────────────
-
-
-@csrf_exempt
-@login_required
-@require_GET
-def chat_diag(request):
-    has_key = bool(os.getenv("OPENAI_API_KEY") or getattr(
-        settings, "OPENAI_API_KEY", None))
-    return JsonResponse({
-        "ok": True,
-        "user": request.user.username,
-        "openai_key_present": has_key,
-    })
-
-
-# ── Endpoint principal do chat ──────────────────────────────────────────────
-@csrf_exempt                 # evita dor de cabeça com CSRF no fetch
-@login_required              # exige login (se 302 → login)
-@require_POST
-def chat_odontoia_api(request):
-    # lê payload
-    try:
-        payload = json.loads(request.body.decode("utf-8") or "{}")
-        user_msg = (payload.get("message") or "").strip()
-    except Exception:
-        return JsonResponse({"error": "Payload inválido."}, status=400)
-
-    if not user_msg:
-        return JsonResponse({"error": "Mensagem vazia."}, status=400)
-
-    # cliente OpenAI
-    client, err = _get_openai_client()
-    if err:
-        # devolve o motivo real pro front (facilita corrigir config)
-        return JsonResponse({"error": err}, status=500)
-
-    # histórico (curto) na sessão
-    history = request.session.get("chat_history", [])
-    messages = [
-        {"role": "system", "content": _odontoia_system_prompt(request.user)}]
-    messages.extend(history[-20:])  # últimos turnos
-    messages.append({"role": "user", "content": user_msg})
-
-    try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            temperature=0.2,
-        )
-        answer = (resp.choices[0].message.content or "").strip()
-    except Exception as e:
-        # log no servidor e motivo no front
-        print("OpenAI error:", repr(e))
-        return JsonResponse({"error": f"OpenAI falhou: {e}"}, status=502)
-
-    # salva histórico
-    history.append({"role": "user", "content": user_msg})
-    history.append({"role": "assistant", "content": answer})
-    request.session["chat_history"] = history
-
-    return JsonResponse({"answer": answer})
+# Chat, pagamentos, financeiro e exportações ficam em views_chat.py,
+# views_pagamentos.py, views_financeiro.py e views_exportacao.py; as libs
+# pesadas (openai, mercadopago, pandas, reportlab) são importadas sob demanda.
 
 
 # === LOGIN ===
@@ -226,6 +95,15 @@ def user_logout(request):
     return redirect("clinic:login")
 
 
+def _duracao_ajax(valor):
+    """Duração (min) vinda do calendário, limitada ao intervalo aceito pelo modelo."""
+    try:
+        duracao = int(float(valor))
+    except (TypeError, ValueError, OverflowError):  # None, "abc", "nan", "inf"
+        return DURACAO_PADRAO_MINUTOS
+    return min(max(duracao, 5), DURACAO_MAXIMA_MINUTOS)
+
+
 # permite AJAX sem token no protótipo (depois ajustamos segurança)
 @csrf_exempt
 @login_required
@@ -233,14 +111,24 @@ def user_logout(request):
 def consulta_create_ajax(request):
     if request.method == "POST":
         try:
-            consulta = Consulta.objects.create(
+            consulta = Consulta(
                 paciente_id=request.POST.get("paciente"),
-                dentista_id=request.POST.get("dentista"),
+                dentista_id=request.POST.get("dentista") or None,
                 procedimento_id=request.POST.get("procedimento"),
                 data=parse_datetime(request.POST.get("data")),
+                duracao=_duracao_ajax(request.POST.get("duracao")),
                 observacoes=request.POST.get("observacoes", ""),
                 owner=request.user  # 🔥 ESSENCIAL
             )
+            with transaction.atomic():
+                conflito = conflito_horario(
+                    consulta.dentista_id, consulta.data,
+                    consulta.data + timedelta(minutes=consulta.duracao) if consulta.data else None)
+                if conflito:
+                    return JsonResponse(
+                        {"success": False, "error": mensagem_conflito(conflito), "conflito": conflito.pk},
+                        status=409)
+                consulta.save()
             return JsonResponse({"success": True, "id": consulta.id})
         except Exception as e:
             return JsonResponse({"success": False, "error": str(e)})
@@ -272,17 +160,32 @@ def consultas_list(request):
     elif status == 'concluida':
         consultas = consultas.filter(concluida=True)
 
-    # 📅 Filtro por data específica
+    # 📅 Filtro por data específica (intervalo do dia: usa o índice (owner, data))
     if data_filtro:
         try:
             data_formatada = parse_date(data_filtro)
             if data_formatada:
-                consultas = consultas.filter(data__date=data_formatada)
+                inicio_dia = timezone.make_aware(datetime.combine(data_formatada, datetime.min.time()))
+                consultas = consultas.filter(
+                    data__gte=inicio_dia, data__lt=inicio_dia + timedelta(days=1))
         except:
             pass
 
+    pagina = paginar_keyset(request, consultas, '-data')
+
+    if quer_json(request):
+        return resposta_json_keyset(pagina, lambda c: {
+            'id': c.id,
+            'paciente': c.paciente.nome,
+            'dentista': c.dentista.nome if c.dentista else '',
+            'procedimento': c.procedimento.nome,
+            'data': c.data.isoformat(),
+            'concluida': c.concluida,
+        })
+
     return render(request, 'clinic/consultas_list.html', {
-        'consultas': consultas,
+        'consultas': pagina['itens'],
+        'pagina': pagina,
         'search': search or '',
         'status': status or '',
         'data_filtro': data_filtro or '',
@@ -313,6 +216,57 @@ def consulta_create(request):
     return render(request, 'clinic/consulta_form.html', {'form': form})
 
 
+@login_required
+@require_active_subscription
+def serie_create(request):
+    if request.method == 'POST':
+        form = SerieConsultaForm(request.POST, user=request.user)
+        if form.is_valid():
+            serie = form.save(commit=False)
+            serie.owner = request.user
+            serie.save()
+
+            # Todas as ocorrências num único bulk_create
+            consultas = gerar_consultas_serie(serie)
+            messages.success(request, f"🔁 Série criada com {len(consultas)} consulta(s)!")
+            return redirect('clinic:consultas_list')
+        else:
+            messages.error(request, "Corrija os erros abaixo.")
+    else:
+        form = SerieConsultaForm(user=request.user)
+
+    return render(request, 'clinic/serie_form.html', {'form': form})
+
+
+@login_required
+@require_active_subscription
+def serie_update(request, pk):
+    serie = get_object_or_404(SerieConsulta, pk=pk, owner=request.user)
+
+    if request.method == 'POST':
+        form = SerieConsultaForm(request.POST, instance=serie, user=request.user)
+        if form.is_valid():
+            deslocamento = form.deslocamento()
+            serie = form.save(commit=False)
+            serie.inicio += deslocamento
+            serie.save()
+
+            # Próximas consultas atualizadas com um único UPDATE
+            total = atualizar_consultas_serie(
+                serie,
+                a_partir_de=form.cleaned_data.get('a_partir_de'),
+                deslocamento=deslocamento,
+            )
+            messages.success(request, f"Série atualizada em {total} consulta(s) futura(s).")
+            return redirect('clinic:consultas_list')
+        else:
+            messages.error(request, "Corrija os erros abaixo.")
+    else:
+        form = SerieConsultaForm(instance=serie, user=request.user)
+
+    return render(request, 'clinic/serie_form.html', {'form': form, 'serie': serie})
+
+
 @login_required
 @require_active_subscription
 def consulta_update(request, pk):
@@ -326,22 +280,9 @@ def consulta_update(request, pk):
             if consulta.procedimento:
                 consulta.valor = consulta.procedimento.valor_base
 
-            consulta.save()
+            consulta.save()  # a receita (Income) é sincronizada em signals.py
             form.save_m2m()
 
-            # integração financeira
-            if consulta.paga:
-                if not Income.objects.filter(consulta=consulta).exists():
-                    Income.objects.create(
-                        owner=request.user,
-                        origem='consulta',
-                        consulta=consulta,
-                        descricao=f'Consulta - {consulta.paciente.nome}',
-                        valor=consulta.valor,
-                        data=consulta.data.date(),
-                        pago=True,
-                    )
-
             messages.success(request, "Consulta atualizada!")
             return redirect('clinic:consultas_list')
         else:
@@ -365,45 +306,203 @@ def consulta_delete(request, pk):
     return render(request, 'clinic/consulta_confirm_delete.html', {'consulta': consulta})
 
 
+def _parse_data_calendario(valor):
+    """
+    Converte o start/end do FullCalendar (ISO 8601, com ou sem hora) em datetime aware.
+    O '+' do offset pode chegar como espaço quando não é codificado na URL.
+    """
+    if not valor:
+        return None
+    valor = valor.strip().replace(" ", "+")
+    data = parse_datetime(valor)
+    if data is None:
+        dia = parse_date(valor[:10])
+        if dia is None:
+            return None
+        data = datetime.combine(dia, datetime.min.time())
+    if timezone.is_naive(data):
+        data = timezone.make_aware(data)
+    return data
+
+
+def _consultas_calendario(request):
+    """
+    Consultas do owner na janela [start, end) pedida pelo FullCalendar (ou None).
+    ?dentista= não numérico levanta ValueError (a view responde 400).
+    """
+    inicio = _parse_data_calendario(request.GET.get('start'))
+    fim = _parse_data_calendario(request.GET.get('end'))
+    if not inicio or not fim:
+        return None
+
+    consultas = Consulta.objects.filter(
+        owner=request.user, data__gte=inicio, data__lt=fim)
+
+    dentista_id = request.GET.get('dentista')
+    if dentista_id:
+        consultas = consultas.filter(dentista_id=int(dentista_id))
+
+    return consultas
+
+
+def _versao_calendario(request):
+    """
+    (etag, last_modified) da janela pedida, calculados com um único aggregate.
+    Memoizado no request para servir aos dois callbacks do @condition.
+    """
+    if not hasattr(request, '_versao_calendario'):
+        try:
+            consultas = _consultas_calendario(request)
+        except ValueError:
+            consultas = None  # sem ETag: a view devolve o 400
+        versao = (None, None)
+        if consultas is not None:
+            info = consultas.aggregate(
+                total=Count('id'), ultima=Max('atualizado_em'))
+            chave = f"{request.user.pk}:{request.GET.urlencode()}:{info['total']}:{info['ultima']}"
+            versao = (hashlib.md5(chave.encode()).hexdigest(), info['ultima'])
+        request._versao_calendario = versao
+    return request._versao_calendario
+
+
 @login_required
 @require_active_subscription
+@condition(
+    etag_func=lambda request: _versao_calendario(request)[0],
+    last_modified_func=lambda request: _versao_calendario(request)[1],
+)
 def consultas_calendar(request):
-    # AJAX → retorna eventos
-    if request.GET.get('start') and request.GET.get('end'):
-        dentista_id = request.GET.get('dentista')
-
-        consultas = Consulta.objects.filter(owner=request.user)
-
-        if dentista_id:
-            consultas = consultas.filter(dentista_id=dentista_id)
-
-        eventos = []
-        for c in consultas:
-            eventos.append({
-                "id": c.id,
-                "title": c.paciente.nome,
-                "start": c.data.isoformat(),
-                "backgroundColor": "#0b5394" if not c.concluida else "#28a745",
+    # AJAX → retorna eventos da janela visível
+    try:
+        consultas = _consultas_calendario(request)
+    except ValueError:
+        return JsonResponse({"erro": "Dentista inválido."}, status=400)
+    if consultas is not None:
+        linhas = consultas.values(
+            'id', 'data', 'data_fim', 'concluida', 'observacoes',
+            'paciente__nome', 'dentista__nome', 'procedimento__nome',
+        ).order_by('data')
+
+        eventos = [
+            {
+                "id": c['id'],
+                "title": c['paciente__nome'],
+                "start": c['data'].isoformat(),
+                "end": c['data_fim'].isoformat() if c['data_fim'] else None,
+                "backgroundColor": "#28a745" if c['concluida'] else "#0b5394",
                 "borderColor": "#0b5394",
                 "textColor": "white",
                 "extendedProps": {
-                    "dentista": c.dentista.nome if c.dentista else "",
-                    "procedimento": c.procedimento.nome if c.procedimento else "",
-                    "observacoes": c.observacoes or ""
+                    "dentista": c['dentista__nome'] or "",
+                    "procedimento": c['procedimento__nome'] or "",
+                    "observacoes": c['observacoes'] or ""
                 },
-                "url": f"/consultas/{c.id}/editar/"
-            })
+                "url": f"/consultas/{c['id']}/editar/"
+            }
+            for c in linhas
+        ]
 
-        return JsonResponse(eventos, safe=False)
+        response = JsonResponse(eventos, safe=False)
+        # O navegador guarda a resposta, mas sempre revalida (304 se nada mudou)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
-    # Tela normal
+    # Tela normal (pacientes e procedimentos vêm do autocomplete)
     return render(request, 'clinic/consultas_calendar.html', {
-        'pacientes': Paciente.objects.filter(owner=request.user),
-        'dentistas': Dentista.objects.filter(owner=request.user),
-        'procedimentos': Procedimento.objects.filter(owner=request.user),
+        'dentistas': Dentista.objects.filter(owner=request.user).only('id', 'nome'),
     })
 
 
+AUTOCOMPLETE_LIMITE = 10
+
+
+@login_required
+@require_active_subscription
+@require_GET
+def autocomplete(request, tipo):
+    """
+    Top-N de pacientes, dentistas ou procedimentos do owner para os selects
+    com busca (só id/label; procedimentos trazem também o valor base).
+    """
+    termo = (request.GET.get('q') or '').strip()
+    try:
+        limite = min(int(request.GET.get('limite', AUTOCOMPLETE_LIMITE)), 50)
+    except ValueError:
+        limite = AUTOCOMPLETE_LIMITE
+
+    if tipo == 'paciente':
+        pacientes = Paciente.objects.filter(owner=request.user)
+        if termo:
+            pacientes = buscar_pacientes(pacientes, termo)
+        else:
+            pacientes = pacientes.order_by('nome')
+        resultados = [
+            {'id': p['id'], 'label': p['nome']}
+            for p in pacientes.values('id', 'nome')[:limite]
+        ]
+
+    elif tipo == 'dentista':
+        dentistas = Dentista.objects.filter(owner=request.user).order_by('nome')
+        if termo:
+            dentistas = dentistas.filter(Q(nome__icontains=termo) | Q(cro__icontains=termo))
+        resultados = [
+            {'id': d['id'], 'label': f"{d['nome']} - CRO: {d['cro']}"}
+            for d in dentistas.values('id', 'nome', 'cro')[:limite]
+        ]
+
+    elif tipo == 'procedimento':
+        procedimentos = Procedimento.objects.filter(owner=request.user).order_by('nome')
+        if termo:
+            procedimentos = procedimentos.filter(nome__icontains=termo)
+        resultados = [
+            {'id': p['id'], 'label': p['nome'], 'valor': float(p['valor_base'])}
+            for p in procedimentos.values('id', 'nome', 'valor_base')[:limite]
+        ]
+
+    else:
+        return JsonResponse({'error': 'Tipo inválido.'}, status=404)
+
+    return JsonResponse({'resultados': resultados})
+
+
+# Maior janela aceita na busca de horários livres
+JANELA_MAXIMA_LIVRES = timedelta(days=62)
+
+
+@login_required
+@require_active_subscription
+@require_GET
+def consultas_horarios_livres(request):
+    """
+    Horários livres do dentista (?dentista=&duracao=min&start=&end=) como
+    eventos de fundo do FullCalendar. Sem start/end: próximos 7 dias.
+    """
+    if not request.GET.get('dentista'):
+        return JsonResponse([], safe=False)
+    try:
+        dentista_id = int(request.GET['dentista'])
+    except ValueError:
+        return JsonResponse({"erro": "Dentista inválido."}, status=400)
+    dentista = get_object_or_404(Dentista.objects.only('id'), pk=dentista_id, owner=request.user)
+
+    inicio = _parse_data_calendario(request.GET.get('start')) or timezone.now()
+    fim = _parse_data_calendario(request.GET.get('end')) or inicio + timedelta(days=7)
+    fim = min(fim, inicio + JANELA_MAXIMA_LIVRES)
+    duracao = timedelta(minutes=_duracao_ajax(request.GET.get('duracao')))
+
+    eventos = [
+        {
+            "start": timezone.localtime(comeca).isoformat(),
+            "end": timezone.localtime(termina).isoformat(),
+            "display": "background",
+            "backgroundColor": "#8fd694",
+            "extendedProps": {"livre": True},
+        }
+        for comeca, termina in horarios_livres(dentista.pk, inicio, fim, duracao)
+    ]
+    return JsonResponse(eventos, safe=False)
+
+
 @csrf_exempt
 @login_required
 @require_active_subscription
@@ -421,13 +520,27 @@ def consulta_update_ajax(request):
         return JsonResponse({"success": False, "error": "Dados incompletos"})
 
     try:
-        data_convertida = parse_datetime(nova_data)
+        data_convertida = _parse_data_calendario(nova_data)
         if not data_convertida:
             return JsonResponse({"success": False, "error": "Data inválida"})
 
-        consulta = Consulta.objects.get(pk=consulta_id, owner=request.user)
-        consulta.data = data_convertida
-        consulta.save()
+        with transaction.atomic():
+            consulta = Consulta.objects.get(pk=consulta_id, owner=request.user)
+            consulta.data = data_convertida
+
+            # Redimensionado no calendário → nova duração
+            fim = _parse_data_calendario(request.POST.get("end"))
+            if fim and fim > data_convertida:
+                consulta.duracao = _duracao_ajax((fim - data_convertida).total_seconds() // 60)
+
+            conflito = conflito_horario(
+                consulta.dentista_id, consulta.data,
+                consulta.data + timedelta(minutes=consulta.duracao), excluir_pk=consulta.pk)
+            if conflito:
+                return JsonResponse(
+                    {"success": False, "error": mensagem_conflito(conflito), "conflito": conflito.pk},
+                    status=409)
+            consulta.save()
 
         return JsonResponse({"success": True})
 
@@ -444,74 +557,17 @@ def dashboard(request):
     user = request.user
     hoje = timezone.now().date()
     periodo = int(request.GET.get('periodo', 30))
-    data_inicial = hoje - timedelta(days=periodo)
 
     # Garantir que o usuário tenha ao menos 1 dentista
     if not Dentista.objects.filter(owner=request.user).exists():
         return redirect('clinic:dentista_principal')
 
-    # === CONSULTAS PAGAS do usuário ===
-    consultas_pagas = Consulta.objects.filter(
-        owner=user,
-        paga=True,
-        data__date__gte=data_inicial,
-        data__date__lte=hoje + timedelta(days=90)
-    )
-
-    # Se não houver pagas no período → pega todas pagas do usuário
-    if not consultas_pagas.exists():
-        consultas_pagas = Consulta.objects.filter(owner=user, paga=True)
+    # === Métricas de consultas (serviço compartilhado com dashboard_data) ===
+    metricas = get_dashboard_metrics(user, periodo)
 
-    # === Estatísticas Gerais ===
     total_pacientes = Paciente.objects.filter(owner=user).count()
-    total_consultas = Consulta.objects.filter(owner=user).count()
-    consultas_concluidas = consultas_pagas.filter(concluida=True).count()
-    consultas_pendentes = Consulta.objects.filter(
-        owner=user, concluida=False).count()
-
-    # === Faturamento ===
-    faturamento_total = consultas_pagas.aggregate(
-        total=Sum('valor_final')
-    )['total'] or 0
-
-    faturamento_medio = consultas_pagas.aggregate(
-        media=Avg('valor_final')
-    )['media'] or 0
-
-    comissoes_total = consultas_pagas.aggregate(
-        total=Sum('comissao_valor')
-    )['total'] or 0
-
-    faturamento_liquido = faturamento_total - comissoes_total
-
-    # === Faturamento mensal ===
-    consultas_mes = consultas_pagas.filter(
-        data__month=hoje.month,
-        data__year=hoje.year
-    )
-
-    faturamento_mensal_bruto = consultas_mes.aggregate(
-        total=Sum('valor_final')
-    )['total'] or 0
-
-    faturamento_mensal_comissoes = consultas_mes.aggregate(
-        total=Sum('comissao_valor')
-    )['total'] or 0
-
-    faturamento_mensal_liquido = faturamento_mensal_bruto - faturamento_mensal_comissoes
-
-    # === Estatísticas por dentista (somente do usuário) ===
-    consultas_por_dentista = (
-        consultas_pagas.exclude(dentista__isnull=True)
-        .values('dentista__nome')
-        .annotate(
-            total_consultas=Count('id'),
-            receita=Sum('valor_final'),
-            comissao=Sum('comissao_valor')
-        )
-        .order_by('-receita')
-    )
 
+    consultas_por_dentista = metricas['consultas_por_dentista']
     if consultas_por_dentista:
         dentistas_labels = [c['dentista__nome']
                             for c in consultas_por_dentista]
@@ -526,41 +582,10 @@ def dashboard(request):
         dentistas_receita = [0]
         dentistas_comissao = [0]
 
-    # === Ranking ===
-    ranking_dentistas = (
-        consultas_pagas.values('dentista__nome')
-        .annotate(
-            total_consultas=Count('id'),
-            receita=Sum('valor_final'),
-            comissao=Sum('comissao_valor')
-        )
-        .order_by('-receita')[:5]
-    )
-
-    # === Últimos 6 meses ===
-    meses = []
-    dados_consultas = []
-    dados_receita = []
-
-    for i in range(5, -1, -1):
-        mes_ref = hoje - timedelta(days=30 * i)
-        nome_mes = calendar.month_abbr[mes_ref.month]
-
-        cons_mes = consultas_pagas.filter(
-            data__month=mes_ref.month,
-            data__year=mes_ref.year
-        )
-
-        meses.append(nome_mes)
-        dados_consultas.append(cons_mes.count())
-        dados_receita.append(float(
-            cons_mes.aggregate(total=Sum('valor_final'))['total'] or 0
-        ))
-
     # === Status ===
     status_consultas = {
-        'concluidas': consultas_concluidas,
-        'pendentes': consultas_pendentes,
+        'concluidas': metricas['consultas_concluidas'],
+        'pendentes': metricas['consultas_pendentes'],
     }
 
     # === Próximas consultas (independente de pagas) ===
@@ -594,26 +619,26 @@ def dashboard(request):
     contexto = {
         # Geral
         'total_pacientes': total_pacientes,
-        'total_consultas': total_consultas,
-        'consultas_concluidas': consultas_concluidas,
-        'consultas_pendentes': consultas_pendentes,
+        'total_consultas': metricas['total_consultas'],
+        'consultas_concluidas': metricas['consultas_concluidas'],
+        'consultas_pendentes': metricas['consultas_pendentes'],
 
         # Gráficos
-        'meses': meses,
-        'dados_consultas': dados_consultas,
-        'dados_receita': dados_receita,
+        'meses': metricas['meses'],
+        'dados_consultas': metricas['dados_consultas'],
+        'dados_receita': metricas['dados_receita'],
         'dentistas_labels': dentistas_labels,
         'dentistas_qtd': dentistas_qtd,
         'dentistas_receita': dentistas_receita,
         'dentistas_comissao': dentistas_comissao,
-        'ranking_dentistas': ranking_dentistas,
+        'ranking_dentistas': metricas['ranking_dentistas'],
 
         # Financeiro
-        'faturamento_total': faturamento_total,
-        'faturamento_liquido': faturamento_liquido,
-        'faturamento_mensal': faturamento_mensal_liquido,
-        'faturamento_medio': faturamento_medio,
-        'comissoes_total': comissoes_total,
+        'faturamento_total': metricas['faturamento_total'],
+        'faturamento_liquido': metricas['faturamento_liquido'],
+        'faturamento_mensal': metricas['faturamento_mensal'],
+        'faturamento_medio': metricas['faturamento_medio'],
+        'comissoes_total': metricas['comissoes_total'],
 
         # Status / Outras informações
         'periodo': periodo,
@@ -631,123 +656,27 @@ def dashboard(request):
 @login_required
 @require_active_subscription
 def dashboard_data(request):
-    user = request.user
-    hoje = timezone.now().date()
     periodo = int(request.GET.get('periodo', 30))
-    data_inicial = hoje - timedelta(days=periodo)
-
-    # Consultas pagas do usuário
-    consultas_pagas = Consulta.objects.filter(
-        owner=user,
-        paga=True,
-        data__date__gte=data_inicial,
-        data__date__lte=hoje + timedelta(days=90)
-    )
-
-    if not consultas_pagas.exists():
-        consultas_pagas = Consulta.objects.filter(owner=user, paga=True)
-
-    # Faturamentos
-    faturamento_total = consultas_pagas.aggregate(
-        total=Sum('valor_final')
-    )['total'] or 0
 
-    faturamento_medio = consultas_pagas.aggregate(
-        media=Avg('valor_final')
-    )['media'] or 0
-
-    comissoes_total = consultas_pagas.aggregate(
-        total=Sum('comissao_valor')
-    )['total'] or 0
-
-    faturamento_liquido = faturamento_total - comissoes_total
-
-    # Mensal
-    consultas_mes = consultas_pagas.filter(
-        data__year=hoje.year,
-        data__month=hoje.month
-    )
-
-    faturamento_mensal_bruto = consultas_mes.aggregate(
-        total=Sum('valor_final')
-    )['total'] or 0
-
-    faturamento_mensal_comissoes = consultas_mes.aggregate(
-        total=Sum('comissao_valor')
-    )['total'] or 0
-
-    faturamento_mensal_liquido = faturamento_mensal_bruto - faturamento_mensal_comissoes
-
-    # Status
-    status_consultas = {
-        'concluidas': consultas_pagas.filter(concluida=True).count(),
-        'pendentes': Consulta.objects.filter(owner=user, concluida=False).count(),
-    }
-
-    # Consultas por dentista
-    consultas_por_dentista = (
-        consultas_pagas.exclude(dentista__isnull=True)
-        .values('dentista__nome')
-        .annotate(
-            total_consultas=Count('id'),
-            receita=Sum('valor_final'),
-            comissao=Sum('comissao_valor'),
-        )
-        .order_by('-receita')
-    )
-
-    # Gráfico 6 meses
-    meses = []
-    dados_consultas = []
-    dados_receita = []
-
-    for i in range(5, -1, -1):
-        mes_ref = hoje - timedelta(days=30 * i)
-        nome_mes = calendar.month_abbr[mes_ref.month]
-
-        cons_mes = consultas_pagas.filter(
-            data__month=mes_ref.month,
-            data__year=mes_ref.year
-        )
-
-        meses.append(nome_mes)
-        dados_consultas.append(cons_mes.count())
-        dados_receita.append(float(
-            cons_mes.aggregate(total=Sum('valor_final'))['total'] or 0
-        ))
+    metricas = get_dashboard_metrics(request.user, periodo)
 
     return JsonResponse({
-        'faturamento_total': float(faturamento_total),
-        'faturamento_liquido': float(faturamento_liquido),
-        'faturamento_mensal': float(faturamento_mensal_liquido),
-        'faturamento_medio': float(faturamento_medio),
-        'comissoes_total': float(comissoes_total),
-        'status_consultas': status_consultas,
-        'dentistas': list(consultas_por_dentista),
-        'meses': meses,
-        'dados_consultas': dados_consultas,
-        'dados_receita': dados_receita,
+        'faturamento_total': float(metricas['faturamento_total']),
+        'faturamento_liquido': float(metricas['faturamento_liquido']),
+        'faturamento_mensal': float(metricas['faturamento_mensal']),
+        'faturamento_medio': float(metricas['faturamento_medio']),
+        'comissoes_total': float(metricas['comissoes_total']),
+        'status_consultas': {
+            'concluidas': metricas['consultas_concluidas'],
+            'pendentes': metricas['consultas_pendentes'],
+        },
+        'dentistas': metricas['consultas_por_dentista'],
+        'meses': metricas['meses'],
+        'dados_consultas': metricas['dados_consultas'],
+        'dados_receita': metricas['dados_receita'],
     })
 
 
-def _accent_insensitive_regex(prefix: str) -> str:
-    """
-    Converte 'brasilia' em uma regex que aceita acentos e casa no INÍCIO:
-    '^br[aáàâã]sil[ií]a' etc. Mantém case-insensitive no __iregex.
-    """
-    base = {
-        'a': '[aáàâã]', 'e': '[eéê]', 'i': '[ií]', 'o': '[oóôõ]', 'u': '[uú]',
-        'c': '[cç]'
-    }
-    # escapa tudo e depois troca letras por classes
-    esc = re.escape(prefix.strip().lower())
-    # aplica mapeamento
-    pattern = ''
-    for ch in esc:
-        pattern += base.get(ch, ch)
-    return '^' + pattern  # começa com
-
-
 @login_required
 @require_active_subscription
 def dentista_create(request):
@@ -807,7 +736,14 @@ def dentista_edit(request, id):
     if request.method == "POST":
         form = DentistaForm(request.POST, instance=dentista)
         if form.is_valid():
-            form.save()
+            dentista = form.save()
+
+            # Percentual mudou → recalcula as comissões em lote (um UPDATE)
+            if "comissao_percentual" in form.changed_data:
+                total = recalcular_comissoes_dentista(
+                    dentista, a_partir_de=form.cleaned_data.get("recalcular_a_partir_de"))
+                messages.info(request, f"Comissão recalculada em {total} consulta(s).")
+
             messages.success(request, "Dentista atualizado com sucesso!")
             return redirect("clinic:dentistas_list")
     else:
@@ -907,15 +843,23 @@ def pacientes_list(request):
         owner=request.user).order_by('-data_cadastro')
 
     if search:
-        regex = _accent_insensitive_regex(search)
-        pacientes = pacientes.filter(
-            Q(nome__iregex=regex) |
-            Q(cidade__iregex=regex) |
-            Q(cpf__icontains=search)
-        )
+        # Ordem por relevância (e similaridade no Postgres) não cabe num cursor
+        pagina = paginar_offset(request, buscar_pacientes(pacientes, search))
+    else:
+        pagina = paginar_keyset(request, pacientes, '-data_cadastro')
+
+    if quer_json(request):
+        return resposta_json_keyset(pagina, lambda p: {
+            'id': p.id,
+            'nome': p.nome,
+            'cpf': p.cpf,
+            'telefone': p.telefone,
+            'cidade': p.cidade or '',
+        })
 
     context = {
-        'pacientes': pacientes,
+        'pacientes': pagina['itens'],
+        'pagina': pagina,
         'search': search,
     }
     return render(request, 'clinic/pacientes_list.html', context)
@@ -941,6 +885,29 @@ def paciente_create(request):
     return render(request, 'clinic/paciente_form.html', {'form': form, 'titulo': 'Novo Paciente'})
 
 
+@login_required
+@require_active_subscription
+def pacientes_importar(request):
+    resultado = None
+    if request.method == 'POST':
+        form = ImportarPacientesForm(request.POST, request.FILES)
+        if form.is_valid():
+            arquivo = form.cleaned_data['arquivo']
+            try:
+                resultado = importar_pacientes(arquivo, arquivo.name, request.user)
+            except ValueError as e:
+                messages.error(request, f"⚠️ {e}")
+            else:
+                messages.success(
+                    request, f"✅ {resultado['importados']} paciente(s) importado(s).")
+        else:
+            messages.error(request, "⚠️ Selecione um arquivo válido.")
+    else:
+        form = ImportarPacientesForm()
+
+    return render(request, 'clinic/pacientes_importar.html', {'form': form, 'resultado': resultado})
+
+
 @login_required
 @require_active_subscription
 def paciente_update(request, pk):
@@ -968,31 +935,6 @@ def paciente_delete(request, pk):
     return render(request, 'clinic/paciente_confirm_delete.html', {'paciente': paciente})
 
 
-@csrf_exempt
-@login_required
-@require_active_subscription
-def consulta_create_ajax(request):
-    if request.method == "POST":
-        try:
-            paciente_id = request.POST.get("paciente")
-            dentista_id = request.POST.get("dentista")
-            procedimento_id = request.POST.get("procedimento")
-            data = request.POST.get("data")
-            observacoes = request.POST.get("observacoes", "")
-
-            consulta = Consulta.objects.create(
-                paciente_id=paciente_id,
-                dentista_id=dentista_id,
-                procedimento_id=procedimento_id,
-                data=data,
-                observacoes=observacoes,
-            )
-            return JsonResponse({"success": True, "id": consulta.id})
-        except Exception as e:
-            return JsonResponse({"success": False, "error": str(e)})
-    return JsonResponse({"success": False, "error": "Método inválido"})
-
-
 def registrar_teste(request):
     if request.method == 'POST':
         username = request.POST['username']
@@ -1026,12 +968,11 @@ def registrar_teste(request):
         # Envia email de boas vindas
         nome = user.first_name or user.username
 
-        send_mail(
-            subject="🎉 Bem-vindo ao OdontoIA!",
-            message=f"Olá {nome}, seja bem-vindo ao OdontoIA!\nSua conta de teste está ativa por 7 dias.",
-            from_email=None,  # usa o DEFAULT_FROM_EMAIL
-            recipient_list=[user.email],
-            fail_silently=True,
+        # Vai para a caixa de saída: o cadastro não espera o SMTP
+        enfileirar_email(
+            assunto="🎉 Bem-vindo ao OdontoIA!",
+            corpo=f"Olá {nome}, seja bem-vindo ao OdontoIA!\nSua conta de teste está ativa por 7 dias.",
+            destinatarios=[user.email],
         )
 
         # Faz login automático após criar conta
@@ -1050,9 +991,20 @@ def registrar_teste(request):
 @login_required
 @require_active_subscription
 def procedimentos_list(request):
-    procedimentos = Procedimento.objects.filter(
-        owner=request.user).order_by('nome')
-    return render(request, 'clinic/procedimentos_list.html', {'procedimentos': procedimentos})
+    procedimentos = Procedimento.objects.filter(owner=request.user)
+    pagina = paginar_keyset(request, procedimentos, 'nome')
+
+    if quer_json(request):
+        return resposta_json_keyset(pagina, lambda p: {
+            'id': p.id,
+            'nome': p.nome,
+            'valor_base': p.valor_base,
+        })
+
+    return render(request, 'clinic/procedimentos_list.html', {
+        'procedimentos': pagina['itens'],
+        'pagina': pagina,
+    })
 
 
 def procedimento_valor(request, id):
@@ -1116,54 +1068,6 @@ def assinatura_expirada(request):
     return render(request, "clinic/assinatura_expirada.html")
 
 
-@csrf_exempt
-def password_reset_request(request):
-    if request.method == "POST":
-        email = request.POST.get("email", "").strip().lower()
-        if not email:
-            messages.error(request, "Por favor, informe um e-mail válido.")
-            return redirect("login")
-
-        # Verifica se há um usuário com este e-mail
-        user = User.objects.filter(email=email).first()
-        if not user:
-            messages.warning(
-                request, "E-mail não encontrado. Verifique ou entre em contato com o suporte.")
-            return redirect("login")
-
-        # Simulação de envio de e-mail (você pode configurar SMTP real)
-        assunto = "Recuperação de acesso - OdontoIA"
-        corpo = f"""
-Olá, {user.username}!
-
-Recebemos uma solicitação para recuperar o acesso ao OdontoIA.
-
-Usuário: {user.username}
-Se esqueceu sua senha, redefina acessando: https://odontoia.codertec.com.br/resetar-senha/
-
-Atenciosamente,
-Equipe OdontoIA
-        """
-        try:
-            send_mail(
-                assunto,
-                corpo,
-                settings.DEFAULT_FROM_EMAIL,
-                [email],
-                fail_silently=False,
-            )
-            messages.success(
-                request, "E-mail enviado com sucesso! Verifique sua caixa de entrada.")
-        except Exception as e:
-            print("Erro ao enviar e-mail:", e)
-            messages.error(
-                request, "Não foi possível enviar o e-mail. Tente novamente mais tarde.")
-
-        return redirect("login")
-
-    return redirect("login")
-
-
 # ===============================
 # 💌 Recuperação de Senha (HTML)
 # ===============================
@@ -1201,14 +1105,13 @@ def password_reset_request(request):
             "clinic/emails/password_reset_email.html", context)
         subject = "🔑 Redefinição de senha - OdontoIA"
 
-        msg = EmailMultiAlternatives(
-            subject,
-            f"Olá {user.username},\n\nPara redefinir sua senha, acesse o link abaixo:\n{reset_url}\n\nEquipe OdontoIA",
-            "OdontoIA <no-reply@odontoia.com.br>",
-            [email],
+        enfileirar_email(
+            assunto=subject,
+            corpo=f"Olá {user.username},\n\nPara redefinir sua senha, acesse o link abaixo:\n{reset_url}\n\nEquipe OdontoIA",
+            destinatarios=[email],
+            html=html_content,
+            remetente="OdontoIA <no-reply@odontoia.com.br>",
         )
-        msg.attach_alternative(html_content, "text/html")
-        msg.send(fail_silently=False)
 
         return JsonResponse({"success": True})
 
@@ -1234,759 +1137,6 @@ def onboarding(request):
     return render(request, 'clinic/onboarding.html')
 
 
-# ==== PAGAMENTOS (Mercado Pago) ============================================
-
-def _get_mp_sdk():
-    """
-    Retorna o SDK autenticado do Mercado Pago, ou lança erro amigável se faltar token.
-    """
-    import mercadopago
-    from django.conf import settings
-
-    access_token = getattr(settings, "MERCADOPAGO_ACCESS_TOKEN", None)
-    if not access_token:
-        print("❌ Falha: variável MERCADOPAGO_ACCESS_TOKEN ausente no settings.")
-        raise RuntimeError("MERCADOPAGO_ACCESS_TOKEN não configurado.")
-
-    try:
-        return mercadopago.SDK(access_token)
-    except Exception as e:
-        print(f"❌ Erro ao inicializar SDK do Mercado Pago: {e}")
-        raise
-
-
-PLANOS = {
-    "basico": Decimal("49.90"),
-    "profissional": Decimal("79.90"),
-    "premium": Decimal("129.90"),
-}
-
-
-@login_required
-def criar_pagamento(request, plano: str):
-
-    plano = plano.lower().strip()
-    PLANOS = {
-        "basico": Decimal("49.90"),
-        "profissional": Decimal("79.90"),
-        "premium": Decimal("129.90"),
-    }
-
-    if plano not in PLANOS:
-        messages.error(request, "Plano inválido.")
-        return redirect("clinic:dashboard")
-
-    valor = float(PLANOS[plano])
-
-    # Assinatura do usuário
-    assinatura, _ = Assinatura.objects.get_or_create(user=request.user)
-
-    # Registrar pagamento
-    referencia = f"odontoia-{request.user.id}-{uuid.uuid4().hex}"
-    pagamento = Pagamento.objects.create(
-        assinatura=assinatura,
-        referencia=referencia,
-        valor=valor,
-        status="pendente",
-        metodo="desconhecido",
-    )
-
-    # Mercado Pago
-    access_token = getattr(settings, "MERCADOPAGO_ACCESS_TOKEN", None)
-    if not access_token:
-        messages.error(request, "Token Mercado Pago não configurado.")
-        return redirect("clinic:dashboard")
-
-    sdk = mercadopago.SDK(access_token)
-
-    base_url = (
-        "https://app.odontoia.codertec.com.br"
-        if not settings.DEBUG
-        else request.build_absolute_uri("/")[:-1]
-    )
-
-    preference_data = {
-        "items": [
-            {
-                "id": referencia,
-                "title": f"Plano {plano.capitalize()} - OdontoIA",
-                "quantity": 1,
-                "currency_id": "BRL",
-                "unit_price": valor,
-            }
-        ],
-        "payer": {"email": request.user.email},
-        "back_urls": {
-            "success": f"{base_url}/pagamento/sucesso/",
-            "failure": f"{base_url}/pagamento/falha/",
-            "pending": f"{base_url}/pagamento/sucesso/",
-        },
-        "external_reference": referencia,
-    }
-
-    if not settings.DEBUG:
-        preference_data["notification_url"] = f"{base_url}/mp/webhook/"
-        preference_data["auto_return"] = "approved"
-
-    pref = sdk.preference().create(preference_data)
-    resp = pref.get("response", {})
-    init_point = resp.get("init_point") or resp.get("sandbox_init_point")
-
-    if not init_point:
-        messages.error(request, "Erro ao iniciar pagamento.")
-        return redirect("clinic:dashboard")
-
-    return redirect(init_point)
-
-
-# ===========================
-# 🧾 WEBHOOK DO MERCADO PAGO
-# ===========================
-@csrf_exempt
-def mercadopago_webhook(request):
-    """
-    Recebe notificações automáticas do Mercado Pago sobre pagamentos.
-    """
-    try:
-        payload = json.loads(request.body.decode("utf-8") or "{}")
-    except Exception:
-        return HttpResponseBadRequest("Invalid JSON")
-
-    payment_id = payload.get("data", {}).get("id") or payload.get("id")
-    if not payment_id:
-        return JsonResponse({"ok": True, "ignored": True})
-
-    sdk = _get_mp_sdk()
-    payment_info = sdk.payment().get(payment_id).get("response", {})
-
-    status = payment_info.get("status")
-    external_reference = payment_info.get("external_reference")
-    payment_method = (payment_info.get("payment_method_id")
-                      or "desconhecido").lower()
-
-    if not external_reference:
-        return JsonResponse({"ok": True, "missing_external_reference": True})
-
-    pgto = Pagamento.objects.filter(referencia=external_reference).first()
-    if not pgto:
-        return JsonResponse({"ok": True, "unknown_reference": True})
-
-    pgto.raw_payload = payload
-    pgto.metodo = (
-        "pix" if "pix" in payment_method
-        else "card" if any(k in payment_method for k in ["visa", "master", "amex", "hiper", "elo"])
-        else "boleto" if "boleto" in payment_method
-        else "desconhecido"
-    )
-
-    if status == "approved":
-        pgto.status = "pago"
-        pgto.data_pagamento = timezone.now()
-        pgto.save()
-
-        assinatura = pgto.assinatura
-        assinatura.ativa = True
-        assinatura.fim_teste = timezone.now() + timezone.timedelta(days=30)
-        assinatura.save()
-    elif status in ("rejected", "cancelled", "refunded", "charged_back"):
-        pgto.status = "falhou"
-        pgto.save()
-    else:
-        pgto.status = "pendente"
-        pgto.save()
-
-    return JsonResponse({"ok": True})
-
-
-# ===========================
-# ✅ PÁGINA DE SUCESSO
-# ===========================
-@login_required
-def pagamento_sucesso(request):
-    assinatura = Assinatura.objects.filter(user=request.user).first()
-    pagamento = (
-        Pagamento.objects.filter(assinatura__user=request.user)
-        .order_by("-data_pagamento")
-        .first()
-    )
-
-    if not assinatura or not pagamento:
-        messages.warning(request, "Não foi possível confirmar o pagamento.")
-        return redirect("clinic:dashboard")
-
-    # Ativa assinatura por 30 dias
-    assinatura.ativa = True
-    assinatura.fim_teste = timezone.now() + timedelta(days=30)
-    assinatura.save()
-
-    # ---- Email de confirmação (somente para assinatura paga) ----
-    from django.template.loader import render_to_string
-
-    nome = request.user.first_name or request.user.username
-    plano = pagamento.plano.capitalize()
-    validade = assinatura.fim_teste.strftime("%d/%m/%Y")
-
-    html_email = render_to_string(
-        "clinic/emails/assinatura_ativada.html",
-        {"nome": nome, "plano": plano, "validade": validade}
-    )
-
-    msg = EmailMultiAlternatives(
-        subject="🎉 Assinatura ativada - OdontoIA",
-        body=f"Sua assinatura {plano} está ativa até {validade}.",
-        from_email="OdontoIA <no-reply@odontoia.com.br>",
-        to=[request.user.email],
-    )
-    msg.attach_alternative(html_email, "text/html")
-    msg.send(fail_silently=True)
-    # --------------------------------------------------------------
-
-    return render(request, "clinic/pagamento_sucesso.html", {
-        "assinatura": assinatura,
-        "pagamento": pagamento,
-        "plano": plano,
-    })
-
-
-# Checkout publico
-def checkout_publico(request, plano):
-    plano = plano.lower()
-
-    PLANOS = {
-        "basico": 49.90,
-        "profissional": 79.90,
-        "premium": 129.90,
-    }
-
-    if plano not in PLANOS:
-        messages.error(request, "Plano inválido.")
-        return redirect("https://odontoia.codertec.com.br")
-
-    valor = PLANOS[plano]
-
-    # GET → mostra o formulário
-    if request.method == "GET":
-        return render(request, "clinic/checkout_publico.html", {
-            "plano_nome": plano.capitalize(),
-            "plano_slug": plano,
-            "valor": valor
-        })
-
-    # POST → o usuário enviou nome e email, vamos criar uma conta trial
-    nome = request.POST.get("nome")
-    email = request.POST.get("email")
-
-    if not email:
-        messages.error(request, "E-mail é obrigatório.")
-        return redirect(request.path)
-
-    # Cria usuário temporário (ou pega existente)
-    user, created = User.objects.get_or_create(
-        username=email,
-        defaults={"email": email, "first_name": nome or email}
-    )
-
-    if created:
-        # cria assinatura trial automática
-        Assinatura.objects.create(user=user, tipo=plano)
-
-    # Faz login automático
-    login(request, user)
-
-    # Redireciona para o checkout interno
-    return redirect(f"/pagamento/checkout/{plano}/")
-
-
-# ===========================
-# ❌ PÁGINA DE FALHA
-# ===========================
-@login_required
-def pagamento_falha(request):
-    pagamento = (
-        Pagamento.objects.filter(assinatura__user=request.user)
-        .order_by("-data_pagamento")
-        .first()
-    )
-
-    plano = pagamento.plano if pagamento else "Indefinido"
-
-    return render(request, "clinic/pagamento_falha.html", {"plano": plano})
-
-
-# --- FINANCEIRO (apenas Profissional / Premium) ---------------------------
-@login_required
-@require_active_subscription
-def financeiro_home(request):
-    # Permissão: somente profissional ou premium
-    assinatura = Assinatura.objects.filter(user=request.user).first()
-
-    if not assinatura or assinatura.tipo not in ["profissional", "premium"]:
-        messages.error(request, "Seu plano não permite acesso ao Financeiro.")
-        return redirect("clinic:dashboard")
-
-    return render(request, "clinic/financeiro_home.html")
-
-
-@login_required
-@require_active_subscription
-def financeiro_resumo(request):
-    """
-    Tela de resumo financeiro (por dentista, receita, comissões, líquido)
-    Disponível apenas para planos Profissional e Premium.
-    """
-    assinatura = Assinatura.objects.filter(
-        user=request.user, ativa=True).first()
-
-    if not assinatura or assinatura.tipo not in ("profissional", "premium"):
-        messages.error(
-            request,
-            "O módulo financeiro completo está disponível apenas para os planos "
-            "Profissional e Premium."
-        )
-        return redirect("clinic:dashboard")
-
-    hoje = timezone.now().date()
-    periodo = int(request.GET.get("periodo", 30))  # dias
-    data_inicial = hoje - timedelta(days=periodo)
-
-    consultas = Consulta.objects.filter(
-        owner=request.user,
-        data__date__gte=data_inicial,
-        data__date__lte=hoje
-    )
-
-    # Agrupado por dentista
-    por_dentista = (
-        consultas.exclude(dentista__isnull=True)
-        .values("dentista__nome")
-        .annotate(
-            total_consultas=Count("id"),
-            receita=Sum("valor_final"),
-            comissoes=Sum("comissao_valor"),
-        )
-        .order_by("-receita")
-    )
-
-    # Cálculo líquido por dentista
-    lista_dentistas = []
-    for d in por_dentista:
-        receita = d['receita'] or 0
-        comissoes = d['comissoes'] or 0
-        d['liquido'] = receita - comissoes
-        lista_dentistas.append(d)
-
-    totais = consultas.aggregate(
-        total_receita=Sum("valor_final"),
-        total_comissoes=Sum("comissao_valor"),
-    )
-    total_receita = totais["total_receita"] or 0
-    total_comissoes = totais["total_comissoes"] or 0
-    total_liquido = total_receita - total_comissoes
-
-    # Adiciona valor líquido por dentista
-    lista_dentistas = []
-    for dent in por_dentista:
-        receita = dent['receita'] or 0
-        comissao = dent['comissoes'] or 0
-        dent['liquido'] = receita - comissao
-        lista_dentistas.append(dent)
-
-    context = {
-        "por_dentista": lista_dentistas,
-        "periodo": periodo,
-        "total_receita": total_receita,
-        "total_comissoes": total_comissoes,
-        "total_liquido": total_liquido,
-    }
-
-    return render(request, "clinic/financeiro_resumo.html", context)
-
-
-# IA e Insights (apenas profissional e premium)
-@login_required
-@require_active_subscription
-def ia_insights(request):
-    # Permissão: apenas Premium
-    assinatura = Assinatura.objects.filter(user=request.user).first()
-
-    if not assinatura or assinatura.tipo != "premium":
-        messages.error(
-            request, "Apenas assinantes Premium podem acessar IA & Insights.")
-        return redirect("clinic:dashboard")
-
-    return render(request, "clinic/ia_insights.html")
-
-
-# Dashboard Financeiro
-@login_required
-@require_active_subscription
-def financeiro_dashboard(request):
-    from .services import get_fluxo_caixa, get_graficos_financeiros
-
-    # Filtros opcionais
-    mes = request.GET.get("mes")
-    ano_param = request.GET.get("ano")
-    data_inicio = request.GET.get('data_inicio')
-    data_fim = request.GET.get('data_fim')
-
-    # se nada selecionado -> mês atual
-    hoje = datetime.now()
-
-    # Se não tem filtro por data -> usa mes/ano
-    if not data_inicio and not data_fim:
-        if not mes:
-            mes = hoje.month
-        if not ano_param:
-            ano_param = hoje.year
-
-        mes = int(mes)
-        ano = int(ano_param)
-
-        # Dados principais
-        stats = get_fluxo_caixa(request.user, mes=mes, ano=ano)
-
-        # Puxa lista de receitas e despesas para exibir no dashboard
-        incomes = Income.objects.filter(
-            owner=request.user,
-            data__month=mes,
-            data__year=ano
-        ).order_by('-data')[:10]
-
-        expenses = Expense.objects.filter(
-            owner=request.user,
-            data__month=mes,
-            data__year=ano
-        ).order_by('-data')[:10]
-
-    else:
-        if data_inicio:
-            data_inicio = datetime.strptime(data_inicio, "%Y-%m-%d").date()
-        if data_fim:
-            data_fim = datetime.strptime(data_fim, "%Y-%m-%d").date()
-
-        incomes = Income.objects.filter(owner=request.user)
-        expenses = Expense.objects.filter(owner=request.user)
-
-        if data_inicio:
-            incomes = incomes.filter(data__gte=data_inicio)
-            expenses = expenses.filter(data__get=data_inicio)
-
-        if data_fim:
-            incomes = incomes.filter(data__lte=data_fim)
-            expenses = expenses.filter(data__lte=data_fim)
-
-        total_receitas = incomes.aggregate(Sum('valor'))['valor__sum'] or 0
-        total_despesas = expenses.aggregate(Sum('valor'))['valor__sum'] or 0
-
-        stats = {
-            'receitas': total_receitas,
-            'despesas': total_despesas,
-            'saldo': total_receitas - total_despesas,
-        }
-
-    graficos = get_graficos_financeiros(request.user, ano)
-
-    context = {
-        'stats': stats,
-        'incomes': incomes,
-        'expenses': expenses,
-        'mes': mes,
-        'ano': ano,
-        'meses': [
-            (1, 'Janeiro'), (2, 'Fevereiro'), (3, 'Março'), (4, 'Abril'),
-            (5, 'Maio'), (6, 'Junho'), (7, 'Julho'), (8, 'Agosto'),
-            (9, 'Setembro'), (10, 'Outubro'), (11, 'Novembro'), (12, 'Dezembro')
-        ],
-        'anos': range(2023, 2031),
-
-        # Dados para os gráficos
-        'graficos': graficos,
-    }
-
-    return render(request, 'clinic/financeiro_dashboard.html', context)
-
-
-# CRUD Receitas e Despesas
-@login_required
-@require_active_subscription
-def receitas_list(request):
-    receitas = Income.objects.filter(owner=request.user).order_by('-data')
-    return render(request, 'clinic/receitas_list.html', {'receitas': receitas})
-
-
-@login_required
-@require_active_subscription
-def receita_create(request):
-    if request.method == "POST":
-        form = IncomeForm(request.POST)
-        if form.is_valid():
-            receita = form.save(commit=False)
-            receita.owner = request.user
-            receita.origem = 'manual'
-            receita.save()
-            messages.success(request, 'Receita adicionada!')
-            return redirect('clinic:receitas_list')
-
-    else:
-        form = IncomeForm()
-
-    return render(request, "clinic/receita_form.html", {'form': form})
-
-
-@login_required
-@require_active_subscription
-def receita_update(request, pk):
-    receita = get_object_or_404(Income, pk=pk, owner=request.user)
-
-    if request.method == "POST":
-        form = IncomeForm(request.POST, instance=receita)
-        if form.is_valid():
-            form.save()
-            messages.success(request, "Receita atualizada!")
-            return redirect("clinic:receitas_list")
-    else:
-        form = IncomeForm(instance=receita)
-
-    return render(request, "clinic/receita_form.html", {"receita": receita})
-
-
-@login_required
-@require_active_subscription
-def receita_delete(request, pk):
-    receita = get_object_or_404(Income, pk=pk, owner=request.user)
-    receita.delete()
-    messages.success(request, "Receita removida!")
-    return redirect("clinic:receitas_list")
-
-
-# DESPESAS
-@login_required
-@require_active_subscription
-def despesas_list(request):
-    despesas = Expense.objects.filter(owner=request.user).order_by('-data')
-    return render(request, "clinic/despesas_list.html", {"despesas": despesas})
-
-
-@login_required
-@require_active_subscription
-def despesa_create(request):
-    if request.method == "POST":
-        form = ExpenseForm(request.POST)
-        if form.is_valid():
-            despesa = form.save(commit=False)
-            despesa.owner = request.user
-            despesa.save()
-
-            messages.success(request, "Despesa adicionada!")
-            return redirect("clinic:despesas_list")
-    else:
-        form = ExpenseForm()
-
-    return render(request, "clinic/despesa_form.html", {"form": form})
-
-
-@login_required
-@require_active_subscription
-def despesa_update(request, pk):
-    despesa = get_object_or_404(Expense, pk=pk, owner=request.user)
-
-    if request.method == "POST":
-        form = ExpenseForm(request.POST, instance=despesa)
-        if form.is_valid():
-            form.save()
-            messages.success(request, "Despesa atualizada!")
-            return redirect("clinic:despesas_list")
-    else:
-        form = ExpenseForm(instance=despesa)
-
-    return render(request, "clinic/despesa_form.html", {"form": form})
-
-
-@login_required
-@require_active_subscription
-def despesa_delete(request, pk):
-    despesa = get_object_or_404(Expense, pk=pk, owner=request.user)
-    despesa.delete()
-    messages.success(request, "Despesa removida!")
-    return redirect("clinic:despesas_list")
-
-
-# Exportar Excel
-
-@login_required
-@require_active_subscription
-def financeiro_export_excel(request):
-    mes = request.GET.get("mes")
-    ano_param = request.GET.get("ano")
-
-    hoje = datetime.now()
-    mes = int(mes) if mes else hoje.month
-    ano = int(ano_param) if ano_param else hoje.year
-
-    receitas = Income.objects.filter(
-        owner=request.user,
-        data__month=mes,
-        data__year=ano
-    ).values("descricao", "valor", "data", "origem")
-
-    despesas = Expense.objects.filter(
-        owner=request.user,
-        data__month=mes,
-        data__year=ano
-    ).values("categoria", "descricao", "valor", "data")
-
-    # Cria Excel com múltiplas abas
-    output = io.BytesIO()
-    writer = pd.ExcelWriter(output, engine='xlsxwriter')
-
-    pd.DataFrame(receitas).to_excel(writer, index=False, sheet_name='Receitas')
-    pd.DataFrame(despesas).to_excel(writer, index=False, sheet_name='Despesas')
-
-    writer.close()
-    output.seek(0)
-
-    response = HttpResponse(
-        output,
-        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
-    response["Content-Disposition"] = f'attachment; filename=financeiro_{mes}_{ano}.xlsx'
-
-    return response
-
-
-# Exportar PDF
-@login_required
-@require_active_subscription
-def financeiro_export_pdf(request):
-    mes = request.GET.get("mes")
-    ano_param = request.GET.get("ano")
-
-    hoje = datetime.now()
-    mes = int(mes) if mes else hoje.month
-    ano = int(ano_param) if ano_param else hoje.year
-
-    receitas = Income.objects.filter(
-        owner=request.user,
-        data__month=mes,
-        data__year=ano
-    )
-
-    despesas = Expense.objects.filter(
-        owner=request.user,
-        data__month=mes,
-        data__year=ano
-    )
-
-    # ======== CONFIGURAÇÃO DO LOGO ===============
-    config = ClinicaConfig.objects.filter(owner=request.user).first()
-
-    # caso tenha logo da clínica
-    if config and config.logo:
-        logo_path = config.logo.path     # ← caminho real no disco
-    else:
-        # logo padrão
-        logo_path = finders.find("img/logo_odontoIA.png")
-
-    # ======== CRIA PDF ===============
-    buffer = io.BytesIO()
-    pdf = SimpleDocTemplate(buffer, pagesize=A4)
-
-    elementos = []
-    styles = getSampleStyleSheet()
-
-    # ---- LOGO ----
-    if logo_path and os.path.exists(logo_path):
-        try:
-            img = Image(logo_path, width=120, height=40)
-            elementos.append(img)
-            elementos.append(Spacer(1, 12))
-        except:
-            pass  # se der erro, apenas não mostra logo
-
-    # ---- TÍTULO ----
-    titulo = f"Relatório Financeiro - {mes:02d}/{ano}"
-    elementos.append(Paragraph(titulo, styles["Title"]))
-    elementos.append(Spacer(1, 20))
-
-    # -------------------------------------
-    # TABELA DE RECEITAS
-    # -------------------------------------
-    elementos.append(Paragraph("<b>Receitas</b>", styles["Heading2"]))
-    elementos.append(Spacer(1, 6))
-
-    dados_receitas = [["Data", "Descrição", "Origem", "Valor (R$)"]]
-
-    for r in receitas:
-        dados_receitas.append([
-            r.data.strftime("%d/%m/%Y"),
-            r.descricao,
-            r.origem or "-",
-            f"{r.valor:.2f}"
-        ])
-
-    tabela_receitas = Table(dados_receitas, colWidths=[80, 200, 100, 80])
-    tabela_receitas.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#4A90E2")),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-        ("ALIGN", (3, 1), (3, -1), "RIGHT"),
-        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold")
-    ]))
-
-    elementos.append(tabela_receitas)
-    elementos.append(Spacer(1, 20))
-
-    # -------------------------------------
-    # TABELA DE DESPESAS
-    # -------------------------------------
-    elementos.append(Paragraph("<b>Despesas</b>", styles["Heading2"]))
-    elementos.append(Spacer(1, 6))
-
-    dados_despesas = [["Data", "Categoria", "Descrição", "Valor (R$)"]]
-
-    for d in despesas:
-        dados_despesas.append([
-            d.data.strftime("%d/%m/%Y"),
-            getattr(d.categoria, "nome", "-"),
-            d.descricao,
-            f"{d.valor:.2f}"
-        ])
-
-    tabela_despesas = Table(dados_despesas, colWidths=[80, 120, 180, 80])
-    tabela_despesas.setStyle(TableStyle([
-        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#D0021B")),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-        ("ALIGN", (3, 1), (3, -1), "RIGHT"),
-        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold")
-    ]))
-
-    elementos.append(tabela_despesas)
-    elementos.append(Spacer(1, 30))
-
-    # -------------------------------------
-    # RODAPÉ CUSTOMIZADO OU PADRÃO
-    # -------------------------------------
-    rodape = None
-    if config and config.rodape_pdf:
-        rodape = config.rodape_pdf
-    else:
-        rodape = "Relatório gerado automaticamente pelo sistema OdontoIA"
-
-    elementos.append(Paragraph(f"<para align='center'><font size=9>{rodape}</font></para>"))
-
-    # -------------------------------------
-    # FINALIZA
-    # -------------------------------------
-    pdf.build(elementos)
-
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type="application/pdf")
-    response['Content-Disposition'] = f'attachment; filename=\"financeiro_{mes}_{ano}.pdf\"'
-
-    return response
-
-
 def is_premium(user):
     assinatura = getattr(user, 'assinatura', None)
     if not assinatura:
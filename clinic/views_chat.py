@@ -0,0 +1,221 @@
+# clinic/views_chat.py
+# Chat do OdontoIA (assistente via OpenAI). O SDK só é importado na primeira conversa.
+import json
+import logging
+import os
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST, require_GET
+from django.contrib.auth.decorators import login_required
+
+logger = logging.getLogger(__name__)
+
+
+def _odontoia_system_prompt(user):
+    from .utils.contexto_dinamico import gerar_contexto_dinamico
+
+    nome = user.first_name or user.username
+    contexto_dinamico = gerar_contexto_dinamico(user)
+
+    return f"""
+Você é o **Assistente Oficial do OdontoIA**, um sistema de gestão odontológica voltado a dentistas, clínicas e secretárias.
+
+Regras fundamentais:
+- Sempre responda em **português (pt-BR)**, de forma profissional, breve e empática.
+- **Nunca forneça informações clínicas** sobre pacientes, diagnósticos ou tratamentos odontológicos.
+- O foco é **ensinar o usuário a usar o sistema OdontoIA**.
+- O público-alvo são **usuários do sistema (dentistas, secretárias, administradores)**, não pacientes.
+- Se o usuário perguntar “como faço X”, explique o caminho pelo sistema (menus e páginas) de forma prática.
+- Use os nomes exatos dos menus do OdontoIA: **Dashboard**, **Pacientes**, **Consultas**, **Procedimentos**, **Agenda**, **Financeiro**, **/admin** (apenas administradores).
+
+Contexto real do sistema:
+- O cadastro de **dentistas** é feito **somente por usuários administradores**, no painel **/admin**, usando o campo **CRO**.
+- O cadastro de **pacientes** e **procedimentos** é feito diretamente no app.
+- O módulo de **consultas** permite marcar, editar e concluir atendimentos.
+- O módulo de **financeiro** mostra comissões, faturamento e lucro líquido.
+- O sistema possui **teste gratuito de 7 dias**, após o qual a conta precisa de assinatura ativa.
+- Se o usuário perguntar sobre **planos ou preços**, explique que há planos **Básico**, **Profissional** e **Premium**.
+- Se o trial estiver próximo de expirar, lembre da página de planos (https://odontoia.codertec.com.br).
+
+Comportamento:
+- Seja proativo e claro (ex: “Vá até ‘Pacientes’ > ‘Novo Paciente’”).
+- Se a ação for restrita (como cadastrar dentista), avise que só **administradores** podem fazer.
+- Se não souber, oriente a procurar o suporte da Codertec.
+
+📊 **Dados em tempo real do sistema:**
+{contexto_dinamico}
+
+Contexto atual:
+- Usuário logado: {nome}
+- Data e hora: {timezone.now().strftime('%d/%m/%Y %H:%M')}
+    """.strip()
+
+
+def _get_openai_client():
+    try:
+        from openai import OpenAI
+    except Exception as e:
+        return None, f"SDK OpenAI não disponível: {e}"
+
+    # tenta .env → settings
+    api_key = os.getenv("OPENAI_API_KEY") or getattr(
+        settings, "OPENAI_API_KEY", None)
+    if not api_key:
+        return None, "OPENAI_API_KEY não configurada (adicione no .env ou nas variáveis do serviço)."
+
+    try:
+        client = OpenAI(api_key=api_key)  # sem proxies/kwargs estranhos
+        return client, None
+    except Exception as e:
+        return None, f"Falha ao criar cliente OpenAI: {e}"
+
+# ── Endpoint de diagnóstico (opcional, ajuda no debug) ─────────────────────
+
+
+@csrf_exempt
+@login_required
+@require_GET
+def chat_diag(request):
+    has_key = bool(os.getenv("OPENAI_API_KEY") or getattr(
+        settings, "OPENAI_API_KEY", None))
+    return JsonResponse({
+        "ok": True,
+        "user": request.user.username,
+        "openai_key_present": has_key,
+    })
+
+
+# ── Endpoint principal do chat ──────────────────────────────────────────────
+@csrf_exempt                 # evita dor de cabeça com CSRF no fetch
+@login_required              # exige login (se 302 → login)
+@require_POST
+def chat_odontoia_api(request):
+    # lê payload
+    try:
+        payload = json.loads(request.body.decode("utf-8") or "{}")
+        user_msg = (payload.get("message") or "").strip()
+    except Exception:
+        return JsonResponse({"error": "Payload inválido."}, status=400)
+
+    if not user_msg:
+        return JsonResponse({"error": "Mensagem vazia."}, status=400)
+
+    # cliente OpenAI
+    client, err = _get_openai_client()
+    if err:
+        # devolve o motivo real pro front (facilita corrigir config)
+        return JsonResponse({"error": err}, status=500)
+
+    # histórico (curto) na sessão
+    history = request.session.get("chat_history", [])
+    messages = [
+        {"role": "system", "content": _odontoia_system_prompt(request.user)}]
+    messages.extend(history[-20:])  # últimos turnos
+    messages.append({"role": "user", "content": user_msg})
+
+    try:
+        resp = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            temperature=0.2,
+        )
+        answer = (resp.choices[0].message.content or "").strip()
+    except Exception as e:
+        # log no servidor e motivo no front
+        logger.exception("OpenAI falhou")
+        return JsonResponse({"error": f"OpenAI falhou: {e}"}, status=502)
+
+    # salva histórico
+    history.append({"role": "user", "content": user_msg})
+    history.append({"role": "assistant", "content": answer})
+    request.session["chat_history"] = history
+
+    return JsonResponse({"answer": answer})
+
+
+def _get_async_openai_client():
+    try:
+        from openai import AsyncOpenAI
+    except Exception as e:
+        return None, f"SDK OpenAI não disponível: {e}"
+
+    api_key = os.getenv("OPENAI_API_KEY") or getattr(
+        settings, "OPENAI_API_KEY", None)
+    if not api_key:
+        return None, "OPENAI_API_KEY não configurada (adicione no .env ou nas variáveis do serviço)."
+
+    try:
+        return AsyncOpenAI(api_key=api_key), None
+    except Exception as e:
+        return None, f"Falha ao criar cliente OpenAI: {e}"
+
+
+def _sse(evento):
+    """Formata um evento server-sent events (uma linha `data:` em JSON)."""
+    return f"data: {json.dumps(evento, ensure_ascii=False)}\n\n"
+
+
+# ── Chat em streaming (SSE) — servido pelo ASGI sem prender um worker ──────
+@csrf_exempt
+@login_required
+@require_POST
+async def chat_odontoia_stream(request):
+    """
+    Mesmo contrato do chat_odontoia_api, mas devolve a resposta aos poucos:
+    eventos `{"delta": "..."}`, depois `{"done": true}` (ou `{"error": "..."}`).
+    """
+    try:
+        payload = json.loads(request.body.decode("utf-8") or "{}")
+        user_msg = (payload.get("message") or "").strip()
+    except Exception:
+        return JsonResponse({"error": "Payload inválido."}, status=400)
+
+    if not user_msg:
+        return JsonResponse({"error": "Mensagem vazia."}, status=400)
+
+    client, err = _get_async_openai_client()
+    if err:
+        return JsonResponse({"error": err}, status=500)
+
+    user = await request.auser()
+    history = await request.session.aget("chat_history", [])
+    system_prompt = await sync_to_async(_odontoia_system_prompt)(user)
+
+    messages = [{"role": "system", "content": system_prompt}]
+    messages.extend(history[-20:])  # últimos turnos
+    messages.append({"role": "user", "content": user_msg})
+
+    async def eventos():
+        partes = []
+        try:
+            stream = await client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=0.2,
+                stream=True,
+            )
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    partes.append(delta)
+                    yield _sse({"delta": delta})
+        except Exception as e:
+            logger.exception("OpenAI falhou (stream)")
+            yield _sse({"error": f"OpenAI falhou: {e}"})
+            return
+
+        # salva histórico (o SessionMiddleware já respondeu → salva aqui)
+        history.append({"role": "user", "content": user_msg})
+        history.append({"role": "assistant", "content": "".join(partes).strip()})
+        await request.session.aset("chat_history", history)
+        await request.session.asave()
+
+        yield _sse({"done": True})
+
+    response = StreamingHttpResponse(eventos(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # evita buffer em proxies (nginx/Railway)
+    return response
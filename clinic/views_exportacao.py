@@ -0,0 +1,114 @@
+# clinic/views_exportacao.py
+# Exportações do financeiro (Excel/PDF). A geração fica em utils/relatorios.py;
+# xlsxwriter e reportlab só são importados quando alguém exporta.
+import io
+import tempfile
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, HttpResponseBadRequest, FileResponse, JsonResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.http import require_POST, require_GET
+from .decorators import require_active_subscription
+from .models import RelatorioJob
+from .utils.relatorios import (
+    enfileirar_relatorio,
+    gerar_excel_financeiro,
+    gerar_pdf_financeiro,
+    periodo_exportacao,
+)
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+# Exportar Excel
+@login_required
+@require_active_subscription
+def financeiro_export_excel(request):
+    try:
+        filtros, sufixo, _ = periodo_exportacao(request.GET)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    # Arquivo temporário em disco (apagado ao fechar) → enviado em blocos
+    arquivo = tempfile.TemporaryFile()
+    try:
+        gerar_excel_financeiro(request.user, filtros, arquivo)
+    except Exception:
+        arquivo.close()
+        raise
+    arquivo.seek(0)
+
+    return FileResponse(
+        arquivo,
+        as_attachment=True,
+        filename=f"financeiro_{sufixo}.xlsx",
+        content_type=XLSX_CONTENT_TYPE,
+    )
+
+
+# Exportar PDF
+@login_required
+@require_active_subscription
+def financeiro_export_pdf(request):
+    try:
+        filtros, sufixo, periodo = periodo_exportacao(request.GET)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    buffer = io.BytesIO()
+    gerar_pdf_financeiro(request.user, filtros, periodo, buffer)
+
+    buffer.seek(0)
+    response = HttpResponse(buffer, content_type="application/pdf")
+    response['Content-Disposition'] = f'attachment; filename=\"financeiro_{sufixo}.pdf\"'
+
+    return response
+
+
+# ── Exportação em segundo plano (RelatorioJob + manage.py processar_relatorios) ──
+def _status_job(job):
+    dados = {
+        "id": job.pk,
+        "tipo": job.tipo,
+        "status": job.status,
+        "status_url": reverse("clinic:relatorio_status", args=[job.pk]),
+    }
+    if job.status == "concluido":
+        dados["download_url"] = reverse("clinic:relatorio_download", args=[job.pk])
+    elif job.status == "erro":
+        dados["erro"] = "Não foi possível gerar o relatório. Tente novamente."
+    return dados
+
+
+@login_required
+@require_active_subscription
+@require_POST
+def relatorio_solicitar(request, tipo):
+    """Enfileira a exportação e responde na hora (202); o front consulta o status."""
+    if tipo not in dict(RelatorioJob.TIPO_CHOICES):
+        raise Http404("Tipo de relatório inválido.")
+
+    try:
+        job = enfileirar_relatorio(request.user, tipo, request.POST or request.GET)
+    except ValueError as e:
+        return JsonResponse({"erro": str(e)}, status=400)
+    return JsonResponse(_status_job(job), status=202)
+
+
+@login_required
+@require_GET
+def relatorio_status(request, pk):
+    job = get_object_or_404(RelatorioJob, pk=pk, owner=request.user)
+    return JsonResponse(_status_job(job))
+
+
+@login_required
+@require_GET
+def relatorio_download(request, pk):
+    job = get_object_or_404(RelatorioJob, pk=pk, owner=request.user, status="concluido")
+    try:
+        arquivo = job.arquivo.open("rb")
+    except (ValueError, FileNotFoundError):
+        raise Http404("Arquivo indisponível.")
+
+    return FileResponse(arquivo, as_attachment=True, filename=job.nome_arquivo)
@@ -0,0 +1,318 @@
+# clinic/views_financeiro.py
+# Módulo financeiro: resumo, dashboard e CRUD de receitas/despesas.
+from datetime import datetime, timedelta
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.db.models import Sum
+from django.shortcuts import render, get_object_or_404, redirect
+from django.utils import timezone
+from .decorators import require_active_subscription
+from .forms import IncomeForm, ExpenseForm
+from .models import Assinatura, Income, Expense
+from .services import get_resumo_por_dentista
+from .utils.paginacao import paginar_keyset, quer_json, resposta_json_keyset
+
+
+# --- FINANCEIRO (apenas Profissional / Premium) ---------------------------
+@login_required
+@require_active_subscription
+def financeiro_home(request):
+    # Permissão: somente profissional ou premium
+    assinatura = Assinatura.objects.filter(user=request.user).first()
+
+    if not assinatura or assinatura.tipo not in ["profissional", "premium"]:
+        messages.error(request, "Seu plano não permite acesso ao Financeiro.")
+        return redirect("clinic:dashboard")
+
+    return render(request, "clinic/financeiro_home.html")
+
+
+@login_required
+@require_active_subscription
+def financeiro_resumo(request):
+    """
+    Tela de resumo financeiro (por dentista, receita, comissões, líquido)
+    Disponível apenas para planos Profissional e Premium.
+    """
+    assinatura = Assinatura.objects.filter(
+        user=request.user, ativa=True).first()
+
+    if not assinatura or assinatura.tipo not in ("profissional", "premium"):
+        messages.error(
+            request,
+            "O módulo financeiro completo está disponível apenas para os planos "
+            "Profissional e Premium."
+        )
+        return redirect("clinic:dashboard")
+
+    hoje = timezone.now().date()
+    periodo = int(request.GET.get("periodo", 30))  # dias
+    data_inicial = hoje - timedelta(days=periodo)
+
+    # Agrupado por dentista (a partir do resumo diário)
+    por_dentista, totais = get_resumo_por_dentista(request.user, data_inicial, hoje)
+
+    total_receita = totais["total_receita"] or 0
+    total_comissoes = totais["total_comissoes"] or 0
+    total_liquido = total_receita - total_comissoes
+
+    # Adiciona valor líquido por dentista
+    lista_dentistas = []
+    for dent in por_dentista:
+        receita = dent['receita'] or 0
+        comissao = dent['comissoes'] or 0
+        dent['liquido'] = receita - comissao
+        lista_dentistas.append(dent)
+
+    context = {
+        "por_dentista": lista_dentistas,
+        "periodo": periodo,
+        "total_receita": total_receita,
+        "total_comissoes": total_comissoes,
+        "total_liquido": total_liquido,
+    }
+
+    return render(request, "clinic/financeiro_resumo.html", context)
+
+
+# IA e Insights (apenas profissional e premium)
+@login_required
+@require_active_subscription
+def ia_insights(request):
+    # Permissão: apenas Premium
+    assinatura = Assinatura.objects.filter(user=request.user).first()
+
+    if not assinatura or assinatura.tipo != "premium":
+        messages.error(
+            request, "Apenas assinantes Premium podem acessar IA & Insights.")
+        return redirect("clinic:dashboard")
+
+    return render(request, "clinic/ia_insights.html")
+
+
+# Dashboard Financeiro
+@login_required
+@require_active_subscription
+def financeiro_dashboard(request):
+    from .services import get_fluxo_caixa, get_graficos_financeiros
+
+    # Filtros opcionais
+    mes = request.GET.get("mes")
+    ano_param = request.GET.get("ano")
+    data_inicio = request.GET.get('data_inicio')
+    data_fim = request.GET.get('data_fim')
+
+    # se nada selecionado -> mês atual
+    hoje = datetime.now()
+
+    # Se não tem filtro por data -> usa mes/ano
+    if not data_inicio and not data_fim:
+        if not mes:
+            mes = hoje.month
+        if not ano_param:
+            ano_param = hoje.year
+
+        mes = int(mes)
+        ano = int(ano_param)
+
+        # Dados principais
+        stats = get_fluxo_caixa(request.user, mes=mes, ano=ano)
+
+        # Puxa lista de receitas e despesas para exibir no dashboard
+        incomes = Income.objects.filter(
+            owner=request.user,
+            data__month=mes,
+            data__year=ano
+        ).order_by('-data')[:10]
+
+        expenses = Expense.objects.filter(
+            owner=request.user,
+            data__month=mes,
+            data__year=ano
+        ).order_by('-data')[:10]
+
+    else:
+        if data_inicio:
+            data_inicio = datetime.strptime(data_inicio, "%Y-%m-%d").date()
+        if data_fim:
+            data_fim = datetime.strptime(data_fim, "%Y-%m-%d").date()
+
+        incomes = Income.objects.filter(owner=request.user)
+        expenses = Expense.objects.filter(owner=request.user)
+
+        if data_inicio:
+            incomes = incomes.filter(data__gte=data_inicio)
+            expenses = expenses.filter(data__gte=data_inicio)
+
+        if data_fim:
+            incomes = incomes.filter(data__lte=data_fim)
+            expenses = expenses.filter(data__lte=data_fim)
+
+        total_receitas = incomes.aggregate(Sum('valor'))['valor__sum'] or 0
+        total_despesas = expenses.aggregate(Sum('valor'))['valor__sum'] or 0
+
+        stats = {
+            'receitas': total_receitas,
+            'despesas': total_despesas,
+            'saldo': total_receitas - total_despesas,
+        }
+
+        ano = (data_inicio or data_fim or hoje).year
+
+    graficos = get_graficos_financeiros(request.user, ano)
+
+    context = {
+        'stats': stats,
+        'incomes': incomes,
+        'expenses': expenses,
+        'mes': mes,
+        'ano': ano,
+        # repassados aos links de exportação (Excel/PDF)
+        'data_inicio': request.GET.get('data_inicio', ''),
+        'data_fim': request.GET.get('data_fim', ''),
+        'meses': [
+            (1, 'Janeiro'), (2, 'Fevereiro'), (3, 'Março'), (4, 'Abril'),
+            (5, 'Maio'), (6, 'Junho'), (7, 'Julho'), (8, 'Agosto'),
+            (9, 'Setembro'), (10, 'Outubro'), (11, 'Novembro'), (12, 'Dezembro')
+        ],
+        'anos': range(2023, 2031),
+
+        # Dados para os gráficos
+        'graficos': graficos,
+    }
+
+    return render(request, 'clinic/financeiro_dashboard.html', context)
+
+
+# CRUD Receitas e Despesas
+@login_required
+@require_active_subscription
+def receitas_list(request):
+    receitas = Income.objects.filter(owner=request.user)
+    pagina = paginar_keyset(request, receitas, '-data')
+
+    if quer_json(request):
+        return resposta_json_keyset(pagina, lambda r: {
+            'id': r.id,
+            'descricao': r.descricao,
+            'valor': r.valor,
+            'data': r.data.isoformat(),
+            'pago': r.pago,
+        })
+
+    return render(request, 'clinic/receitas_list.html', {
+        'receitas': pagina['itens'],
+        'pagina': pagina,
+    })
+
+
+@login_required
+@require_active_subscription
+def receita_create(request):
+    if request.method == "POST":
+        form = IncomeForm(request.POST)
+        if form.is_valid():
+            receita = form.save(commit=False)
+            receita.owner = request.user
+            receita.origem = 'manual'
+            receita.save()
+            messages.success(request, 'Receita adicionada!')
+            return redirect('clinic:receitas_list')
+
+    else:
+        form = IncomeForm()
+
+    return render(request, "clinic/receita_form.html", {'form': form})
+
+
+@login_required
+@require_active_subscription
+def receita_update(request, pk):
+    receita = get_object_or_404(Income, pk=pk, owner=request.user)
+
+    if request.method == "POST":
+        form = IncomeForm(request.POST, instance=receita)
+        if form.is_valid():
+            form.save()
+            messages.success(request, "Receita atualizada!")
+            return redirect("clinic:receitas_list")
+    else:
+        form = IncomeForm(instance=receita)
+
+    return render(request, "clinic/receita_form.html", {"receita": receita})
+
+
+@login_required
+@require_active_subscription
+def receita_delete(request, pk):
+    receita = get_object_or_404(Income, pk=pk, owner=request.user)
+    receita.delete()
+    messages.success(request, "Receita removida!")
+    return redirect("clinic:receitas_list")
+
+
+# DESPESAS
+@login_required
+@require_active_subscription
+def despesas_list(request):
+    despesas = Expense.objects.filter(owner=request.user)
+    pagina = paginar_keyset(request, despesas, '-data')
+
+    if quer_json(request):
+        return resposta_json_keyset(pagina, lambda d: {
+            'id': d.id,
+            'categoria': d.categoria,
+            'descricao': d.descricao,
+            'valor': d.valor,
+            'data': d.data.isoformat(),
+            'pago': d.pago,
+        })
+
+    return render(request, "clinic/despesas_list.html", {
+        "despesas": pagina['itens'],
+        "pagina": pagina,
+    })
+
+
+@login_required
+@require_active_subscription
+def despesa_create(request):
+    if request.method == "POST":
+        form = ExpenseForm(request.POST)
+        if form.is_valid():
+            despesa = form.save(commit=False)
+            despesa.owner = request.user
+            despesa.save()
+
+            messages.success(request, "Despesa adicionada!")
+            return redirect("clinic:despesas_list")
+    else:
+        form = ExpenseForm()
+
+    return render(request, "clinic/despesa_form.html", {"form": form})
+
+
+@login_required
+@require_active_subscription
+def despesa_update(request, pk):
+    despesa = get_object_or_404(Expense, pk=pk, owner=request.user)
+
+    if request.method == "POST":
+        form = ExpenseForm(request.POST, instance=despesa)
+        if form.is_valid():
+            form.save()
+            messages.success(request, "Despesa atualizada!")
+            return redirect("clinic:despesas_list")
+    else:
+        form = ExpenseForm(instance=despesa)
+
+    return render(request, "clinic/despesa_form.html", {"form": form})
+
+
+@login_required
+@require_active_subscription
+def despesa_delete(request, pk):
+    despesa = get_object_or_404(Expense, pk=pk, owner=request.user)
+    despesa.delete()
+    messages.success(request, "Despesa removida!")
+    return redirect("clinic:despesas_list")
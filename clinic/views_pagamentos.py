@@ -0,0 +1,245 @@
+# clinic/views_pagamentos.py
+# Assinaturas e pagamentos (Mercado Pago). O cliente HTTP fica em utils/gateway.py.
+import json
+import logging
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth import login
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
+from django.http import JsonResponse, HttpResponseBadRequest
+from django.shortcuts import render, redirect
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from .models import Assinatura, Pagamento
+from .utils.emails import enfileirar_email
+from .utils.gateway import ErroGateway, get_gateway
+from .utils.pagamentos import assinatura_webhook_valida, registrar_evento_webhook, webhook_excedeu_limite
+
+logger = logging.getLogger(__name__)
+
+
+# ==== PAGAMENTOS (Mercado Pago) ============================================
+
+# Preço mensal de cada plano (checkout interno e público)
+PLANOS = {
+    "basico": Decimal("49.90"),
+    "profissional": Decimal("79.90"),
+    "premium": Decimal("129.90"),
+}
+
+
+@login_required
+def criar_pagamento(request, plano: str):
+
+    plano = plano.lower().strip()
+
+    if plano not in PLANOS:
+        messages.error(request, "Plano inválido.")
+        return redirect("clinic:dashboard")
+
+    valor = PLANOS[plano]
+
+    # Assinatura do usuário
+    assinatura, _ = Assinatura.objects.get_or_create(user=request.user)
+
+    # Registrar pagamento
+    referencia = f"odontoia-{request.user.id}-{uuid.uuid4().hex}"
+    Pagamento.objects.create(
+        assinatura=assinatura,
+        referencia=referencia,
+        valor=valor,
+        status="pendente",
+        metodo="desconhecido",
+    )
+
+    # Mercado Pago (cliente do processo, conexão já aquecida)
+    try:
+        gateway = get_gateway()
+    except ErroGateway:
+        messages.error(request, "Token Mercado Pago não configurado.")
+        return redirect("clinic:dashboard")
+
+    base_url = (
+        "https://app.odontoia.codertec.com.br"
+        if not settings.DEBUG
+        else request.build_absolute_uri("/")[:-1]
+    )
+
+    preference_data = {
+        "items": [
+            {
+                "id": referencia,
+                "title": f"Plano {plano.capitalize()} - OdontoIA",
+                "quantity": 1,
+                "currency_id": "BRL",
+                "unit_price": float(valor),
+            }
+        ],
+        "payer": {"email": request.user.email},
+        "back_urls": {
+            "success": f"{base_url}/pagamento/sucesso/",
+            "failure": f"{base_url}/pagamento/falha/",
+            "pending": f"{base_url}/pagamento/sucesso/",
+        },
+        "external_reference": referencia,
+    }
+
+    if not settings.DEBUG:
+        preference_data["notification_url"] = base_url + reverse("clinic:mercadopago_webhook")
+        preference_data["auto_return"] = "approved"
+
+    try:
+        resp = gateway.criar_preferencia(preference_data)
+    except ErroGateway:
+        logger.exception("Erro ao criar preferência no Mercado Pago")
+        resp = {}
+    init_point = resp.get("init_point") or resp.get("sandbox_init_point")
+
+    if not init_point:
+        messages.error(request, "Erro ao iniciar pagamento.")
+        return redirect("clinic:dashboard")
+
+    return redirect(init_point)
+
+
+# ===========================
+# 🧾 WEBHOOK DO MERCADO PAGO
+# ===========================
+@csrf_exempt
+def mercadopago_webhook(request):
+    """
+    Recebe notificações automáticas do Mercado Pago sobre pagamentos.
+    Só grava o evento e responde 200; quem consulta o MP e atualiza o
+    Pagamento/Assinatura é o `manage.py processar_webhooks`.
+    """
+    # Último IP do X-Forwarded-For é o que o proxy da plataforma viu
+    encaminhado = request.META.get("HTTP_X_FORWARDED_FOR", "")
+    ip = encaminhado.split(",")[-1].strip() or request.META.get("REMOTE_ADDR", "")
+    if webhook_excedeu_limite(ip):
+        return JsonResponse({"ok": False, "error": "rate_limited"}, status=429)
+
+    try:
+        payload = json.loads(request.body.decode("utf-8") or "{}")
+    except Exception:
+        return HttpResponseBadRequest("Invalid JSON")
+    if not isinstance(payload, dict):
+        return HttpResponseBadRequest("Invalid JSON")
+
+    if not assinatura_webhook_valida(request.headers, payload, request.GET):
+        return JsonResponse({"ok": False, "error": "invalid_signature"}, status=401)
+
+    evento, _ = registrar_evento_webhook(payload, request.GET)
+    return JsonResponse({"ok": True, "ignored": evento is None})
+
+
+# ===========================
+# ✅ PÁGINA DE SUCESSO
+# ===========================
+@login_required
+def pagamento_sucesso(request):
+    assinatura = Assinatura.objects.filter(user=request.user).first()
+    pagamento = (
+        Pagamento.objects.filter(assinatura__user=request.user)
+        .order_by("-data_pagamento")
+        .first()
+    )
+
+    if not assinatura or not pagamento:
+        messages.warning(request, "Não foi possível confirmar o pagamento.")
+        return redirect("clinic:dashboard")
+
+    # Ativa assinatura por 30 dias
+    assinatura.ativa = True
+    assinatura.fim_teste = timezone.now() + timedelta(days=30)
+    assinatura.save()
+
+    # ---- Email de confirmação (somente para assinatura paga) ----
+    from django.template.loader import render_to_string
+
+    nome = request.user.first_name or request.user.username
+    plano = pagamento.plano.capitalize()
+    validade = assinatura.fim_teste.strftime("%d/%m/%Y")
+
+    html_email = render_to_string(
+        "clinic/emails/assinatura_ativada.html",
+        {"nome": nome, "plano": plano, "validade": validade}
+    )
+
+    enfileirar_email(
+        assunto="🎉 Assinatura ativada - OdontoIA",
+        corpo=f"Sua assinatura {plano} está ativa até {validade}.",
+        destinatarios=[request.user.email],
+        html=html_email,
+        remetente="OdontoIA <no-reply@odontoia.com.br>",
+    )
+    # --------------------------------------------------------------
+
+    return render(request, "clinic/pagamento_sucesso.html", {
+        "assinatura": assinatura,
+        "pagamento": pagamento,
+        "plano": plano,
+    })
+
+
+# Checkout publico
+def checkout_publico(request, plano):
+    plano = plano.lower()
+
+    if plano not in PLANOS:
+        messages.error(request, "Plano inválido.")
+        return redirect("https://odontoia.codertec.com.br")
+
+    valor = PLANOS[plano]
+
+    # GET → mostra o formulário
+    if request.method == "GET":
+        return render(request, "clinic/checkout_publico.html", {
+            "plano_nome": plano.capitalize(),
+            "plano_slug": plano,
+            "valor": valor
+        })
+
+    # POST → o usuário enviou nome e email, vamos criar uma conta trial
+    nome = request.POST.get("nome")
+    email = request.POST.get("email")
+
+    if not email:
+        messages.error(request, "E-mail é obrigatório.")
+        return redirect(request.path)
+
+    # Cria usuário temporário (ou pega existente)
+    user, created = User.objects.get_or_create(
+        username=email,
+        defaults={"email": email, "first_name": nome or email}
+    )
+
+    if created:
+        # cria assinatura trial automática
+        Assinatura.objects.create(user=user, tipo=plano)
+
+    # Faz login automático
+    login(request, user)
+
+    # Redireciona para o checkout interno
+    return redirect(f"/pagamento/checkout/{plano}/")
+
+
+# ===========================
+# ❌ PÁGINA DE FALHA
+# ===========================
+@login_required
+def pagamento_falha(request):
+    pagamento = (
+        Pagamento.objects.filter(assinatura__user=request.user)
+        .order_by("-data_pagamento")
+        .first()
+    )
+
+    plano = pagamento.plano if pagamento else "Indefinido"
+
+    return render(request, "clinic/pagamento_falha.html", {"plano": plano})
@@ -101,6 +101,34 @@ else:
         }
     }
 
+# Reuso de conexões com o banco (compare com `python manage.py benchmark_conexoes`)
+# - DB_POOL=true: pool do psycopg 3 (Django ≥ 5.1), só no Postgres. É o indicado
+#   aqui: no ASGI (uvicorn) cada request roda numa thread própria, então conexões
+#   persistentes não são reaproveitadas entre requests.
+# - DB_CONN_MAX_AGE: conexões persistentes (segundos), para servidores WSGI.
+DB_POOL = os.getenv("DB_POOL", "False").strip().lower() == "true"
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = os.getenv("DB_CONN_HEALTH_CHECKS", "True").strip().lower() == "true"
+
+if DB_POOL and DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    from psycopg_pool import ConnectionPool
+
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+            "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+            # Conexão derrubada pelo servidor é descartada antes de ser entregue
+            **({"check": ConnectionPool.check_connection} if DATABASES["default"]["CONN_HEALTH_CHECKS"] else {}),
+        },
+    }
+    DATABASES["default"]["CONN_MAX_AGE"] = 0  # o pool já reaproveita (e o Django exige 0)
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = int(os.getenv("DB_CONN_MAX_AGE", "0"))
+
+# Busca de pacientes por similaridade (pg_trgm) só existe no Postgres
+if DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    INSTALLED_APPS.append("django.contrib.postgres")
+
 # Validações de senha
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -126,6 +154,29 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Relatórios gerados em segundo plano (manage.py processar_relatorios)
+RELATORIO_TIMEOUT_MINUTOS = int(os.getenv("RELATORIO_TIMEOUT_MINUTOS", "10"))
+RELATORIO_RETENCAO_DIAS = int(os.getenv("RELATORIO_RETENCAO_DIAS", "7"))
+
+# Caixa de saída dos e-mails (manage.py enviar_emails)
+EMAIL_FILA_TIMEOUT_MINUTOS = int(os.getenv("EMAIL_FILA_TIMEOUT_MINUTOS", "10"))
+EMAIL_FILA_RETENCAO_DIAS = int(os.getenv("EMAIL_FILA_RETENCAO_DIAS", "30"))
+
+# Cache compartilhado entre o web e os workers (tabela no banco, criada com
+# `manage.py createcachetable` no start.sh): a invalidação feita num worker
+# (pagamento aprovado, varredura de assinaturas) vale para todos os processos.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "clinic_cache",
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "50000"))},
+    }
+}
+# Snapshot da assinatura usado pelo TrialMiddleware
+ASSINATURA_CACHE_TTL = int(os.getenv("ASSINATURA_CACHE_TTL", "60"))
+# Contexto dinâmico (números da clínica) enviado ao chat da IA
+CONTEXTO_IA_CACHE_TTL = int(os.getenv("CONTEXTO_IA_CACHE_TTL", "120"))
+
 # Padrão do campo automático
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -223,6 +274,19 @@ else:
 MERCADOPAGO_PUBLIC_KEY = os.getenv("MERCADOPAGO_PUBLIC_KEY")
 MERCADOPAGO_ACCESS_TOKEN = os.getenv("MERCADOPAGO_ACCESS_TOKEN", "")
 CURRENCY_ID = os.getenv("CURRENCY_ID", "BRL")
+# Base da API REST (trocável por um stub local nos testes de integração)
+MERCADOPAGO_API_URL = os.getenv("MERCADOPAGO_API_URL", "https://api.mercadopago.com")
+# Chave secreta dos webhooks (painel do MP → Webhooks): valida o cabeçalho x-signature
+MERCADOPAGO_WEBHOOK_SECRET = os.getenv("MERCADOPAGO_WEBHOOK_SECRET", "")
+# Notificações aceitas por IP a cada minuto no endpoint do webhook
+WEBHOOK_LIMITE_POR_MINUTO = int(os.getenv("WEBHOOK_LIMITE_POR_MINUTO", "60"))
+# Cliente HTTP do gateway (clinic/utils/gateway.py): timeouts em segundos
+MERCADOPAGO_TIMEOUT_CONEXAO = float(os.getenv("MERCADOPAGO_TIMEOUT_CONEXAO", "3.05"))
+MERCADOPAGO_TIMEOUT_LEITURA = float(os.getenv("MERCADOPAGO_TIMEOUT_LEITURA", "10"))
+MERCADOPAGO_TENTATIVAS = int(os.getenv("MERCADOPAGO_TENTATIVAS", "2"))
+# Worker dos webhooks (manage.py processar_webhooks)
+WEBHOOK_TIMEOUT_MINUTOS = int(os.getenv("WEBHOOK_TIMEOUT_MINUTOS", "10"))
+WEBHOOK_RETENCAO_DIAS = int(os.getenv("WEBHOOK_RETENCAO_DIAS", "30"))
 
 # Em dev mostramos o e-mail no console (já está configurado no seu projeto)
 # Em prod (Railway), basta definir EMAIL_* no .env que já funciona.
@@ -30,9 +30,14 @@ done
 
 echo "✅ Banco pronto, aplicando migrações..."
 python manage.py migrate --noinput
+python manage.py createcachetable
 
 echo "📦 Coletando arquivos estáticos..."
 python manage.py collectstatic --noinput
 
-echo "💼 Iniciando o servidor Gunicorn..."
-gunicorn odontoia.wsgi:application --bind 0.0.0.0:$PORT
+# Os workers (relatórios, webhooks, e-mails, assinaturas) rodam como processos
+# próprios, declarados no Procfile, e não em segundo plano neste container.
+
+echo "💼 Iniciando o servidor Gunicorn (ASGI/uvicorn)..."
+# ASGI: o chat em streaming (/api/chat/stream/) não prende um worker durante a resposta da OpenAI
+gunicorn odontoia.asgi:application -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:$PORT
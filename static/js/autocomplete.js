@@ -0,0 +1,57 @@
+// static/js/autocomplete.js
+// Transforma <select data-autocomplete-url="..."> em busca sob demanda:
+// as opções vêm do endpoint de autocomplete em vez de virem todas na página.
+document.addEventListener("DOMContentLoaded", function () {
+    document.querySelectorAll("select[data-autocomplete-url]").forEach(iniciarAutocomplete);
+});
+
+function iniciarAutocomplete(select) {
+    const busca = document.createElement("input");
+    busca.type = "search";
+    busca.className = "form-control form-control-sm mb-1";
+    busca.placeholder = select.dataset.autocompletePlaceholder || "Digite para buscar...";
+    busca.autocomplete = "off";
+    select.parentNode.insertBefore(busca, select);
+
+    let timer = null;
+    let controller = null;
+
+    async function carregar(termo) {
+        if (controller) controller.abort();
+        controller = new AbortController();
+
+        const url = new URL(select.dataset.autocompleteUrl, window.location.origin);
+        url.searchParams.set("q", termo);
+
+        try {
+            const resp = await fetch(url, { signal: controller.signal });
+            if (!resp.ok) return;
+            const { resultados } = await resp.json();
+
+            const atual = select.value;
+            select.innerHTML = "";
+            if (!select.required) select.add(new Option("---------", ""));
+
+            resultados.forEach(r => {
+                const opt = new Option(r.label, r.id, false, String(r.id) === atual);
+                if (r.valor !== undefined) opt.dataset.valor = r.valor;
+                select.add(opt);
+            });
+
+            // Só dispara "change" se a seleção realmente mudou
+            if (select.value !== atual) select.dispatchEvent(new Event("change"));
+        } catch (e) {
+            if (e.name !== "AbortError") console.error("Autocomplete error:", e);
+        }
+    }
+
+    busca.addEventListener("input", () => {
+        clearTimeout(timer);
+        timer = setTimeout(() => carregar(busca.value.trim()), 250);
+    });
+
+    // Primeira lista (mais recentes / ordem alfabética) ao focar
+    busca.addEventListener("focus", () => {
+        if (select.options.length <= 1) carregar("");
+    }, { once: true });
+}
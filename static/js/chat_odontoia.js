@@ -102,24 +102,58 @@ document.addEventListener("DOMContentLoaded", function () {
         chatMessages.scrollTop = chatMessages.scrollHeight;
 
         try {
-            const response = await fetch("/api/chat/", {
+            // Resposta em streaming (server-sent events): o texto aparece aos poucos
+            const response = await fetch("/api/chat/stream/", {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
                 body: JSON.stringify({ message }),
             });
 
-            const isJSON = response.headers.get("content-type")?.includes("application/json");
-            const data = isJSON ? await response.json() : {};
-
-            loading.remove();
-
-            if (response.ok && data.answer) {
-                addMessage(data.answer, "bot");
-            } else {
+            const isStream = response.headers.get("content-type")?.includes("text/event-stream");
+            if (!response.ok || !isStream) {
+                const isJSON = response.headers.get("content-type")?.includes("application/json");
+                const data = isJSON ? await response.json() : {};
+                loading.remove();
                 const msg = data.error || `Erro HTTP ${response.status}`;
                 console.error("Chat API error:", msg);
                 addMessage(`❌ ${msg}`, "bot");
+                return;
             }
+
+            let bolha = null;
+            let buffer = "";
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                // Cada evento SSE termina com linha em branco
+                const eventos = buffer.split("\n\n");
+                buffer = eventos.pop();
+
+                for (const evento of eventos) {
+                    if (!evento.startsWith("data: ")) continue;
+                    const data = JSON.parse(evento.slice(6));
+
+                    if (data.delta) {
+                        if (!bolha) {
+                            loading.remove();
+                            addMessage("", "bot");
+                            bolha = chatMessages.lastElementChild;
+                        }
+                        bolha.textContent += data.delta;
+                        chatMessages.scrollTop = chatMessages.scrollHeight;
+                    } else if (data.error) {
+                        loading.remove();
+                        console.error("Chat API error:", data.error);
+                        addMessage(`❌ ${data.error}`, "bot");
+                    }
+                }
+            }
+            loading.remove();
         } catch (error) {
             loading.remove();
             console.error("Chat fetch error:", error);